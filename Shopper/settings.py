@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 from django.core import mail
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -41,8 +42,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'app.instrumentation.ViewMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
+    'app.middleware.CatalogSessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
@@ -70,6 +72,11 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'Shopper.wsgi.application'
 
+# Serve the hot read paths and JSON cart endpoints with the native async views
+# of app/async_views.py. Shopper/asgi.py turns this on; under WSGI Django would
+# run every async view through async_to_sync, so the sync views stay the default.
+ASYNC_VIEWS = os.environ.get('SHOPPER_ASYNC_VIEWS', '0') == '1'
+
 
 # Database
 # https://docs.djangoproject.com/en/4.1/ref/settings/#databases
@@ -78,6 +85,10 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Tests run against a file rather than SQLite's shared in-memory
+        # database, whose table locks fail concurrent writers at once instead of
+        # making them wait as the real database does.
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
     }
 }
 
@@ -117,6 +128,15 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/4.1/howto/static-files/
 
 STATIC_URL = 'static/'
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+
+# "production" makes collectstatic write content-hashed copies of every asset,
+# plus gzip (and, with the brotli package installed, brotli) variants of text
+# assets, and makes {% static %} link to the hashed names. The app serves them
+# with one-year cache headers (see app/assets.py). Run collectstatic first.
+ASSET_MODE = os.environ.get('SHOPPER_ASSET_MODE', 'development')
+if ASSET_MODE == 'production':
+    STATICFILES_STORAGE = 'app.assets.CompressedManifestStaticFilesStorage'
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.1/ref/settings/#default-auto-field
@@ -127,4 +147,94 @@ MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 LOGIN_REDIRECT_URL= '/profile/'
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
-SESSION_ENGINE = 'django.contrib.sessions.backends.db'
\ No newline at end of file
+
+# Sessions
+# https://docs.djangoproject.com/en/4.1/topics/http/sessions/
+
+# "cached_db" reads sessions from the cache and writes them through to the
+# database; "signed_cookies" keeps them in the client's cookie with no
+# server-side store; "db" reads the session table on every request.
+SESSION_MODE = os.environ.get('SHOPPER_SESSION_MODE', 'cached_db')
+SESSION_ENGINE = 'django.contrib.sessions.backends.' + SESSION_MODE
+
+# Catalog views whose anonymous GET requests skip the session store entirely
+# (see app.middleware.CatalogSessionMiddleware).
+SESSIONLESS_URL_NAMES = {
+    'home', 'product-detail', 'search', 'suggest', 'catalog',
+    'mobile', 'mobile_flt', 'laptop', 'laptop_flt', 'tv', 'tv_flt',
+    'clothing', 'clothing_flt', 'shoes', 'shoes_flt', 'watch', 'watch_flt',
+}
+
+# Instrumentation
+# Per-view query count, SQL time, template render time and latency histograms
+# (see app/instrumentation.py), served to staff and to scrapers sending
+# "Authorization: Bearer <METRICS_TOKEN>" at /metrics. Client addresses are not
+# trusted: behind a reverse proxy every request comes from 127.0.0.1.
+# Off by default: the middleware then drops out of the stack.
+VIEW_METRICS = os.environ.get('SHOPPER_VIEW_METRICS', '0') == '1'
+VIEW_METRICS_SLOW_REQUEST_SECONDS = float(os.environ.get('SHOPPER_SLOW_REQUEST_SECONDS', '0.5'))
+# Empty leaves /metrics to staff only.
+METRICS_TOKEN = os.environ.get('SHOPPER_METRICS_TOKEN', '')
+
+# The most SQL queries each view may run, by view name, allowing for the one
+# session read of a cold session cache. Over budget a view is
+# logged, or fails with QueryBudgetExceeded when VIEW_QUERY_BUDGET_ENFORCE is
+# set, as app.testing.QueryBudgetTestRunner does for the test suite.
+VIEW_QUERY_BUDGETS = {
+    'home': 8,
+    'product-detail': 6,
+    'search': 3,
+    'showcart': 5,
+    'add-to-cart': 7,
+    'buynow': 7,
+    'checkout': 6,
+    # One more on SQLite, where checkout takes the write lock first.
+    'paymentdone': 11,
+    'orders': 5,
+    'orders-json': 3,
+    **{
+        name: 6 for name in (
+            'catalog', 'mobile', 'mobile_flt', 'laptop', 'laptop_flt', 'tv', 'tv_flt',
+            'clothing', 'clothing_flt', 'shoes', 'shoes_flt', 'watch', 'watch_flt',
+        )
+    },
+}
+VIEW_QUERY_BUDGET_ENFORCE = False
+TEST_RUNNER = 'app.testing.QueryBudgetTestRunner'
+
+# Background jobs
+# Work queued with app.jobs.enqueue() is stored in the database and run by
+# `manage.py run_jobs`. A failed job is retried after JOBS_RETRY_DELAY seconds,
+# doubled on every further attempt up to JOBS_MAX_RETRY_DELAY; a worker that
+# has run a job for its visibility timeout is presumed dead and the job is
+# handed to another. Finished jobs are deleted after JOBS_RETENTION_DAYS.
+JOBS_MAX_ATTEMPTS = 5
+JOBS_VISIBILITY_TIMEOUT = 300
+JOBS_RETRY_DELAY = 10
+JOBS_MAX_RETRY_DELAY = 3600
+JOBS_RETENTION_DAYS = 7
+
+# Cache
+# https://docs.djangoproject.com/en/4.1/topics/cache/
+
+# The cache is shared by every process of the site: the web workers, the
+# run_jobs worker and the management commands (refresh_home_rails,
+# import_products) that warm or invalidate cached rails, pages and the catalog
+# version. A per-process cache would leave those invalidations unseen by the
+# web workers. The default file-based cache serves processes on one host;
+# set SHOPPER_REDIS_URL (and install redis) to share it between hosts.
+if os.environ.get('SHOPPER_REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['SHOPPER_REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ.get('SHOPPER_CACHE_DIR', str(BASE_DIR / 'cache')),
+            'OPTIONS': {'MAX_ENTRIES': 20000},
+        }
+    }
@@ -1,19 +1,187 @@
-from django.contrib import admin
+from datetime import timedelta
+
+from django.contrib import admin, messages
+from django.db.models import Sum
+from django.template.response import TemplateResponse
+from django.utils import timezone
+
 from .models import *
+from .order_status import transition_orders
+from .pagination import EstimatedCountPaginator
+
+DASHBOARD_PERIODS = (7, 30, 90, 365)
+
+
+class ScalableAdminMixin:
+    """
+    Changelist settings for tables too large to count or to list in a dropdown.
+
+    Pages are counted with EstimatedCountPaginator and never with a second,
+    unfiltered COUNT(*); admins listing related objects use list_select_related,
+    and foreign keys are edited through autocomplete widgets.
+    """
+
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_per_page = 50
 
 
 @admin.register(Customer)
-class CustomerModelAdmin(admin.ModelAdmin):
+class CustomerModelAdmin(ScalableAdminMixin, admin.ModelAdmin):
     list_display = ['user', 'name', 'locality', 'city', 'zipcode', 'state']
+    list_select_related = ['user']
+    search_fields = ['name', 'user__username']
+    autocomplete_fields = ['user']
 
 @admin.register(Product)
-class ProductModelAdmin(admin.ModelAdmin):
-    list_display = ['title', 'selling_price', 'discounted_price', 'description', 'brand', 'category', 'product_image']
+class ProductModelAdmin(ScalableAdminMixin, admin.ModelAdmin):
+    list_display = ['title', 'sku', 'selling_price', 'discounted_price', 'brand', 'category']
+    # Served by the (category, ...) indexes.
+    list_filter = ['category']
+    search_fields = ['=sku', 'title', 'brand']
 
 @admin.register(Cart)
-class CartModelAdmin(admin.ModelAdmin):
+class CartModelAdmin(ScalableAdminMixin, admin.ModelAdmin):
     list_display = ['user', 'product', 'quantity']
+    list_select_related = ['user', 'product']
+    search_fields = ['user__username']
+    autocomplete_fields = ['user', 'product']
 
 @admin.register(PlacedOrder)
-class PlacedOrderModelAdmin(admin.ModelAdmin):
-    list_display = ['user', 'customer', 'product', 'quantity', 'orered_date', 'status']
\ No newline at end of file
+class PlacedOrderModelAdmin(ScalableAdminMixin, admin.ModelAdmin):
+    # The order line's own title snapshot, so the list needs no product join.
+    list_display = ['user', 'customer', 'title', 'quantity', 'orered_date', 'status']
+    list_select_related = ['user', 'customer']
+    ordering = ['-orered_date']
+    # Served by the (status, orered_date) index.
+    list_filter = ['status']
+    search_fields = ['user__username', 'title']
+    autocomplete_fields = ['user', 'customer', 'product']
+    # Status changes go through the actions below (or the transition_orders command),
+    # which check TRANSITIONS and record an OrderStatusChange.
+    readonly_fields = ['status']
+    actions = ['mark_accepted', 'mark_packed', 'mark_on_the_way', 'mark_delivered', 'mark_cancelled']
+
+    def transition(self, request, queryset, to_status):
+        # Only the ids are streamed; the rows are read and updated a chunk at a time.
+        result = transition_orders(queryset.values_list('id', flat=True).iterator(), to_status, user=request.user)
+        self.message_user(request, f"Moved {result['changed']} orders to {to_status}.", messages.SUCCESS)
+        if result['skipped']:
+            skipped = ", ".join(f"{count} {status}" for status, count in sorted(result['skipped'].items()))
+            self.message_user(request, f"Left {skipped} orders unchanged: they cannot move to {to_status}.", messages.WARNING)
+
+    @admin.action(description="Mark selected orders as Accepted", permissions=['change'])
+    def mark_accepted(self, request, queryset):
+        self.transition(request, queryset, "Accepted")
+
+    @admin.action(description="Mark selected orders as Packed", permissions=['change'])
+    def mark_packed(self, request, queryset):
+        self.transition(request, queryset, "Packed")
+
+    @admin.action(description="Mark selected orders as On The Way", permissions=['change'])
+    def mark_on_the_way(self, request, queryset):
+        self.transition(request, queryset, "On The Way")
+
+    @admin.action(description="Mark selected orders as Delivered", permissions=['change'])
+    def mark_delivered(self, request, queryset):
+        self.transition(request, queryset, "Delivered")
+
+    @admin.action(description="Cancel selected orders", permissions=['change'])
+    def mark_cancelled(self, request, queryset):
+        self.transition(request, queryset, "Cancel")
+
+
+@admin.register(OrderStatusChange)
+class OrderStatusChangeAdmin(ScalableAdminMixin, admin.ModelAdmin):
+    list_display = ['order_id', 'from_status', 'to_status', 'changed_at', 'changed_by']
+    list_select_related = ['changed_by']
+    list_filter = ['to_status']
+    raw_id_fields = ['order']
+    ordering = ['-changed_at']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(Job)
+class JobAdmin(ScalableAdminMixin, admin.ModelAdmin):
+    list_display = ['id', 'name', 'status', 'attempts', 'run_at', 'finished_at']
+    list_filter = ['status']
+    search_fields = ['=name']
+    ordering = ['-id']
+    actions = ['retry']
+    # Payloads can carry customer data; jobs are only inspected, never edited.
+    exclude = ['payload']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_retry_permission(self, request):
+        return super().has_change_permission(request)
+
+    @admin.action(description="Retry selected failed jobs", permissions=['retry'])
+    def retry(self, request, queryset):
+        count = queryset.filter(status='failed').update(
+            status='queued', attempts=0, run_at=timezone.now(), finished_at=None
+        )
+        self.message_user(request, f"Queued {count} failed jobs again.", messages.SUCCESS)
+
+
+@admin.register(SalesRollup)
+class SalesRollupAdmin(admin.ModelAdmin):
+    """
+    A read-only revenue dashboard answered from the sales rollups alone, never from PlacedOrder.
+
+    Cancelled order lines earn nothing, so they are left out of the headline
+    and of the per category, state and day tables, and reported on their own
+    and in the per status table.
+    """
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+    def changelist_view(self, request, extra_context=None):
+        try:
+            days = int(request.GET.get("days", 30))
+        except ValueError:
+            days = 30
+        if days not in DASHBOARD_PERIODS:
+            days = 30
+        since = timezone.localdate() - timedelta(days=days - 1)
+        rollups = SalesRollup.objects.filter(day__gte=since)
+        sales = rollups.exclude(status="Cancel")
+        totals = {"orders": Sum("orders"), "units": Sum("units"), "revenue": Sum("revenue")}
+
+        def breakdown(rows, field, choices):
+            names = dict(choices)
+            rows = rows.values(field).annotate(**totals).filter(orders__gt=0).order_by("-revenue")
+            return [{**row, "name": names.get(row[field], row[field])} for row in rows]
+
+        context = {
+            **self.admin_site.each_context(request),
+            **(extra_context or {}),
+            "title": "Sales dashboard",
+            "opts": self.model._meta,
+            "days": days,
+            "periods": DASHBOARD_PERIODS,
+            "since": since,
+            "totals": sales.aggregate(**totals),
+            "cancelled": rollups.filter(status="Cancel").aggregate(**totals),
+            "by_day": sales.values("day").annotate(**totals).filter(orders__gt=0).order_by("-day"),
+            "by_category": breakdown(sales, "category", CATEGORY_CHOICES),
+            "by_state": breakdown(sales, "state", STATE_CHOICES),
+            "by_status": breakdown(rollups, "status", STATUS_CHOICES),
+        }
+        return TemplateResponse(request, "admin/app/salesrollup/dashboard.html", context)
@@ -0,0 +1,201 @@
+import gzip
+import logging
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.base import ContentFile
+from django.http import FileResponse, Http404
+from django.urls import re_path
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+
+from .images import DERIVATIVE_DIR
+
+try:
+    import brotli
+except ImportError:  # Optional: without it only gzip variants are built.
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Names containing a content hash never change, so browsers may keep them for a year.
+IMMUTABLE_MAX_AGE = 60 * 60 * 24 * 365
+MEDIA_MAX_AGE = 60 * 60 * 24
+STATIC_MAX_AGE = 60 * 5
+
+# Images and fonts are already compressed; only text formats get variants.
+COMPRESSIBLE_EXTENSIONS = {".css", ".js", ".map", ".svg", ".json", ".txt", ".xml", ".html", ".eot", ".ttf"}
+# Preferred encodings first, with the suffix of their pre-built files.
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+MIN_COMPRESSION_GAIN = 0.95
+
+
+def compress(data):
+    """Returns {suffix: bytes} of the pre-compressed variants worth keeping for a file's content."""
+    variants = {".gz": gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants[".br"] = brotli.compress(data, quality=11)
+    return {suffix: body for suffix, body in variants.items() if len(body) < len(data) * MIN_COMPRESSION_GAIN}
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    Manifest storage that also writes gzip and, when brotli is installed, brotli copies of text assets.
+
+    References in CSS to files missing from the static directories (the
+    bundled Font Awesome stylesheet points at webfonts that are not shipped)
+    are left as they are instead of failing collectstatic.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._unresolved = set()
+
+    def url_converter(self, name, hashed_files, template=None):
+        convert = super().url_converter(name, hashed_files, template)
+
+        def converter(matchobj):
+            try:
+                return convert(matchobj)
+            except ValueError:
+                # Logged once; post-processing passes over each file several times.
+                if (name, matchobj.group(0)) not in self._unresolved:
+                    self._unresolved.add((name, matchobj.group(0)))
+                    logger.warning("Leaving unresolved reference %s in %s", matchobj.group(0), name)
+                return matchobj.group(0)
+
+        return converter
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+        if dry_run:
+            return
+        names = list(paths) + list(self.hashed_files.values())
+        for name in names:
+            if os.path.splitext(name)[1] not in COMPRESSIBLE_EXTENSIONS or not self.exists(name):
+                continue
+            with self.open(name) as f:
+                data = f.read()
+            for suffix, body in compress(data).items():
+                if self.exists(name + suffix):
+                    self.delete(name + suffix)
+                self._save(name + suffix, ContentFile(body))
+
+
+# The names ManifestStaticFilesStorage gives copies of static files, e.g. "app/css/style.0a1b2c3d4e5f.css".
+HASHED_STATIC_NAME = re.compile(r"\.[0-9a-f]{12}\.[^/.]+$")
+
+
+def accepted_encodings(header):
+    """
+    Parses an Accept-Encoding header into {coding: q-value}.
+
+    A coding given q=0 is refused, and "*" stands for every coding the header
+    does not name, so "gzip;q=0" or "*;q=0" rule out gzip.
+    """
+    codings = {}
+    for part in header.split(","):
+        coding, *params = part.split(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = min(max(float(value), 0.0), 1.0)
+                except ValueError:
+                    q = 0.0
+        codings[coding] = q
+    return codings
+
+
+def serve_file(request, path, document_root, max_age, immutable=False):
+    """
+    Serves a file below document_root, preferring a pre-compressed variant the client accepts.
+
+    The file is handed to FileResponse, which WSGI servers that provide
+    wsgi.file_wrapper (gunicorn, uWSGI, mod_wsgi) send with sendfile().
+
+    Args:
+        request (HttpRequest): The request.
+        path (str): The path of the file relative to document_root.
+        document_root (str): The directory files are served from.
+        max_age (int): Seconds clients may cache the file without revalidating.
+        immutable (bool, optional): Whether the content behind the name never changes. Default is False.
+
+    Raises:
+        Http404: If the file does not exist or the path leaves document_root.
+    """
+    try:
+        fullpath = safe_join(document_root, path)
+    except SuspiciousFileOperation:
+        raise Http404("Invalid asset path")
+    if not os.path.isfile(fullpath):
+        raise Http404(f"{path} does not exist")
+
+    served, encoding = fullpath, None
+    compressible = os.path.splitext(fullpath)[1] in COMPRESSIBLE_EXTENSIONS
+    if compressible:
+        accepted = accepted_encodings(request.headers.get("Accept-Encoding", ""))
+        best = 0
+        # The client's highest q-value wins; on a tie, the first of ENCODINGS.
+        for candidate, suffix in ENCODINGS:
+            q = accepted.get(candidate, accepted.get("*", 0))
+            if q > best and os.path.isfile(fullpath + suffix):
+                served, encoding, best = fullpath + suffix, candidate, q
+
+    stat = os.stat(fullpath)
+    # Each encoding is a different representation, so it gets its own validator.
+    etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}{"-" + encoding if encoding else ""}"'
+    headers = {"ETag": etag, "Last-Modified": http_date(stat.st_mtime)}
+    response = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    if response is None:
+        content_type = mimetypes.guess_type(fullpath)[0] or "application/octet-stream"
+        response = FileResponse(open(served, "rb"), content_type=content_type)
+        if encoding:
+            response["Content-Encoding"] = encoding
+    for header, value in headers.items():
+        response[header] = value
+    if immutable:
+        patch_cache_control(response, public=True, max_age=IMMUTABLE_MAX_AGE, immutable=True)
+    else:
+        patch_cache_control(response, public=True, max_age=max_age)
+    if compressible:
+        patch_vary_headers(response, ("Accept-Encoding",))
+    return response
+
+
+def serve_static(request, path):
+    """Serves collected static files; names hashed by collectstatic are cached for a year."""
+    immutable = HASHED_STATIC_NAME.search(path) is not None
+    return serve_file(request, path, settings.STATIC_ROOT, STATIC_MAX_AGE, immutable)
+
+
+def serve_media(request, path):
+    """Serves uploads; image derivatives carry a content hash in their names and are cached for a year."""
+    immutable = path.startswith(DERIVATIVE_DIR + "/")
+    return serve_file(request, path, settings.MEDIA_ROOT, MEDIA_MAX_AGE, immutable)
+
+
+def _prefix_pattern(url):
+    return rf"^{re.escape(url.lstrip('/'))}(?P<path>.+)$"
+
+
+def asset_urlpatterns():
+    """
+    Returns the routes serving collected static files and uploads from the application.
+
+    During development runserver answers static requests itself before they
+    reach these routes, straight from the app directories.
+    """
+    return [
+        re_path(_prefix_pattern(settings.STATIC_URL), serve_static),
+        re_path(_prefix_pattern(settings.MEDIA_URL), serve_media),
+    ]
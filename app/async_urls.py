@@ -0,0 +1,29 @@
+"""
+The URLconf of app.urls with the hot read paths and JSON cart endpoints served by app.async_views.
+
+Shopper/urls.py includes this module instead of app.urls when settings.ASYNC_VIEWS is on.
+"""
+from django.urls import URLPattern
+
+from . import async_views, urls, views
+
+# Sync view (or class-based view) -> the async view replacing it.
+ASYNC_VIEWS = {
+    views.HomeView: async_views.home,
+    views.ProductDetailView: async_views.product_detail,
+    views.catalog: async_views.catalog,
+    views.search: async_views.search,
+    views.plus_cart: async_views.plus_cart,
+    views.minus_cart: async_views.minus_cart,
+    views.remove_cart: async_views.remove_cart,
+}
+
+
+def _async_pattern(pattern):
+    view = ASYNC_VIEWS.get(getattr(pattern.callback, "view_class", pattern.callback))
+    if view is None:
+        return pattern
+    return URLPattern(pattern.pattern, view, pattern.default_args, pattern.name)
+
+
+urlpatterns = [_async_pattern(p) for p in urls.urlpatterns]
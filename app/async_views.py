@@ -0,0 +1,121 @@
+"""
+Native async versions of the hot read paths and the JSON cart endpoints.
+
+Under ASGI, Shopper/urls.py routes these URLs here instead of to app.views (see
+settings.ASYNC_VIEWS), so a request only leaves the event loop for the queries
+themselves. They render the same templates and return the same JSON as their
+sync counterparts in app.views.
+"""
+from asgiref.sync import sync_to_async
+from django.core.exceptions import PermissionDenied
+from django.db.models import F
+from django.http import Http404, JsonResponse
+from django.shortcuts import render
+
+from .cart import aget_cart_summary, arefresh_cart_summary
+from .catalog import FILTER_PARAMS, aget_facets, facet_options, filter_products, get_listing, parse_filters
+from .middleware import aget_user
+from .models import Cart, Product
+from .pagecache import CART_BADGE_PLACEHOLDER, cache_page_shell
+from .rails import aget_rails
+from .search import search_results
+
+
+async def cart_items_count(request):
+    """Async version of app.views.cart_items_count()."""
+    user = await aget_user(request)
+    if not user.is_authenticated:
+        return 0
+    if getattr(request, "cart_badge_placeholder", False):
+        return CART_BADGE_PLACEHOLDER
+    return (await aget_cart_summary(user))["count"]
+
+
+async def cart_user(request):
+    """
+    Returns the logged-in user of a cart endpoint.
+
+    Raises:
+        PermissionDenied: If the request is anonymous.
+    """
+    user = await aget_user(request)
+    if not user.is_authenticated:
+        raise PermissionDenied
+    return user
+
+
+@cache_page_shell()
+async def home(request):
+    """Async version of app.views.HomeView."""
+    context = {**await aget_rails(), "total_items_count": await cart_items_count(request)}
+    return render(request, "app/home.html", context)
+
+
+@cache_page_shell(user_shell=False)
+async def product_detail(request, pk):
+    """Async version of app.views.ProductDetailView."""
+    try:
+        product = await Product.objects.aget(pk=pk)
+    except Product.DoesNotExist:
+        raise Http404("No Product matches the given query.")
+    user = await aget_user(request)
+    already_in_cart = user.is_authenticated and await Cart.objects.filter(product=product, user=user).aexists()
+    context = {
+        "product": product,
+        "already_in_cart": already_in_cart,
+        "total_items_count": await cart_items_count(request),
+    }
+    return render(request, "app/productdetail.html", context)
+
+
+@cache_page_shell(query_params=FILTER_PARAMS)
+async def catalog(request, slug, data=None):
+    """Async version of app.views.catalog()."""
+    listing = get_listing(slug)
+    facets = await aget_facets(listing)
+    filters = parse_filters(listing, request.GET, data, facets=facets)
+    context = {
+        "listing": listing,
+        "products": [product async for product in filter_products(listing, filters)],
+        "facets": facet_options(listing, filters, facets),
+        "total_items_count": await cart_items_count(request),
+    }
+    return render(request, "app/catalog.html", context)
+
+
+async def search(request):
+    """Async version of app.views.search(); the search backends run raw SQL, so they run in a worker thread."""
+    query = request.GET["query"]
+    allprods, truncated = ([], False) if len(query) > 78 else await sync_to_async(search_results)(query)
+    await aget_user(request)  # base.html reads request.user.
+    return render(request, "app/search.html", {"allprods": allprods, "query": query, "truncated": truncated})
+
+
+async def change_quantity(request, delta):
+    user = await cart_user(request)
+    rows = Cart.objects.filter(product=request.GET["prod_id"], user=user)
+    if not await rows.aupdate(quantity=F("quantity") + delta):
+        raise Http404("The product is not in the cart.")
+    quantity = (await rows.aget()).quantity
+    totals = await arefresh_cart_summary(user)
+    return JsonResponse({"quantity": quantity, "amount": totals["amount"], "total_amount": totals["total_amount"]})
+
+
+async def plus_cart(request):
+    """Async version of app.views.plus_cart()."""
+    return await change_quantity(request, 1)
+
+
+async def minus_cart(request):
+    """Async version of app.views.minus_cart()."""
+    return await change_quantity(request, -1)
+
+
+async def remove_cart(request):
+    """Async version of app.views.remove_cart()."""
+    user = await cart_user(request)
+    deleted, _ = await Cart.objects.filter(product=request.GET["prod_id"], user=user).adelete()
+    if not deleted:
+        raise Http404("The product is not in the cart.")
+    totals = await arefresh_cart_summary(user)
+    return JsonResponse({"amount": totals["amount"], "total_amount": totals["total_amount"]})
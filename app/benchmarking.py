@@ -0,0 +1,207 @@
+import math
+import statistics
+import time
+from contextlib import contextmanager
+from itertools import islice
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import override_settings
+
+from .models import CATEGORY_CHOICES, STATUS_CHOICES, Cart, Customer, PlacedOrder, Product
+from .orders import snapshot
+
+
+@contextmanager
+def benchmark_database(keepdb=False, verbosity=0):
+    """
+    Runs the enclosed block against a throwaway test database.
+
+    Benchmarks seed hundreds of thousands of rows, so they must never touch
+    the development database configured in settings. They also clear the
+    cache between scenarios, so they get an in-process cache of their own
+    rather than the site's shared one.
+
+    Args:
+        keepdb (bool, optional): Reuse an existing benchmark database. Default is False.
+        verbosity (int, optional): Verbosity passed to the database creation. Default is 0.
+    """
+    old_name = connection.settings_dict["NAME"]
+    connection.creation.create_test_db(verbosity=verbosity, autoclobber=True, keepdb=keepdb)
+    try:
+        with override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}):
+            yield connection
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=verbosity, keepdb=keepdb)
+
+
+def percentile(samples, pct):
+    """
+    Returns the given percentile of a list of samples using nearest-rank.
+
+    Args:
+        samples (list): The measured values.
+        pct (float): The percentile to compute, between 0 and 100.
+
+    Returns:
+        float: The sample at the requested percentile, or 0.0 for no samples.
+    """
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(0, min(len(ordered) - 1, math.ceil(pct / 100.0 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def summarize(samples):
+    """
+    Summarizes latency samples given in seconds.
+
+    Args:
+        samples (list): Latency samples in seconds.
+
+    Returns:
+        dict: The sample count and the mean, p50, p95, p99 and max latency in milliseconds.
+    """
+    ms = [s * 1000.0 for s in samples]
+    return {
+        "samples": len(ms),
+        "mean_ms": round(statistics.fmean(ms), 4) if ms else 0.0,
+        "p50_ms": round(percentile(ms, 50), 4),
+        "p95_ms": round(percentile(ms, 95), 4),
+        "p99_ms": round(percentile(ms, 99), 4),
+        "max_ms": round(max(ms), 4) if ms else 0.0,
+    }
+
+
+def measure(func, repeat=100, warmup=5):
+    """
+    Calls a function repeatedly and summarizes its latency.
+
+    Args:
+        func (callable): A function taking no arguments.
+        repeat (int, optional): Number of measured calls. Default is 100.
+        warmup (int, optional): Number of unmeasured calls made first. Default is 5.
+
+    Returns:
+        dict: The latency summary returned by summarize().
+    """
+    for _ in range(warmup):
+        func()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+def seed_users(count, prefix="bench", batch_size=2000):
+    """
+    Bulk creates users with unusable passwords.
+
+    Args:
+        count (int): Number of users to create.
+        prefix (str, optional): Username prefix. Default is "bench".
+        batch_size (int, optional): Rows per INSERT. Default is 2000.
+
+    Returns:
+        list: The ids of the created users.
+    """
+    users = []
+    for i in range(count):
+        user = User(username=f"{prefix}{i}")
+        user.set_unusable_password()
+        users.append(user)
+    User.objects.bulk_create(users, batch_size=batch_size)
+    return list(User.objects.filter(username__startswith=prefix).values_list("id", flat=True))
+
+
+def seed_products(count, batch_size=2000):
+    """
+    Bulk creates a synthetic catalog spread over every category.
+
+    Args:
+        count (int): Number of products to create.
+        batch_size (int, optional): Rows per INSERT. Default is 2000.
+
+    Returns:
+        list: The ids of the created products.
+    """
+    categories = [code for code, _ in CATEGORY_CHOICES]
+    brands = ["Samsung", "Redmi", "Apple", "Dell", "Sony", "Nike", "Titan", "Levis"]
+    ids = []
+    for start in range(0, count, batch_size):
+        batch = []
+        for i in range(start, min(count, start + batch_size)):
+            price = float(200 + (i * 7919) % 150000)
+            batch.append(
+                Product(
+                    title=f"Product {i} {brands[i % len(brands)]}",
+                    selling_price=price * 1.2,
+                    discounted_price=price,
+                    description=f"Synthetic product number {i}",
+                    brand=brands[i % len(brands)],
+                    category=categories[i % len(categories)],
+                    product_image=f"productimg/{i % 12 + 1}.jpg",
+                )
+            )
+        ids.extend(p.id for p in Product.objects.bulk_create(batch))
+    return ids
+
+
+def seed_carts(user_ids, product_ids, lines_per_user, rng, batch_size=5000):
+    """
+    Bulk creates cart lines for every user, each for a different product.
+
+    Args:
+        user_ids (list): The users to fill carts for.
+        product_ids (list): The products to pick from.
+        lines_per_user (int): Cart lines per user.
+        rng (random.Random): The source of the product picks and quantities.
+        batch_size (int, optional): Rows per INSERT. Default is 5000.
+    """
+    rows = [
+        Cart(user_id=user_id, product_id=product_id, quantity=rng.randint(1, 3))
+        for user_id in user_ids
+        for product_id in rng.sample(product_ids, min(lines_per_user, len(product_ids)))
+    ]
+    Cart.objects.bulk_create(rows, batch_size=batch_size)
+
+
+def seed_orders(user_ids, product_ids, orders_per_user, rng, batch_size=5000):
+    """
+    Bulk creates a delivery address and an order history for every user.
+
+    Args:
+        user_ids (list): The users to create orders for.
+        product_ids (list): The products to pick from.
+        orders_per_user (int): Placed order lines per user.
+        rng (random.Random): The source of the product picks, quantities and statuses.
+        batch_size (int, optional): Rows per INSERT. Default is 5000.
+
+    Returns:
+        dict: {user id: customer id} of the created addresses.
+    """
+    customers = Customer.objects.bulk_create(
+        Customer(user_id=user_id, name=f"Customer {user_id}", locality="Main Road", city="Surat", zipcode=395007, state="Gujarat")
+        for user_id in user_ids
+    )
+    statuses = [code for code, _ in STATUS_CHOICES]
+    products = {product.id: product for product in Product.objects.filter(id__in=product_ids)}
+    rows = (
+        PlacedOrder(
+            user_id=customer.user_id,
+            customer_id=customer.id,
+            product_id=product_id,
+            quantity=rng.randint(1, 3),
+            status=rng.choice(statuses),
+            **snapshot(products[product_id], customer),
+        )
+        for customer in customers
+        for product_id in (rng.choice(product_ids) for _ in range(orders_per_user))
+    )
+    # Built a batch at a time: a million order lines never sit in memory together.
+    while batch := list(islice(rows, batch_size)):
+        PlacedOrder.objects.bulk_create(batch)
+    return {customer.user_id: customer.id for customer in customers}
@@ -0,0 +1,227 @@
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Count, F, FloatField, Sum
+from django.db.models.functions import Coalesce
+
+from .catalog import acatalog_version, catalog_version
+from .models import Cart, Product
+
+SHIPPING_AMOUNT = 70.0
+CART_SUMMARY_TIMEOUT = 60 * 60 * 24
+MAX_BATCH_OPERATIONS = 100
+MAX_QUANTITY = 100
+
+
+class CartOperationError(ValueError):
+    """Raised when a batch of cart operations is malformed; none of its operations is applied."""
+
+
+def cart_summary_key(user_id, version):
+    # The amounts depend on product prices, so a catalog change retires every cached summary.
+    return f"cart-summary:{version}:{user_id}"
+
+
+# Shared by cart_totals() and acart_totals().
+_TOTALS = {
+    "count": Count("id"),
+    "amount": Coalesce(
+        Sum(F("quantity") * F("product__discounted_price"), output_field=FloatField()),
+        0.0,
+        output_field=FloatField(),
+    ),
+}
+
+
+def _summarize(totals):
+    count = totals["count"]
+    amount = float(totals["amount"])
+    shipping_amount = SHIPPING_AMOUNT if count else 0.0
+    return {
+        "count": count,
+        "amount": amount,
+        "shipping_amount": shipping_amount,
+        "total_amount": amount + shipping_amount,
+    }
+
+
+def cart_totals(user):
+    """
+    Computes the totals of a user's cart in a single aggregated query.
+
+    The subtotal is summed by the database over the user's cart rows joined to
+    their products, so the cost stays proportional to the size of this user's
+    cart instead of the whole Cart table.
+
+    Args:
+        user (User): The user whose cart should be totalled.
+
+    Returns:
+        dict: A dictionary with the following keys:
+            - count (int): The number of rows in the user's cart.
+            - amount (float): The subtotal amount of the cart (excluding shipping).
+            - shipping_amount (float): The shipping charged for the cart.
+            - total_amount (float): The total amount of the cart (including shipping),
+              or 0.0 when the cart is empty.
+    """
+    return _summarize(Cart.objects.filter(user=user).aggregate(**_TOTALS))
+
+
+async def acart_totals(user):
+    """Async version of cart_totals()."""
+    return _summarize(await Cart.objects.filter(user=user).aaggregate(**_TOTALS))
+
+
+def refresh_cart_summary(user, totals=None):
+    """
+    Writes the user's current cart totals through to the cache.
+
+    Every view that changes a cart calls this after the change, so the cached
+    summary is always the one the database would return. The summary is keyed
+    on the catalog version read before the totals, so totals computed while a
+    price changes are stored under the version that is being retired.
+
+    Args:
+        user (User): The user whose cart changed.
+        totals (dict, optional): Totals already computed by cart_totals() after the change,
+            to avoid recomputing them. Default is None.
+
+    Returns:
+        dict: The totals that were cached.
+    """
+    version = catalog_version()
+    if totals is None:
+        totals = cart_totals(user)
+    cache.set(cart_summary_key(user.pk, version), totals, CART_SUMMARY_TIMEOUT)
+    return totals
+
+
+async def arefresh_cart_summary(user):
+    """Async version of refresh_cart_summary()."""
+    version = await acatalog_version()
+    totals = await acart_totals(user)
+    await cache.aset(cart_summary_key(user.pk, version), totals, CART_SUMMARY_TIMEOUT)
+    return totals
+
+
+def invalidate_cart_summary(user_id):
+    """Drops the cached cart summary of a user, e.g. after a change made outside the views."""
+    cache.delete(cart_summary_key(user_id, catalog_version()))
+
+
+def get_cart_summary(user):
+    """
+    Returns the cart totals of a user, served from the cache when warm.
+
+    The cached totals are dropped by any cart change and, through the catalog
+    version, by any product change, such as a new price.
+
+    Args:
+        user (User): The user whose cart summary is requested.
+
+    Returns:
+        dict: The same dictionary as cart_totals().
+    """
+    totals = cache.get(cart_summary_key(user.pk, catalog_version()))
+    if totals is None:
+        totals = refresh_cart_summary(user)
+    return totals
+
+
+async def aget_cart_summary(user):
+    """Async version of get_cart_summary()."""
+    totals = await cache.aget(cart_summary_key(user.pk, await acatalog_version()))
+    if totals is None:
+        totals = await arefresh_cart_summary(user)
+    return totals
+
+
+def add_cart_item(user, product, quantity=1):
+    """
+    Adds a product to a user's cart, or raises its quantity if it is already there.
+
+    On SQLite and PostgreSQL this is a single INSERT ... ON CONFLICT DO UPDATE
+    against the unique (user, product) constraint, so double clicks and
+    concurrent requests add up instead of creating duplicate rows. Other
+    databases lock the existing row first.
+
+    Args:
+        user (User): The user whose cart is changed.
+        product (Product): The product to add.
+        quantity (int, optional): The quantity to add. Default is 1.
+    """
+    if connection.vendor in ("sqlite", "postgresql"):
+        table = connection.ops.quote_name(Cart._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {table} (user_id, product_id, quantity) VALUES (%s, %s, %s) "
+                f"ON CONFLICT (user_id, product_id) DO UPDATE SET quantity = {table}.quantity + excluded.quantity",
+                [user.pk, product.pk, quantity],
+            )
+    else:
+        with transaction.atomic():
+            item, created = Cart.objects.select_for_update().get_or_create(
+                user=user, product=product, defaults={"quantity": quantity}
+            )
+            if not created:
+                Cart.objects.filter(pk=item.pk).update(quantity=F("quantity") + quantity)
+    invalidate_cart_summary(user.pk)
+
+
+def _parse_operation(operation):
+    if not isinstance(operation, dict) or operation.get("op") not in ("add", "set", "remove"):
+        raise CartOperationError("Every operation needs an op of add, set or remove.")
+    product = operation.get("product")
+    if not isinstance(product, int) or isinstance(product, bool):
+        raise CartOperationError("Every operation needs an integer product id.")
+    if operation["op"] == "remove":
+        return "remove", product, 0
+    quantity = operation.get("quantity", 1 if operation["op"] == "add" else None)
+    lowest = 1 if operation["op"] == "add" else 0
+    if not isinstance(quantity, int) or isinstance(quantity, bool) or not lowest <= quantity <= MAX_QUANTITY:
+        raise CartOperationError(f"{operation['op']} needs an integer quantity between {lowest} and {MAX_QUANTITY}.")
+    return operation["op"], product, quantity
+
+
+def apply_cart_operations(user, operations):
+    """
+    Applies a batch of cart operations in one transaction and caches the resulting totals.
+
+    Operations are applied in order:
+        {"op": "add", "product": id, "quantity": n}  adds n (default 1), like add_cart_item().
+        {"op": "set", "product": id, "quantity": n}  sets the quantity; 0 removes the line.
+        {"op": "remove", "product": id}              removes the line.
+
+    Args:
+        user (User): The user whose cart is changed.
+        operations (list): The operations, at most MAX_BATCH_OPERATIONS.
+
+    Returns:
+        dict: The totals returned by cart_totals(), plus items: {product id: quantity} for
+        every product the batch touched, 0 for removed lines.
+
+    Raises:
+        CartOperationError: If an operation is malformed or names an unknown product.
+    """
+    if not isinstance(operations, list) or not 0 < len(operations) <= MAX_BATCH_OPERATIONS:
+        raise CartOperationError(f"Send between 1 and {MAX_BATCH_OPERATIONS} operations.")
+    parsed = [_parse_operation(operation) for operation in operations]
+    products = {product for op, product, _ in parsed if op != "remove"}
+    missing = products - set(Product.objects.filter(pk__in=products).values_list("pk", flat=True))
+    if missing:
+        raise CartOperationError(f"Unknown products: {sorted(missing)}.")
+
+    with transaction.atomic():
+        for op, product, quantity in parsed:
+            lines = Cart.objects.filter(user=user, product_id=product)
+            if op == "add":
+                add_cart_item(user, Product(pk=product), quantity)
+            elif op == "remove" or quantity == 0:
+                lines.delete()
+            elif not lines.update(quantity=quantity):
+                add_cart_item(user, Product(pk=product), quantity)
+        touched = {product for _, product, _ in parsed}
+        items = dict.fromkeys(touched, 0)
+        items.update(Cart.objects.filter(user=user, product_id__in=touched).values_list("product_id", "quantity"))
+        totals = cart_totals(user)
+    refresh_cart_summary(user, totals)
+    return {**totals, "items": items}
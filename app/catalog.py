@@ -0,0 +1,344 @@
+from dataclasses import dataclass, field
+
+from django.core.cache import cache
+from django.db.models import Count, Q
+from django.http import Http404, QueryDict
+
+from .models import CATEGORY_CHOICES, Product
+
+CATALOG_VERSION_KEY = "catalog-version"
+FACETS_TIMEOUT = 60 * 60
+
+CATEGORY_NAMES = dict(CATEGORY_CHOICES)
+
+# The GET parameters parse_filters() reads; the rest of a query string is ignored.
+FILTER_PARAMS = ("brand", "price", "category", "sort")
+
+SORTS = {
+    "featured": ("id",),
+    "price_asc": ("discounted_price", "id"),
+    "price_desc": ("-discounted_price", "-id"),
+    "newest": ("-id",),
+}
+
+# Price bands offered as facets per category, as (low, high) bounds. A band with
+# both bounds is inclusive on both ends; "below" bands exclude high and "above"
+# bands exclude low. Requests may also filter on any other band.
+PRICE_BANDS = {
+    "M": ((None, 10000), (10000, 20000), (20000, None)),
+    "L": ((None, 40000), (40000, 100000), (100000, None)),
+    "TV": ((None, 50000), (50000, 100000), (100000, None)),
+    "TW": ((None, 500), (500, 1000), (1000, None)),
+    "BW": ((None, 500), (500, 1000), (1000, None)),
+    "WW": ((None, 10000), (10000, 20000), (20000, None)),
+    "SH": ((None, 3000), (3000, 10000), (10000, None)),
+}
+DEFAULT_PRICE_BANDS = ((None, 1000), (1000, 10000), (10000, None))
+
+
+def band_key(band):
+    """Encodes a price band for URLs, e.g. "-10000", "10000-20000" or "20000-"."""
+    low, high = band
+    return f"{'' if low is None else low}-{'' if high is None else high}"
+
+
+def parse_band(key):
+    """
+    Decodes a price band encoded by band_key().
+
+    Raises:
+        ValueError: If the key is not a valid band.
+    """
+    low, sep, high = key.partition("-")
+    if not sep or not (low or high):
+        raise ValueError(f"Invalid price band {key!r}")
+    band = tuple(int(value) if value else None for value in (low, high))
+    if None not in band and band[0] > band[1]:
+        raise ValueError(f"Invalid price band {key!r}")
+    return band
+
+
+def band_label(band):
+    low, high = band
+    if low is None:
+        return f"Below {high}"
+    if high is None:
+        return f"Above {low}"
+    return f"{low} - {high}"
+
+
+def band_q(band):
+    """Returns the filter selecting the products of a price band."""
+    low, high = band
+    q = Q()
+    if low is not None:
+        q &= Q(discounted_price__gte=low) if high is not None else Q(discounted_price__gt=low)
+    if high is not None:
+        q &= Q(discounted_price__lte=high) if low is not None else Q(discounted_price__lt=high)
+    return q
+
+
+@dataclass(frozen=True)
+class Listing:
+    """A catalog page: a set of categories with its price bands and the filter slugs of its old URLs."""
+
+    slug: str
+    title: str
+    categories: tuple
+    price_bands: tuple
+    legacy_filters: dict = field(default_factory=dict)
+
+
+def category_listing(code):
+    return Listing(
+        slug=code.lower(),
+        title=CATEGORY_NAMES[code],
+        categories=(code,),
+        price_bands=PRICE_BANDS.get(code, DEFAULT_PRICE_BANDS),
+    )
+
+
+def _legacy_bands(bands, slugs):
+    return {slug: {"price": band_key(band)} for slug, band in zip(slugs, bands)}
+
+
+# One listing per entry of CATEGORY_CHOICES, plus the listings behind the old
+# per-category URLs, which map their path filters onto query filters.
+LISTINGS = {code.lower(): category_listing(code) for code, _ in CATEGORY_CHOICES}
+LISTINGS.update(
+    {
+        "mobile": Listing(
+            "mobile", "Mobile", ("M",), PRICE_BANDS["M"],
+            _legacy_bands(PRICE_BANDS["M"], ["Below10000", "10000-20000", "Above10000"]),
+        ),
+        "laptop": Listing(
+            "laptop", "Laptops", ("L",), PRICE_BANDS["L"],
+            _legacy_bands(PRICE_BANDS["L"], ["Below40000", "40000-100000", "Above100000"]),
+        ),
+        "tv": Listing(
+            "tv", "Television", ("TV",), PRICE_BANDS["TV"],
+            _legacy_bands(PRICE_BANDS["TV"], ["Below50000", "50000-100000", "Above100000"]),
+        ),
+        "clothing": Listing(
+            "clothing", "Clothing", ("TW", "BW"), PRICE_BANDS["TW"],
+            {
+                "TW": {"category": "TW"},
+                "BW": {"category": "BW"},
+                "Below1000": {"price": band_key((None, 1000))},
+                "500-1000": {"price": band_key((500, 1000))},
+                "Above1000": {"price": band_key((1000, None))},
+            },
+        ),
+        "watch": Listing(
+            "watch", "Wrist Watch", ("WW",), PRICE_BANDS["WW"],
+            _legacy_bands(PRICE_BANDS["WW"], ["Below10000", "10000-20000", "Above20000"]),
+        ),
+        "shoes": Listing(
+            "shoes", "Shoes", ("SH",), PRICE_BANDS["SH"],
+            _legacy_bands(PRICE_BANDS["SH"], ["Below3000", "3000-10000", "Above10000"]),
+        ),
+    }
+)
+
+
+def get_listing(slug):
+    try:
+        return LISTINGS[slug]
+    except KeyError:
+        raise Http404(f"No catalog named {slug!r}")
+
+
+def catalog_version():
+    """Returns the current catalog version; it changes whenever a product changes."""
+    return cache.get_or_set(CATALOG_VERSION_KEY, 1, None)
+
+
+async def acatalog_version():
+    """Async version of catalog_version()."""
+    return await cache.aget_or_set(CATALOG_VERSION_KEY, 1, None)
+
+
+def bump_catalog_version():
+    """Invalidates every cache entry keyed on the catalog version."""
+    try:
+        cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        cache.set(CATALOG_VERSION_KEY, 2, None)
+
+
+def parse_filters(listing, params, legacy_slug=None, facets=None):
+    """
+    Validates the filters of a catalog request.
+
+    Args:
+        listing (Listing): The listing being browsed.
+        params (QueryDict): The GET parameters: "brand" (repeatable), "price", "category" and "sort".
+        legacy_slug (str, optional): The filter slug of an old per-category URL. Default is None.
+        facets (dict, optional): The facet counts of the listing, if already loaded. Default is None,
+            which loads them when a legacy slug needs checking against the brands.
+
+    Returns:
+        dict: The filters with keys brands (list), price (band or None), category (str or None) and sort (str).
+
+    Raises:
+        Http404: If the legacy slug or a filter value is unknown.
+    """
+    params = params.copy()
+    if legacy_slug is not None:
+        if legacy_slug in listing.legacy_filters:
+            legacy = listing.legacy_filters[legacy_slug]
+        elif legacy_slug in (facets or get_facets(listing))["brands"]:
+            legacy = {"brand": legacy_slug}
+        else:
+            raise Http404(f"Unknown filter {legacy_slug!r}")
+        for key, value in legacy.items():
+            params.setlist(key, [value])
+
+    price = params.get("price")
+    try:
+        band = parse_band(price) if price else None
+    except ValueError:
+        raise Http404(f"Unknown price band {price!r}")
+    category = params.get("category")
+    if category and category not in listing.categories:
+        raise Http404(f"Unknown category {category!r}")
+    sort = params.get("sort") or "featured"
+    if sort not in SORTS:
+        raise Http404(f"Unknown sort {sort!r}")
+    return {
+        "brands": [b for b in params.getlist("brand") if b],
+        "price": band,
+        "category": category or None,
+        "sort": sort,
+    }
+
+
+def filter_products(listing, filters):
+    """Returns the products of a listing that match the parsed filters, in the requested order."""
+    products = Product.objects.filter(category__in=listing.categories)
+    if filters["category"]:
+        products = products.filter(category=filters["category"])
+    if filters["brands"]:
+        products = products.filter(brand__in=filters["brands"])
+    if filters["price"]:
+        products = products.filter(band_q(filters["price"]))
+    return products.order_by(*SORTS[filters["sort"]])
+
+
+def _facet_rows(listing):
+    band_counts = {
+        f"band_{i}": Count("id", filter=band_q(band)) for i, band in enumerate(listing.price_bands)
+    }
+    return (
+        Product.objects.filter(category__in=listing.categories)
+        .values("category", "brand")
+        .annotate(total=Count("id"), **band_counts)
+        .order_by()
+    )
+
+
+def _fold_facets(listing, rows):
+    facets = {"categories": {}, "brands": {}, "price": {band_key(b): 0 for b in listing.price_bands}}
+    for row in rows:
+        facets["categories"][row["category"]] = facets["categories"].get(row["category"], 0) + row["total"]
+        facets["brands"][row["brand"]] = facets["brands"].get(row["brand"], 0) + row["total"]
+        for i, band in enumerate(listing.price_bands):
+            facets["price"][band_key(band)] += row[f"band_{i}"]
+    return facets
+
+
+def compute_facets(listing):
+    """
+    Counts the products of a listing per category, brand and price band in one grouped query.
+
+    Returns:
+        dict: {"categories": {code: n}, "brands": {brand: n}, "price": {band_key: n}}.
+    """
+    return _fold_facets(listing, _facet_rows(listing))
+
+
+async def acompute_facets(listing):
+    """Async version of compute_facets()."""
+    return _fold_facets(listing, [row async for row in _facet_rows(listing)])
+
+
+def get_facets(listing):
+    """Returns the facet counts of a listing, cached until the next product change."""
+    key = f"catalog-facets:{listing.slug}:{catalog_version()}"
+    facets = cache.get(key)
+    if facets is None:
+        facets = compute_facets(listing)
+        cache.set(key, facets, FACETS_TIMEOUT)
+    return facets
+
+
+async def aget_facets(listing):
+    """Async version of get_facets()."""
+    key = f"catalog-facets:{listing.slug}:{await acatalog_version()}"
+    facets = await cache.aget(key)
+    if facets is None:
+        facets = await acompute_facets(listing)
+        await cache.aset(key, facets, FACETS_TIMEOUT)
+    return facets
+
+
+def _query_string(filters, **changes):
+    state = {
+        "brand": list(filters["brands"]),
+        "price": band_key(filters["price"]) if filters["price"] else None,
+        "category": filters["category"],
+        "sort": filters["sort"] if filters["sort"] != "featured" else None,
+    }
+    state.update(changes)
+    query = QueryDict(mutable=True)
+    for key, value in state.items():
+        if isinstance(value, list):
+            query.setlist(key, value)
+        elif value:
+            query[key] = value
+    encoded = query.urlencode()
+    return f"?{encoded}" if encoded else "?"
+
+
+def facet_options(listing, filters, facets):
+    """
+    Builds the facet links shown next to a listing.
+
+    Every option carries its product count, whether it is selected, and the
+    query string that toggles it while keeping the other filters.
+    """
+    brands = []
+    for brand, count in sorted(facets["brands"].items()):
+        selected = brand in filters["brands"]
+        toggled = [b for b in filters["brands"] if b != brand] if selected else filters["brands"] + [brand]
+        brands.append({"label": brand, "count": count, "selected": selected, "query": _query_string(filters, brand=toggled)})
+    prices = []
+    for band in listing.price_bands:
+        key = band_key(band)
+        selected = filters["price"] == band
+        prices.append({
+            "label": band_label(band),
+            "count": facets["price"][key],
+            "selected": selected,
+            "query": _query_string(filters, price=None if selected else key),
+        })
+    categories = []
+    if len(listing.categories) > 1:
+        for code in listing.categories:
+            selected = filters["category"] == code
+            categories.append({
+                "label": CATEGORY_NAMES[code],
+                "count": facets["categories"].get(code, 0),
+                "selected": selected,
+                "query": _query_string(filters, category=None if selected else code),
+            })
+    sorts = [
+        {"label": label, "selected": filters["sort"] == key, "query": _query_string(filters, sort=key)}
+        for key, label in (
+            ("featured", "Featured"),
+            ("price_asc", "Price: low to high"),
+            ("price_desc", "Price: high to low"),
+            ("newest", "Newest"),
+        )
+    ]
+    return {"brands": brands, "prices": prices, "categories": categories, "sorts": sorts}
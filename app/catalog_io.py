@@ -0,0 +1,278 @@
+"""
+Streaming import and export of product feeds in CSV or JSON Lines.
+
+A feed has one product per row with the columns of FEED_FIELDS. Rows are
+matched to products by SKU: unknown SKUs are created, known ones updated only
+in the fields that changed, in chunks of bulk_create/bulk_update so memory
+stays flat however long the feed is.
+"""
+import csv
+import hashlib
+import json
+import os
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils._os import safe_join
+
+from .catalog import bump_catalog_version
+from .models import CATEGORY_CHOICES, Product
+from .rails import invalidate_rails
+from .search import get_search_backend
+
+FEED_FIELDS = ("sku", "title", "selling_price", "discounted_price", "description", "brand", "category", "image")
+FORMATS = ("csv", "jsonl")
+# Imported images are stored under a hash of their content, so re-importing a
+# feed finds them unchanged.
+IMAGE_DIR = "productimg"
+CATEGORIES = {code for code, _ in CATEGORY_CHOICES}
+
+
+class FeedError(ValueError):
+    """Raised for a feed row that cannot be imported."""
+
+
+def feed_format(path, fmt=None):
+    """Returns fmt, or the format named by the path's extension."""
+    fmt = fmt or os.path.splitext(path)[1].lstrip(".").lower()
+    if fmt == "json":
+        fmt = "jsonl"
+    if fmt not in FORMATS:
+        raise FeedError(f"Unknown feed format {fmt!r}; expected one of {', '.join(FORMATS)}.")
+    return fmt
+
+
+def read_feed(stream, fmt):
+    """
+    Yields (line number, row dict) for every row of a feed, reading one line at a time.
+
+    Args:
+        stream (file): The feed, opened in text mode (with newline="" for CSV).
+        fmt (str): "csv" or "jsonl".
+    """
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for line_number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield line_number, FeedError(f"invalid JSON: {e.msg}")
+            continue
+        yield line_number, row if isinstance(row, dict) else FeedError("expected a JSON object")
+
+
+def _price(row, field):
+    try:
+        value = float(row.get(field))
+    except (TypeError, ValueError):
+        raise FeedError(f"{field} must be a number")
+    if value < 0:
+        raise FeedError(f"{field} must not be negative")
+    return value
+
+
+def parse_row(row):
+    """
+    Validates a feed row.
+
+    Returns:
+        dict: The Product field values of the row, plus "image": the image path given, or None.
+
+    Raises:
+        FeedError: If a field is missing or invalid.
+    """
+    if isinstance(row, FeedError):
+        raise row
+    values = {}
+    for field in ("sku", "title", "brand", "category"):
+        value = str(row.get(field) or "").strip()
+        if not value:
+            raise FeedError(f"{field} is required")
+        values[field] = value
+    if len(values["sku"]) > 64:
+        raise FeedError("sku is longer than 64 characters")
+    if len(values["title"]) > 200 or len(values["brand"]) > 100:
+        raise FeedError("title or brand is too long")
+    if values["category"] not in CATEGORIES:
+        raise FeedError(f"unknown category {values['category']!r}")
+    values["selling_price"] = _price(row, "selling_price")
+    values["discounted_price"] = _price(row, "discounted_price")
+    values["description"] = str(row.get("description") or "")
+    values["image"] = str(row.get("image") or "").strip() or None
+    return values
+
+
+def store_image(source, image_root):
+    """
+    Returns the storage name of a feed image, copying it into IMAGE_DIR unless it is already in MEDIA_ROOT.
+
+    Args:
+        source (str): The image path, relative to image_root.
+        image_root (str): The directory feed image paths are relative to.
+
+    Raises:
+        FeedError: If the file does not exist or lies outside image_root.
+    """
+    try:
+        path = safe_join(image_root, source)
+    except SuspiciousFileOperation:
+        raise FeedError(f"image {source!r} is outside {image_root}")
+    if not os.path.isfile(path):
+        raise FeedError(f"image {source!r} does not exist")
+    media_root = os.path.join(os.path.realpath(settings.MEDIA_ROOT), "")
+    if os.path.realpath(path).startswith(media_root):
+        return os.path.relpath(os.path.realpath(path), media_root).replace(os.sep, "/")
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 16), b""):
+            digest.update(block)
+    name = f"{IMAGE_DIR}/{digest.hexdigest()[:20]}{os.path.splitext(path)[1].lower()}"
+    if not default_storage.exists(name):
+        with open(path, "rb") as f:
+            default_storage.save(name, ContentFile(f.read()))
+    return name
+
+
+def _store_image(args):
+    try:
+        return store_image(*args), None
+    except (FeedError, OSError) as e:
+        return None, str(e)
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def import_chunk(rows, image_root, pool, stats, errors):
+    """
+    Creates and updates the products of one chunk of feed rows in one transaction.
+
+    Args:
+        rows (list): (line number, parsed row) pairs; a later row for the same SKU wins.
+        image_root (str): The directory feed image paths are relative to.
+        pool (Executor): Copies the images.
+        stats (Counter): Receives the created, updated, unchanged and failed counts.
+        errors (list): Receives (line number, message) of every failed row.
+    """
+    by_sku = {values["sku"]: (line, values) for line, values in rows}
+    sources = sorted({values["image"] for _, values in by_sku.values() if values["image"]})
+    images = dict(zip(sources, pool.map(_store_image, [(source, image_root) for source in sources])))
+    existing = {p.sku: p for p in Product.objects.filter(sku__in=list(by_sku))}
+
+    created, updated, changed_fields = [], [], set()
+    for sku, (line, values) in by_sku.items():
+        source = values.pop("image")
+        if source:
+            name, error = images[source]
+            if error:
+                errors.append((line, error))
+                stats["failed"] += 1
+                continue
+            values["product_image"] = name
+        product = existing.get(sku)
+        if product is None:
+            if not source:
+                errors.append((line, "image is required for new products"))
+                stats["failed"] += 1
+                continue
+            created.append(Product(**values))
+            continue
+        changed = [
+            field for field, value in values.items()
+            if (product.product_image.name if field == "product_image" else getattr(product, field)) != value
+        ]
+        if not changed:
+            stats["unchanged"] += 1
+            continue
+        for field in changed:
+            setattr(product, field, values[field])
+        changed_fields.update(changed)
+        updated.append(product)
+
+    with transaction.atomic():
+        Product.objects.bulk_create(created)
+        if updated:
+            Product.objects.bulk_update(updated, sorted(changed_fields))
+        # bulk_create and bulk_update send no post_save, so the search index is fed here.
+        get_search_backend().index(created + updated)
+    stats["created"] += len(created)
+    stats["updated"] += len(updated)
+
+
+def import_feed(stream, fmt, image_root=None, chunk_size=1000, workers=None):
+    """
+    Imports a product feed chunk by chunk, keyed on SKU.
+
+    Once anything changed the catalog version is bumped and the home rails
+    dropped. Both live in the shared cache, so the storefront and suggestion
+    index of every web process see the import.
+
+    Args:
+        stream (file): The feed, opened in text mode (with newline="" for CSV).
+        fmt (str): "csv" or "jsonl".
+        image_root (str, optional): The directory image paths are relative to. Default is MEDIA_ROOT.
+        chunk_size (int, optional): Rows per transaction. Default is 1000.
+        workers (int, optional): Image copying threads. Default is chosen by ThreadPoolExecutor.
+
+    Returns:
+        tuple: A Counter of created, updated, unchanged and failed rows, and a list of
+        (line number, message) of the failed rows.
+    """
+    image_root = str(image_root or settings.MEDIA_ROOT)
+    stats, errors = Counter(created=0, updated=0, unchanged=0, failed=0), []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for chunk in chunked(read_feed(stream, fmt), chunk_size):
+            rows = []
+            for line, row in chunk:
+                try:
+                    rows.append((line, parse_row(row)))
+                except FeedError as e:
+                    errors.append((line, str(e)))
+                    stats["failed"] += 1
+            import_chunk(rows, image_root, pool, stats, errors)
+    if stats["created"] or stats["updated"]:
+        bump_catalog_version()
+        invalidate_rails()
+    return stats, errors
+
+
+def export_rows(chunk_size=2000):
+    """Yields a feed row dict for every product, in id order, holding one chunk in memory at a time."""
+    products = Product.objects.order_by("id").values_list(
+        "sku", "title", "selling_price", "discounted_price", "description", "brand", "category", "product_image"
+    )
+    for row in products.iterator(chunk_size=chunk_size):
+        yield dict(zip(FEED_FIELDS, row))
+
+
+def write_feed(stream, fmt, rows):
+    """
+    Writes feed rows to a text stream as they come.
+
+    Returns:
+        int: The number of rows written.
+    """
+    count = 0
+    if fmt == "csv":
+        writer = csv.DictWriter(stream, FEED_FIELDS)
+        writer.writeheader()
+        for count, row in enumerate(rows, 1):
+            writer.writerow(row)
+        return count
+    for count, row in enumerate(rows, 1):
+        stream.write(json.dumps(row, ensure_ascii=False) + "\n")
+    return count
@@ -12,6 +12,8 @@ from django.contrib.auth.models import User
 from django.utils.translation import gettext, gettext_lazy as _
 from django.contrib.auth import password_validation
 
+from .jobs import enqueue
+
 
 class CustomerRegistrationForm(UserCreationForm):
     password1 = forms.CharField(
@@ -81,6 +83,33 @@ class PasswordResetForm(PasswordResetForm):
         ),
     )
 
+    def send_mail(
+        self,
+        subject_template_name,
+        email_template_name,
+        context,
+        from_email,
+        to_email,
+        html_email_template_name=None,
+    ):
+        """
+        Queues the reset email, so the request never waits for the mail server.
+
+        Only the user and the site are queued. The job makes the token and
+        renders the email, so no live reset link is stored in the jobs table.
+        """
+        enqueue(
+            "password_reset_mail",
+            user_id=context["user"].pk,
+            domain=context["domain"],
+            site_name=context["site_name"],
+            protocol=context["protocol"],
+            subject_template_name=subject_template_name,
+            email_template_name=email_template_name,
+            from_email=from_email,
+            html_email_template_name=html_email_template_name,
+        )
+
 
 class PasswordResetConfirmForm(SetPasswordForm):
     new_password1 = forms.CharField(
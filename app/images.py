@@ -0,0 +1,123 @@
+import hashlib
+import io
+import logging
+import posixpath
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import Image
+
+from .catalog import bump_catalog_version
+from .rails import invalidate_rails
+
+logger = logging.getLogger(__name__)
+
+DERIVATIVE_WIDTHS = (100, 300, 600)
+# Order lines show a 100px thumbnail; 300px keeps it sharp on high-density screens.
+THUMBNAIL_WIDTH = 300
+DERIVATIVE_DIR = "productimg/derivatives"
+QUALITY = 80
+
+# Output formats in the order browsers should prefer them. AVIF needs a Pillow
+# build with libavif; without it pages simply offer WebP and JPEG. Pillow
+# versions that predate AVIF warn on features.check("avif"), so the registered
+# encoders are asked instead.
+Image.init()
+FORMATS = [("avif", "AVIF", "image/avif")] if "AVIF" in Image.SAVE else []
+FORMATS += [("webp", "WEBP", "image/webp"), ("jpg", "JPEG", "image/jpeg")]
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()[:12]
+
+
+def generate_derivatives(name, storage=None):
+    """
+    Writes resized WebP, AVIF and JPEG copies of an uploaded product image.
+
+    File names contain a hash of the original's content, so derivatives can be
+    served with far-future cache headers and re-running this for an unchanged
+    image only finds the files already there.
+
+    Args:
+        name (str): The storage name of the original image, e.g. "productimg/1.jpg".
+        storage (Storage, optional): The storage holding the image. Default is default_storage.
+
+    Returns:
+        dict: The manifest stored in Product.image_variants, with keys source, hash, width,
+        height and variants ({extension: {width: storage name}}).
+
+    Raises:
+        OSError: If the original cannot be read or decoded.
+    """
+    storage = storage or default_storage
+    with storage.open(name, "rb") as f:
+        data = f.read()
+    digest = content_hash(data)
+    stem = posixpath.splitext(posixpath.basename(name))[0]
+    with Image.open(io.BytesIO(data)) as original:
+        original.load()
+        width, height = original.size
+        source = original.convert("RGBA" if original.mode in ("RGBA", "LA", "P") else "RGB")
+
+    widths = sorted({w for w in DERIVATIVE_WIDTHS if w < width} | {min(width, DERIVATIVE_WIDTHS[-1])})
+    variants = {}
+    for ext, pil_format, _ in FORMATS:
+        variants[ext] = {}
+        for target in widths:
+            target_name = f"{DERIVATIVE_DIR}/{stem}-{digest}-{target}w.{ext}"
+            if not storage.exists(target_name):
+                resized = source.resize((target, max(1, round(height * target / width))), Image.LANCZOS)
+                if pil_format == "JPEG" and resized.mode != "RGB":
+                    resized = resized.convert("RGB")
+                buffer = io.BytesIO()
+                resized.save(buffer, pil_format, quality=QUALITY)
+                storage.save(target_name, ContentFile(buffer.getvalue()))
+            variants[ext][str(target)] = target_name
+    return {"source": name, "hash": digest, "width": width, "height": height, "variants": variants}
+
+
+def update_product_derivatives(product):
+    """
+    Generates the derivatives of a product's image and stores their manifest on the product.
+
+    Errors reading the image are logged and leave the product without derivatives,
+    in which case templates fall back to the original image.
+    """
+    try:
+        manifest = generate_derivatives(product.product_image.name)
+    except OSError:
+        logger.exception("Could not generate image derivatives for product %s", product.pk)
+        return None
+    type(product).objects.filter(pk=product.pk).update(image_variants=manifest)
+    product.image_variants = manifest
+    # update() sends no post_save, so the pages cached with the plain <img> are dropped here.
+    transaction.on_commit(bump_catalog_version)
+    transaction.on_commit(invalidate_rails)
+    return manifest
+
+
+def srcset(manifest, ext):
+    """Returns the srcset attribute value listing every width of one format."""
+    return ", ".join(
+        f"{default_storage.url(name)} {width}w"
+        for width, name in sorted(manifest["variants"].get(ext, {}).items(), key=lambda item: int(item[0]))
+    )
+
+
+def thumbnail_name(source, manifest, width=THUMBNAIL_WIDTH):
+    """
+    Returns the storage name of the JPEG derivative of an image closest to width, or source without one.
+
+    Args:
+        source (str): The storage name of the original image.
+        manifest (dict): The image's manifest as returned by generate_derivatives(), possibly empty or stale.
+        width (int, optional): The smallest wanted width. Default is THUMBNAIL_WIDTH.
+    """
+    if not manifest or manifest.get("source") != source:
+        return source
+    variants = sorted(manifest.get("variants", {}).get("jpg", {}).items(), key=lambda item: int(item[0]))
+    if not variants:
+        return source
+    return next((name for w, name in variants if int(w) >= width), variants[-1][1])
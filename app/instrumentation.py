@@ -0,0 +1,292 @@
+"""
+Per-view query, database, template and latency metrics.
+
+ViewMetricsMiddleware records, for every request, the number of SQL queries,
+the time spent in them, the time spent rendering templates and the total
+latency into in-process histograms labelled with the view name. metrics()
+exposes the histograms in the Prometheus text format, and requests slower than
+settings.VIEW_METRICS_SLOW_REQUEST_SECONDS are logged with their SQL.
+
+Everything is off unless settings.VIEW_METRICS is set: the middleware then
+removes itself from the stack and no database or template hook is installed.
+"""
+import asyncio
+import contextvars
+import logging
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed, PermissionDenied
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import Http404, HttpResponse
+from django.template.backends.django import Template as DjangoTemplate
+from django.utils.crypto import constant_time_compare
+from django.utils.decorators import sync_and_async_middleware
+
+from .jobs import queue_stats
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+# Statements kept per request for the slow-request log.
+MAX_LOGGED_QUERIES = 50
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised when settings.VIEW_QUERY_BUDGET_ENFORCE is set and a view runs more queries than its budget."""
+
+
+class Histogram:
+    """A cumulative histogram per label value, in the shape Prometheus expects."""
+
+    def __init__(self, name, documentation, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label, value):
+        with self._lock:
+            series = self._series.get(label)
+            if series is None:
+                # One count per bucket plus +Inf, then the sum.
+                series = self._series[label] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[bisect_left(self.buckets, value)] += 1
+            series[-1] += value
+
+    def snapshot(self):
+        """Returns {label: (cumulative bucket counts including +Inf, sum)}."""
+        with self._lock:
+            series = {label: list(values) for label, values in self._series.items()}
+        result = {}
+        for label, values in series.items():
+            counts, total = values[:-1], values[-1]
+            cumulative, running = [], 0
+            for count in counts:
+                running += count
+                cumulative.append(running)
+            result[label] = (cumulative, total)
+        return result
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        bounds = [format(bound, "g") for bound in self.buckets] + ["+Inf"]
+        for label, (cumulative, total) in sorted(self.snapshot().items()):
+            view = label.replace("\\", "\\\\").replace('"', '\\"')
+            for bound, count in zip(bounds, cumulative):
+                lines.append(f'{self.name}_bucket{{view="{view}",le="{bound}"}} {count}')
+            lines.append(f'{self.name}_sum{{view="{view}"}} {format(total, "g")}')
+            lines.append(f'{self.name}_count{{view="{view}"}} {cumulative[-1]}')
+        return lines
+
+
+REQUEST_LATENCY = Histogram("shopper_view_latency_seconds", "Total time spent handling a request.", LATENCY_BUCKETS)
+DB_TIME = Histogram("shopper_view_db_seconds", "Time spent in SQL queries per request.", LATENCY_BUCKETS)
+RENDER_TIME = Histogram("shopper_view_render_seconds", "Time spent rendering templates per request.", LATENCY_BUCKETS)
+QUERY_COUNT = Histogram("shopper_view_queries", "SQL queries run per request.", QUERY_COUNT_BUCKETS)
+HISTOGRAMS = (REQUEST_LATENCY, DB_TIME, RENDER_TIME, QUERY_COUNT)
+
+
+class RequestStats:
+    __slots__ = ("queries", "db_time", "render_time", "statements")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.render_time = 0.0
+        self.statements = []
+
+
+# The stats of the request being handled. asgiref copies the context into the
+# threads that run sync code for async views, so their queries land here too.
+_current = contextvars.ContextVar("view_metrics_request", default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    """Database execute wrapper: times every statement run while a request is being measured."""
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - start
+        stats.queries += 1
+        stats.db_time += elapsed
+        if len(stats.statements) < MAX_LOGGED_QUERIES:
+            stats.statements.append((elapsed, sql))
+
+
+def _add_query_recorder(connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+_render = DjangoTemplate.render
+
+
+def _timed_render(self, context=None, request=None):
+    stats = _current.get()
+    if stats is None:
+        return _render(self, context, request)
+    start = time.perf_counter()
+    try:
+        return _render(self, context, request)
+    finally:
+        stats.render_time += time.perf_counter() - start
+
+
+_hooks_lock = threading.Lock()
+_hooks_installed = False
+
+
+def install_hooks():
+    """Starts timing queries on every database connection and renders of every Django template."""
+    global _hooks_installed
+    with _hooks_lock:
+        if _hooks_installed:
+            return
+        connection_created.connect(_add_query_recorder, dispatch_uid="app.instrumentation")
+        # Connections this thread opened before the hooks existed.
+        for connection in connections.all():
+            _add_query_recorder(connection)
+        DjangoTemplate.render = _timed_render
+        _hooks_installed = True
+
+
+def view_label(request):
+    match = getattr(request, "resolver_match", None)
+    return match.view_name if match is not None else "unresolved"
+
+
+def finish(request, stats, started):
+    """Records a finished request and enforces its query budget."""
+    elapsed = time.perf_counter() - started
+    label = view_label(request)
+    REQUEST_LATENCY.observe(label, elapsed)
+    DB_TIME.observe(label, stats.db_time)
+    RENDER_TIME.observe(label, stats.render_time)
+    QUERY_COUNT.observe(label, stats.queries)
+
+    if elapsed >= settings.VIEW_METRICS_SLOW_REQUEST_SECONDS:
+        statements = "\n".join(f"  {duration * 1000:.1f}ms {sql}" for duration, sql in stats.statements)
+        logger.warning(
+            "Slow request %s %s (%s): %.1fms, %d queries in %.1fms, templates %.1fms\n%s",
+            request.method,
+            request.path,
+            label,
+            elapsed * 1000,
+            stats.queries,
+            stats.db_time * 1000,
+            stats.render_time * 1000,
+            statements,
+        )
+
+    budget = settings.VIEW_QUERY_BUDGETS.get(label)
+    if budget is not None and stats.queries > budget:
+        message = f"{label} ran {stats.queries} queries, over its budget of {budget}:\n" + "\n".join(
+            sql for _, sql in stats.statements
+        )
+        if settings.VIEW_QUERY_BUDGET_ENFORCE:
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
+
+
+@sync_and_async_middleware
+def ViewMetricsMiddleware(get_response):
+    """
+    Records the query count, database time, template render time and latency of every request.
+
+    Goes first in MIDDLEWARE so the latency covers the other middleware too.
+
+    Raises:
+        MiddlewareNotUsed: If settings.VIEW_METRICS is off.
+    """
+    if not settings.VIEW_METRICS:
+        raise MiddlewareNotUsed
+    install_hooks()
+
+    if asyncio.iscoroutinefunction(get_response):
+
+        async def middleware(request):
+            stats, started = RequestStats(), time.perf_counter()
+            token = _current.set(stats)
+            try:
+                response = await get_response(request)
+            finally:
+                _current.reset(token)
+            finish(request, stats, started)
+            return response
+
+    else:
+
+        def middleware(request):
+            stats, started = RequestStats(), time.perf_counter()
+            token = _current.set(stats)
+            try:
+                response = get_response(request)
+            finally:
+                _current.reset(token)
+            finish(request, stats, started)
+            return response
+
+    return middleware
+
+
+def reset_metrics():
+    for histogram in HISTOGRAMS:
+        histogram.reset()
+
+
+def job_queue_lines():
+    """Returns the background job queue gauges in the Prometheus text format."""
+    stats = queue_stats()
+    lines = ["# HELP shopper_jobs Background jobs by status.", "# TYPE shopper_jobs gauge"]
+    lines += [f'shopper_jobs{{status="{status}"}} {count}' for status, count in stats["jobs"].items()]
+    lines += [
+        "# HELP shopper_jobs_lag_seconds How long the oldest due job has waited to run.",
+        "# TYPE shopper_jobs_lag_seconds gauge",
+        f"shopper_jobs_lag_seconds {format(stats['lag_seconds'], 'g')}",
+        "# HELP shopper_jobs_finished_last_minute Jobs finished in the last minute, by outcome.",
+        "# TYPE shopper_jobs_finished_last_minute gauge",
+    ]
+    lines += [
+        f'shopper_jobs_finished_last_minute{{status="{status}"}} {count}'
+        for status, count in stats["finished_last_minute"].items()
+    ]
+    return lines
+
+
+def _has_metrics_token(request):
+    token = settings.METRICS_TOKEN
+    scheme, _, credentials = request.headers.get("Authorization", "").partition(" ")
+    return bool(token) and scheme.lower() == "bearer" and constant_time_compare(credentials.strip(), token)
+
+
+def metrics(request):
+    """
+    Serves the view histograms and the job queue gauges in the Prometheus text exposition format.
+
+    Only staff users and scrapers sending settings.METRICS_TOKEN as a bearer
+    token may read them.
+
+    Raises:
+        Http404: If settings.VIEW_METRICS is off.
+        PermissionDenied: If the client is neither staff nor sends the token.
+    """
+    if not settings.VIEW_METRICS:
+        raise Http404("Metrics are disabled.")
+    if not _has_metrics_token(request) and not request.user.is_staff:
+        raise PermissionDenied
+    lines = [line for histogram in HISTOGRAMS for line in histogram.expose()] + job_queue_lines()
+    return HttpResponse("\n".join(lines) + "\n", content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,353 @@
+"""
+A durable background job queue kept in the database.
+
+enqueue() inserts a Job row in the caller's transaction, so a job is queued
+exactly when the work that asked for it commits, and no broker is needed. The
+run_jobs worker claims due jobs, leases each for its visibility timeout and
+runs them on a thread or process pool. A job that raises is retried with
+exponential backoff until it runs out of attempts, and a job whose worker
+died is taken over by another once its lease runs out. A job can therefore
+run more than once, so handlers must be idempotent.
+"""
+import logging
+import random
+import threading
+import time
+import traceback
+import uuid
+from collections import Counter, namedtuple
+from concurrent.futures import FIRST_COMPLETED, wait
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.tokens import default_token_generator
+from django.core.mail import EmailMultiAlternatives
+from django.db import DatabaseError, close_old_connections, connection, transaction
+from django.db.models import Count, DateTimeField, ExpressionWrapper, F, Min, Q, Value
+from django.template import loader
+from django.utils import timezone
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+
+from .images import update_product_derivatives
+from .models import Job, Product
+
+logger = logging.getLogger(__name__)
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+RETRIED = "retried"
+# Characters of a failed job's traceback kept in last_error.
+MAX_ERROR_LENGTH = 5000
+
+Handler = namedtuple("Handler", "func timeout max_attempts")
+HANDLERS = {}
+
+
+class UnknownJob(ValueError):
+    """Raised for a job name no handler is registered for."""
+
+
+def job(name, timeout=None, max_attempts=None):
+    """
+    Registers a function as the handler of the jobs called name.
+
+    The handler is called with the job's payload as keyword arguments.
+
+    Args:
+        name (str): The job name passed to enqueue().
+        timeout (int, optional): Seconds a run may take before the job is handed to another
+            worker. Default is settings.JOBS_VISIBILITY_TIMEOUT.
+        max_attempts (int, optional): Runs before the job is given up. Default is settings.JOBS_MAX_ATTEMPTS.
+    """
+
+    def register(func):
+        HANDLERS[name] = Handler(func, timeout, max_attempts)
+        return func
+
+    return register
+
+
+def enqueue(name, delay=0, **payload):
+    """
+    Queues a job, in the current transaction if there is one.
+
+    Args:
+        name (str): The registered job name.
+        delay (int, optional): Seconds before the job may run. Default is 0.
+        **payload: The handler's keyword arguments; they must be JSON serializable.
+
+    Returns:
+        Job: The queued job.
+
+    Raises:
+        UnknownJob: If no handler is registered for name.
+    """
+    handler = HANDLERS.get(name)
+    if handler is None:
+        raise UnknownJob(f"No job handler is registered for {name!r}.")
+    return Job.objects.create(
+        name=name,
+        payload=payload,
+        max_attempts=handler.max_attempts or settings.JOBS_MAX_ATTEMPTS,
+        timeout=timedelta(seconds=handler.timeout or settings.JOBS_VISIBILITY_TIMEOUT),
+        run_at=timezone.now() + timedelta(seconds=delay),
+    )
+
+
+def retry_delay(attempts):
+    """Returns the seconds to wait before the next run of a job that has failed attempts times."""
+    delay = min(settings.JOBS_RETRY_DELAY * 2 ** (attempts - 1), settings.JOBS_MAX_RETRY_DELAY)
+    # Jobs that failed together do not all come back at the same moment.
+    return delay * random.uniform(1, 1.1)
+
+
+def claim(limit):
+    """
+    Leases up to limit due jobs to the caller.
+
+    Jobs are due when queued with run_at in the past, or running with an
+    expired lease. Where the database can skip locked rows, concurrent
+    workers pass over each other's candidates; everywhere the lease is taken
+    by an UPDATE that checks again that the job is due, so no two workers get
+    the same job.
+
+    Returns:
+        list: The claimed Job objects, their attempts already counted.
+    """
+    now = timezone.now()
+    expired = Q(status=RUNNING, locked_until__lt=now)
+    token = uuid.uuid4().hex
+    with transaction.atomic():
+        # A lease that ran out on the last attempt ends the job.
+        Job.objects.filter(expired, attempts__gte=F("max_attempts")).update(
+            status=FAILED, finished_at=now, locked_until=None, last_error="The worker running the job did not finish it in time."
+        )
+        due = Q(status=QUEUED, run_at__lte=now) | expired
+        candidates = Job.objects.filter(due).order_by("run_at").values_list("id", flat=True)
+        if connection.features.has_select_for_update_skip_locked:
+            candidates = candidates.select_for_update(skip_locked=True)
+        ids = list(candidates[:limit])
+        if not ids:
+            return []
+        Job.objects.filter(due, id__in=ids).update(
+            status=RUNNING,
+            claim=token,
+            attempts=F("attempts") + 1,
+            locked_until=ExpressionWrapper(Value(now, DateTimeField()) + F("timeout"), output_field=DateTimeField()),
+        )
+    return list(Job.objects.filter(id__in=ids, claim=token).order_by("run_at"))
+
+
+def run_job(job):
+    """
+    Runs a claimed job and records how it went.
+
+    The outcome is only written while the job is still leased to this claim,
+    so a run that outlived its lease cannot overwrite the run that took over.
+
+    Returns:
+        str: "done", "retried" or "failed".
+    """
+    try:
+        handler = HANDLERS.get(job.name)
+        if handler is None:
+            raise UnknownJob(f"No job handler is registered for {job.name!r}.")
+        handler.func(**job.payload)
+    except Exception:
+        logger.exception("Job %s failed on attempt %d of %d", job, job.attempts, job.max_attempts)
+        now = timezone.now()
+        error = traceback.format_exc()[-MAX_ERROR_LENGTH:]
+        if job.attempts >= job.max_attempts:
+            outcome, updates = FAILED, {"status": FAILED, "finished_at": now}
+        else:
+            run_at = now + timedelta(seconds=retry_delay(job.attempts))
+            outcome, updates = RETRIED, {"status": QUEUED, "run_at": run_at}
+        Job.objects.filter(pk=job.pk, claim=job.claim).update(locked_until=None, last_error=error, **updates)
+        return outcome
+    Job.objects.filter(pk=job.pk, claim=job.claim).update(status=DONE, finished_at=timezone.now(), locked_until=None)
+    return DONE
+
+
+def execute(job):
+    """Runs a job on a pool thread or process, with a usable database connection. Returns its outcome."""
+    close_old_connections()
+    try:
+        return run_job(job)
+    finally:
+        close_old_connections()
+
+
+def run_due_jobs(limit=100):
+    """
+    Claims and runs due jobs in the calling thread until none is left.
+
+    Returns:
+        Counter: The number of jobs per outcome.
+    """
+    outcomes = Counter()
+    while jobs := claim(limit):
+        for job in jobs:
+            outcomes[run_job(job)] += 1
+    return outcomes
+
+
+def purge_jobs(days=None):
+    """Deletes jobs that finished successfully more than days (default settings.JOBS_RETENTION_DAYS) ago."""
+    cutoff = timezone.now() - timedelta(days=settings.JOBS_RETENTION_DAYS if days is None else days)
+    deleted, _ = Job.objects.filter(status=DONE, finished_at__lt=cutoff).delete()
+    return deleted
+
+
+class Worker:
+    """
+    Keeps every slot of a pool busy with claimed jobs.
+
+    A slot that frees up is refilled at once; with nothing due the worker
+    polls the queue every poll_interval seconds. stop() lets the jobs in
+    flight finish and then ends run(). A database error while claiming or
+    recording a job, such as SQLite's "database is locked", is logged and
+    the loop goes on: a job whose outcome was not written keeps its lease
+    and runs again once it expires.
+    """
+
+    def __init__(self, executor, slots, poll_interval=1.0):
+        self.executor = executor
+        self.slots = slots
+        self.poll_interval = poll_interval
+        self.outcomes = Counter()
+        self._stopping = threading.Event()
+
+    def stop(self):
+        self._stopping.set()
+
+    def run(self, burst=False, on_report=None, report_interval=60):
+        """
+        Runs jobs until stopped, or with burst until no job is due.
+
+        Args:
+            burst (bool, optional): Return once the queue has no due job. Default is False.
+            on_report (callable, optional): Called every report_interval seconds with
+                ({outcome: jobs}, elapsed seconds) of the jobs finished since the last call.
+            report_interval (float, optional): Seconds between reports. Default is 60.
+
+        Returns:
+            Counter: The number of jobs per outcome over the whole run.
+        """
+        running = {}
+        since, reported = time.monotonic(), Counter()
+        while True:
+            if not self._stopping.is_set() and len(running) < self.slots:
+                try:
+                    claimed = claim(self.slots - len(running))
+                except DatabaseError:
+                    logger.exception("Could not claim jobs")
+                    claimed = []
+                for job in claimed:
+                    running[self.executor.submit(execute, job)] = job
+            if not running:
+                if burst or self._stopping.is_set():
+                    break
+                self._stopping.wait(self.poll_interval)
+            else:
+                finished, _ = wait(running, timeout=self.poll_interval, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    job = running.pop(future)
+                    try:
+                        self.outcomes[future.result()] += 1
+                    except Exception:
+                        logger.exception("Job %s ended without recording its outcome", job)
+                        self.outcomes[RETRIED] += 1
+            if on_report and time.monotonic() - since >= report_interval:
+                on_report(self.outcomes - reported, time.monotonic() - since)
+                since, reported = time.monotonic(), self.outcomes.copy()
+        if on_report and self.outcomes - reported:
+            on_report(self.outcomes - reported, time.monotonic() - since)
+        return self.outcomes
+
+
+def queue_stats():
+    """
+    Returns the state of the queue for monitoring.
+
+    Returns:
+        dict: jobs ({status: count}), lag_seconds (how long the oldest due job has
+        waited) and finished_last_minute ({"done"/"failed": count}).
+    """
+    now = timezone.now()
+    counts = dict(Job.objects.values_list("status").annotate(n=Count("id")).order_by())
+    oldest = Job.objects.filter(status=QUEUED, run_at__lte=now).aggregate(oldest=Min("run_at"))["oldest"]
+    finished = dict(
+        Job.objects.filter(status__in=(DONE, FAILED), finished_at__gte=now - timedelta(minutes=1))
+        .values_list("status")
+        .annotate(n=Count("id"))
+        .order_by()
+    )
+    return {
+        "jobs": {status: counts.get(status, 0) for status in (QUEUED, RUNNING, DONE, FAILED)},
+        "lag_seconds": (now - oldest).total_seconds() if oldest else 0.0,
+        "finished_last_minute": {status: finished.get(status, 0) for status in (DONE, FAILED)},
+    }
+
+
+# Handlers
+
+
+@job("send_mail", timeout=60)
+def send_mail(subject, body, from_email, to, html=None):
+    message = EmailMultiAlternatives(subject, body, from_email, to)
+    if html:
+        message.attach_alternative(html, "text/html")
+    message.send()
+
+
+@job("password_reset_mail", timeout=60)
+def password_reset_mail(
+    user_id,
+    domain,
+    site_name,
+    protocol,
+    subject_template_name,
+    email_template_name,
+    from_email,
+    html_email_template_name=None,
+):
+    """
+    Renders and sends a password reset email.
+
+    The payload only names the user, so the reset token never sits in the
+    jobs table; it is made here, when the email is sent. A user deleted or
+    deactivated since the request gets no email.
+    """
+    user = get_user_model()._default_manager.filter(pk=user_id, is_active=True).first()
+    if user is None or not user.email:
+        return
+    context = {
+        "email": user.email,
+        "domain": domain,
+        "site_name": site_name,
+        "uid": urlsafe_base64_encode(force_bytes(user.pk)),
+        "user": user,
+        "token": default_token_generator.make_token(user),
+        "protocol": protocol,
+    }
+    subject = "".join(loader.render_to_string(subject_template_name, context).splitlines())
+    body = loader.render_to_string(email_template_name, context)
+    html = None
+    if html_email_template_name is not None:
+        html = loader.render_to_string(html_email_template_name, context)
+    send_mail(subject, body, from_email, [user.email], html)
+
+
+@job("product_derivatives", timeout=600)
+def product_derivatives(product_id):
+    """
+    Generates the image derivatives of a product whose image was uploaded.
+
+    update_product_derivatives() bumps the catalog version once the manifest
+    is saved. The version lives in the shared cache, so every web process
+    drops the pages it cached with the plain image.
+    """
+    product = Product.objects.filter(pk=product_id).only("id", "product_image").first()
+    if product is not None and product.product_image:
+        update_product_derivatives(product)
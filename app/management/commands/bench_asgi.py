@@ -0,0 +1,119 @@
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import AsyncClient, Client, override_settings
+
+from app.benchmarking import benchmark_database, seed_products, summarize
+from app.models import Product
+
+
+def report(samples, elapsed, errors):
+    return {"requests": len(samples), "errors": errors, "throughput_rps": round(len(samples) / elapsed, 1), **summarize(samples)}
+
+
+def run_wsgi(paths, total, threads):
+    """Sends total requests through the sync URLconf from a pool of threads, one test Client per thread."""
+
+    def worker(count):
+        client, samples, errors = Client(), [], 0
+        try:
+            for i in range(count):
+                start = time.perf_counter()
+                errors += client.get(paths[i % len(paths)]).status_code != 200
+                samples.append(time.perf_counter() - start)
+        finally:
+            connections.close_all()
+        return samples, errors
+
+    with override_settings(ROOT_URLCONF="app.urls"):
+        started = time.perf_counter()
+        with ThreadPoolExecutor(threads) as pool:
+            results = list(pool.map(worker, [total // threads + (i < total % threads) for i in range(threads)]))
+        elapsed = time.perf_counter() - started
+    return report([s for samples, _ in results for s in samples], elapsed, sum(e for _, e in results))
+
+
+async def _drive(request, paths, total, clients):
+    samples, errors = [], 0
+
+    async def client_loop(offset):
+        nonlocal errors
+        for i in range(offset, total, clients):
+            start = time.perf_counter()
+            errors += await request(paths[i % len(paths)]) != 200
+            samples.append(time.perf_counter() - start)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client_loop(offset) for offset in range(clients)))
+    return report(samples, time.perf_counter() - started, errors)
+
+
+def run_asgi(paths, total, clients):
+    """Sends total requests through the async URLconf from concurrent AsyncClient coroutines."""
+    client = AsyncClient()
+
+    async def request(path):
+        return (await client.get(path)).status_code
+
+    with override_settings(ROOT_URLCONF="app.async_urls"):
+        return asyncio.run(_drive(request, paths, total, clients))
+
+
+def run_http(url, paths, total, clients):
+    """Sends total requests over HTTP/1.1 to a running server from concurrent connections."""
+    target = urlsplit(url)
+    host, port = target.hostname, target.port or 80
+
+    async def request(path):
+        reader, writer = await asyncio.open_connection(host, port)
+        writer.write(f"GET {path} HTTP/1.1\r\nHost: {target.netloc}\r\nConnection: close\r\n\r\n".encode())
+        await writer.drain()
+        status = int((await reader.readline()).split()[1])
+        await reader.read()
+        writer.close()
+        return status
+
+    return asyncio.run(_drive(request, paths, total, clients))
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares the throughput of the async views under ASGI with the sync views under WSGI. "
+        "Without --url both stacks are driven in-process; with --url the requests go over HTTP to a "
+        "running server, e.g. `uvicorn Shopper.asgi:application --workers 4` or "
+        "`gunicorn Shopper.wsgi -w 4 --threads 8`, one run per server."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=5000, help="Size of the synthetic catalog (in-process only).")
+        parser.add_argument("--clients", type=int, default=1000, help="Concurrent clients.")
+        parser.add_argument("--requests", type=int, default=20000, help="Requests per run.")
+        parser.add_argument("--threads", type=int, default=32, help="WSGI worker threads (in-process only).")
+        parser.add_argument("--url", help="Base URL of a running server to load instead of the in-process stacks.")
+        parser.add_argument("--paths", default="/,/mobile/,/laptop/,/search/?query=samsung", help="Comma separated paths.")
+
+    def handle(self, *args, **options):
+        paths = options["paths"].split(",")
+        result = {"benchmark": "asgi", "clients": options["clients"]}
+        if options["url"]:
+            result["http"] = run_http(options["url"], paths, options["requests"], options["clients"])
+            self.stdout.write(json.dumps(result, indent=2))
+            return
+
+        with benchmark_database(), override_settings(ALLOWED_HOSTS=["testserver"]):
+            seed_products(options["products"])
+            paths.append(f"/product-detail/{Product.objects.values_list('id', flat=True).first()}")
+            result["products"] = options["products"]
+            cache.clear()
+            result["wsgi_sync_views"] = run_wsgi(paths, options["requests"], options["threads"])
+            self.stderr.write(f"wsgi: {result['wsgi_sync_views']['throughput_rps']} req/s")
+            cache.clear()
+            result["asgi_async_views"] = run_asgi(paths, options["requests"], options["clients"])
+            self.stderr.write(f"asgi: {result['asgi_async_views']['throughput_rps']} req/s")
+        self.stdout.write(json.dumps(result, indent=2))
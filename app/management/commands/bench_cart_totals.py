@@ -0,0 +1,52 @@
+import json
+import math
+
+from django.core.management.base import BaseCommand
+
+from app.benchmarking import benchmark_database, measure, seed_products, seed_users
+from app.cart import cart_totals
+from app.models import Cart
+
+
+def legacy_cart_totals(user):
+    """The pre-aggregation implementation: scan every cart row in Python."""
+    amount = 0.0
+    total_amount = 0.0
+    for p in [p for p in Cart.objects.all() if p.user == user]:
+        amount += p.quantity * p.product.discounted_price
+        total_amount = amount + 70.0
+    return {"amount": amount, "total_amount": total_amount}
+
+
+class Command(BaseCommand):
+    help = "Measures cart_totals() latency for one user as the Cart table grows."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", default="1000,10000,100000,1000000", help="Comma separated Cart table sizes.")
+        parser.add_argument("--products", type=int, default=1000, help="Number of products in the catalog.")
+        parser.add_argument("--repeat", type=int, default=200, help="Measured calls per size.")
+        parser.add_argument("--legacy-max", type=int, default=10000, help="Largest table size to also time the legacy full scan at.")
+
+    def handle(self, *args, **options):
+        sizes = sorted(int(s) for s in options["sizes"].split(","))
+        with benchmark_database():
+            products = seed_products(options["products"])
+            fillers = seed_users(math.ceil(sizes[-1] / len(products)), prefix="filler")
+            (user_id,) = seed_users(1, prefix="shopper")
+            Cart.objects.bulk_create(Cart(user_id=user_id, product_id=pid, quantity=2) for pid in products[:5])
+            user = Cart.objects.filter(user_id=user_id).first().user
+
+            results = []
+            seeded = 5
+            for size in sizes:
+                rows = []
+                for k in range(seeded - 5, size - 5):
+                    rows.append(Cart(user_id=fillers[k // len(products)], product_id=products[k % len(products)]))
+                Cart.objects.bulk_create(rows, batch_size=5000)
+                seeded = max(seeded, size)
+                result = {"cart_rows": Cart.objects.count(), "cart_totals": measure(lambda: cart_totals(user), repeat=options["repeat"])}
+                if size <= options["legacy_max"]:
+                    result["legacy_scan"] = measure(lambda: legacy_cart_totals(user), repeat=max(1, options["repeat"] // 20), warmup=1)
+                results.append(result)
+                self.stderr.write(f"{result['cart_rows']} rows: p50 {result['cart_totals']['p50_ms']} ms")
+        self.stdout.write(json.dumps({"benchmark": "cart_totals", "results": results}, indent=2))
@@ -0,0 +1,54 @@
+import json
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from django.shortcuts import render
+from django.test import RequestFactory
+
+from app.benchmarking import benchmark_database, measure, seed_products
+from app.models import Product
+from app.rails import refresh_rails
+from app.views import HomeView
+
+
+def legacy_home(request):
+    """The pre-rails home page: four unbounded category queries rendered on every hit."""
+    return render(
+        request,
+        "app/home.html",
+        {
+            "topwear": Product.objects.filter(category="TW"),
+            "bottomwear": Product.objects.filter(category="BW"),
+            "mobile": Product.objects.filter(category="M"),
+            "laptop": Product.objects.filter(category="L"),
+            "total_items_count": 0,
+        },
+    )
+
+
+class Command(BaseCommand):
+    help = "Compares home page p50/p99 latency of the cached rails with the legacy unbounded queries."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=20000, help="Size of the synthetic catalog.")
+        parser.add_argument("--repeat", type=int, default=50, help="Measured requests per variant.")
+
+    def handle(self, *args, **options):
+        factory = RequestFactory()
+
+        def get():
+            request = factory.get("/")
+            request.user = AnonymousUser()
+            return request
+
+        view = HomeView.as_view()
+        with benchmark_database():
+            seed_products(options["products"])
+            refresh_rails()
+            result = {
+                "benchmark": "home",
+                "products": options["products"],
+                "before": measure(lambda: legacy_home(get()), repeat=options["repeat"], warmup=1),
+                "after": measure(lambda: view(get()), repeat=options["repeat"]),
+            }
+        self.stdout.write(json.dumps(result, indent=2))
@@ -0,0 +1,65 @@
+import json
+import random
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import ExpressionWrapper, F, FloatField, Sum
+
+from app.benchmarking import benchmark_database, measure, seed_orders, seed_products, seed_users
+from app.models import PlacedOrder
+from app.pagination import keyset_page
+
+LEGACY_LINE_TOTAL = ExpressionWrapper(F("quantity") * F("product__discounted_price"), output_field=FloatField())
+
+
+def legacy_history(user_id):
+    """The pre-snapshot order history page: every line joins its product for the title, image and price."""
+    orders = PlacedOrder.objects.filter(user_id=user_id).select_related("product", "customer").annotate(line_total=LEGACY_LINE_TOTAL)
+    rows, _ = keyset_page(orders)
+    return [(o.product.title, o.product.product_image.name, o.total_cost) for o in rows]
+
+
+def snapshot_history(user_id):
+    rows, _ = keyset_page(PlacedOrder.objects.filter(user_id=user_id).with_line_total())
+    return [(o.title, o.image, o.total_cost) for o in rows]
+
+
+def legacy_revenue():
+    return list(PlacedOrder.objects.values("status").annotate(revenue=Sum(LEGACY_LINE_TOTAL)).order_by("status"))
+
+
+def snapshot_revenue():
+    return list(PlacedOrder.objects.with_line_total().values("status").annotate(revenue=Sum("line_total")).order_by("status"))
+
+
+class Command(BaseCommand):
+    help = "Compares order history pages and revenue reports joined to Product with ones read from the order snapshots."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=20000, help="Size of the synthetic catalog.")
+        parser.add_argument("--users", type=int, default=1000, help="Shoppers with an order history.")
+        parser.add_argument("--orders-per-user", type=int, default=1000, help="Order lines per shopper.")
+        parser.add_argument("--repeat", type=int, default=50, help="Measured order history pages per variant.")
+        parser.add_argument("--report-repeat", type=int, default=3, help="Measured revenue reports per variant.")
+
+    def handle(self, *args, **options):
+        with benchmark_database():
+            products = seed_products(options["products"])
+            users = seed_users(options["users"], prefix="history")
+            seed_orders(users, products, options["orders_per_user"], random.Random(1))
+            self.stderr.write(f"seeded {PlacedOrder.objects.count()} order lines")
+            user_id = users[len(users) // 2]
+            if legacy_revenue() != snapshot_revenue():
+                raise CommandError("The snapshot columns do not match the products the orders were seeded from.")
+            result = {
+                "benchmark": "order_history",
+                "orders": options["users"] * options["orders_per_user"],
+                "history_page": {
+                    "product_join": measure(lambda: legacy_history(user_id), repeat=options["repeat"]),
+                    "snapshot": measure(lambda: snapshot_history(user_id), repeat=options["repeat"]),
+                },
+                "revenue_by_status": {
+                    "product_join": measure(legacy_revenue, repeat=options["report_repeat"], warmup=1),
+                    "snapshot": measure(snapshot_revenue, repeat=options["report_repeat"], warmup=1),
+                },
+            }
+        self.stdout.write(json.dumps(result, indent=2))
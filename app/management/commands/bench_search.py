@@ -0,0 +1,50 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from app.benchmarking import benchmark_database, measure, seed_products
+from app.models import Product
+from app.search import get_search_backend
+
+
+def legacy_search(query):
+    """The pre-index implementation: three icontains scans, UNIONed, counted and then iterated."""
+    allprods = Product.objects.filter(title__icontains=query).union(
+        Product.objects.filter(category__icontains=query),
+        Product.objects.filter(brand__icontains=query),
+    )
+    allprods.count()
+    return list(allprods)
+
+
+class Command(BaseCommand):
+    help = "Compares search latency of the configured search backend with the legacy icontains UNION."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=500000, help="Size of the synthetic catalog.")
+        parser.add_argument("--queries", default="samsung,product 4242,synthetic 99,dell", help="Comma separated queries.")
+        parser.add_argument("--repeat", type=int, default=50, help="Measured calls per query.")
+        parser.add_argument("--legacy-repeat", type=int, default=3, help="Measured calls per query for the legacy scan.")
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        with benchmark_database():
+            seed_products(options["products"])
+            backend.rebuild()
+            results = []
+            for query in options["queries"].split(","):
+                result = {
+                    "query": query,
+                    "matches": len(backend.search(query)),
+                    "backend": measure(lambda: backend.search(query), repeat=options["repeat"]),
+                }
+                if options["legacy_repeat"]:
+                    result["legacy_union"] = measure(lambda: legacy_search(query), repeat=options["legacy_repeat"], warmup=0)
+                results.append(result)
+                self.stderr.write(f"{query!r}: p50 {result['backend']['p50_ms']} ms")
+        self.stdout.write(
+            json.dumps(
+                {"benchmark": "search", "backend": type(backend).__name__, "products": options["products"], "results": results},
+                indent=2,
+            )
+        )
@@ -0,0 +1,84 @@
+import json
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from app.benchmarking import benchmark_database, measure, seed_products, seed_users
+from app.middleware import LOGGED_IN_COOKIE
+from app.models import Product
+
+ENGINES = ("db", "cached_db", "signed_cookies")
+DJANGO_SESSION_MIDDLEWARE = "django.contrib.sessions.middleware.SessionMiddleware"
+
+
+def session_queries_per_request(request, repeat):
+    """Returns the average number of django_session queries of a request, after one warm-up request."""
+    request()
+    with CaptureQueriesContext(connection) as ctx:
+        for _ in range(repeat):
+            request()
+    return sum("django_session" in q["sql"] for q in ctx.captured_queries) / repeat
+
+
+class Command(BaseCommand):
+    help = "Counts session-table queries and latency per request for each session engine."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=2000, help="Size of the synthetic catalog.")
+        parser.add_argument("--repeat", type=int, default=50, help="Measured requests per scenario.")
+
+    def scenarios(self, user, product_id):
+        logged_in = Client()
+        logged_in.force_login(user)
+        logged_in.cookies[LOGGED_IN_COOKIE] = "1"
+        anonymous = Client()
+
+        def stale(url):
+            # Crawlers and visitors arriving from an old tab keep sending a session
+            # cookie that no longer names a session, whatever the last response said.
+            # Without the logged-in marker each such request costs one session read.
+            def request():
+                anonymous.cookies[settings.SESSION_COOKIE_NAME] = "expired0session0key0from0a0past0visit"
+                return anonymous.get(url)
+
+            return request
+
+        return {
+            "anonymous_catalog": stale("/mobile/"),
+            "anonymous_product": stale(f"/product-detail/{product_id}"),
+            "logged_in_catalog": lambda: logged_in.get("/mobile/"),
+            "logged_in_cart": lambda: logged_in.get("/cart/"),
+        }
+
+    def run(self, user, product_id, repeat):
+        cache.clear()
+        return {
+            name: {
+                "session_queries_per_request": session_queries_per_request(request, repeat),
+                "latency": measure(request, repeat=repeat),
+            }
+            for name, request in self.scenarios(user, product_id).items()
+        }
+
+    def handle(self, *args, **options):
+        plain_middleware = [
+            DJANGO_SESSION_MIDDLEWARE if m == "app.middleware.CatalogSessionMiddleware" else m
+            for m in settings.MIDDLEWARE
+        ]
+        report = {"benchmark": "sessions", "products": options["products"], "engines": {}}
+        with benchmark_database(), override_settings(ALLOWED_HOSTS=["testserver"]):
+            seed_products(options["products"])
+            user = User.objects.get(pk=seed_users(1, prefix="session-bench")[0])
+            product_id = Product.objects.values_list("id", flat=True).first()
+            for engine in ENGINES:
+                with override_settings(SESSION_ENGINE=f"django.contrib.sessions.backends.{engine}"):
+                    report["engines"][engine] = {"catalog_session_middleware": self.run(user, product_id, options["repeat"])}
+                    with override_settings(MIDDLEWARE=plain_middleware):
+                        report["engines"][engine]["django_session_middleware"] = self.run(user, product_id, options["repeat"])
+                self.stderr.write(f"{engine}: done")
+        self.stdout.write(json.dumps(report, indent=2))
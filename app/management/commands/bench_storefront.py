@@ -0,0 +1,258 @@
+import json
+import platform
+import random
+import subprocess
+import time
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+
+from app.benchmarking import benchmark_database, seed_carts, seed_orders, seed_products, seed_users, summarize
+from app.catalog import PRICE_BANDS, SORTS, band_key
+from app.middleware import LOGGED_IN_COOKIE
+from app.models import Cart
+from app.rails import refresh_rails
+from app.search import get_search_backend
+
+SEARCH_QUERIES = ("samsung", "product 42", "synthetic 99", "dell", "sony tv", "apple")
+BRANDS = ("Samsung", "Redmi", "Apple", "Dell", "Sony")
+SCENARIOS = (
+    "home",
+    "home_logged_in",
+    "category",
+    "category_filtered",
+    "search",
+    "product_detail",
+    "cart_page",
+    "cart_ajax",
+    "cart_batch",
+    "checkout",
+    "orders",
+    "place_order",
+)
+
+
+def seed_storefront(products, users, cart_lines, orders, seed):
+    """
+    Seeds a synthetic catalog and a population of shoppers with carts and order histories.
+
+    Returns:
+        dict: The product ids, user ids and {user id: customer id} of the seeded data.
+    """
+    rng = random.Random(seed)
+    product_ids = seed_products(products)
+    user_ids = seed_users(users, prefix="storefront")
+    seed_carts(user_ids, product_ids, cart_lines, rng)
+    customers = seed_orders(user_ids, product_ids, orders, rng)
+    get_search_backend().rebuild()
+    refresh_rails()
+    return {"products": product_ids, "users": user_ids, "customers": customers}
+
+
+class Storefront:
+    """
+    Builds the requests of each scenario against the real URL routes.
+
+    Every scenario draws its requests from a Random seeded with the run's
+    seed and its name, so two runs at the same scale and seed send exactly the
+    same requests, whichever scenarios they include.
+    """
+
+    def __init__(self, data, shoppers=20):
+        self.rng = None
+        self.products = data["products"]
+        self.customers = data["customers"]
+        self.anonymous = Client()
+        self.shoppers = []
+        for user in User.objects.filter(pk__in=data["users"][:shoppers]):
+            client = Client()
+            client.force_login(user)
+            client.cookies[LOGGED_IN_COOKIE] = "1"
+            self.shoppers.append((user, client))
+
+    def shopper(self):
+        return self.rng.choice(self.shoppers)
+
+    def cart_line(self, user):
+        """Returns (product id, quantity) of a line in the user's cart, putting one there if the cart was emptied."""
+        line = Cart.objects.filter(user=user).values_list("product_id", "quantity").first()
+        if line is None:
+            line = (self.rng.choice(self.products), 1)
+            Cart.objects.create(user=user, product_id=line[0])
+        return line
+
+    def home(self):
+        return self.anonymous.get("/")
+
+    def home_logged_in(self):
+        return self.shopper()[1].get("/")
+
+    def category(self):
+        return self.anonymous.get(f"/{self.rng.choice(['mobile', 'laptop', 'tv', 'clothing', 'watch'])}/")
+
+    def category_filtered(self):
+        slug, code = self.rng.choice([("mobile", "M"), ("laptop", "L"), ("tv", "TV")])
+        params = {
+            "brand": self.rng.sample(BRANDS, self.rng.randint(1, 2)),
+            "price": band_key(self.rng.choice(PRICE_BANDS[code])),
+            "sort": self.rng.choice(list(SORTS)),
+        }
+        return self.anonymous.get(f"/{slug}/", params)
+
+    def search(self):
+        return self.anonymous.get("/search/", {"query": self.rng.choice(SEARCH_QUERIES)})
+
+    def product_detail(self):
+        return self.anonymous.get(f"/product-detail/{self.rng.choice(self.products)}")
+
+    def cart_page(self):
+        return self.shopper()[1].get("/cart/")
+
+    def cart_ajax(self):
+        user, client = self.shopper()
+        product_id, quantity = self.cart_line(user)
+        # Going down from 2 and up from 1 keeps the quantities from drifting over the run.
+        return client.get("/minuscart/" if quantity > 1 else "/pluscart/", {"prod_id": product_id})
+
+    def cart_batch(self):
+        user, client = self.shopper()
+        operations = [
+            {"op": "set", "product": self.cart_line(user)[0], "quantity": self.rng.randint(1, 5)},
+            {"op": "add", "product": self.rng.choice(self.products)},
+            {"op": "remove", "product": self.rng.choice(self.products)},
+        ]
+        return client.post("/cart/batch/", {"operations": operations}, content_type="application/json")
+
+    def checkout(self):
+        user, client = self.shopper()
+        self.cart_line(user)
+        return client.get("/checkout/")
+
+    def orders(self):
+        return self.shopper()[1].get("/orders/")
+
+    def place_order(self):
+        # Timed as one step: the add to cart the payment needs, then the payment.
+        user, client = self.shopper()
+        client.get("/add-to-cart/", {"prod_id": self.rng.choice(self.products)})
+        return client.get("/paymentdone/", {"custid": self.customers[user.pk]})
+
+
+def run_scenario(request, total, warmup):
+    """Sends warmup unmeasured and then total measured requests one after another."""
+    cache.clear()
+    for _ in range(warmup):
+        request()
+    samples, errors = [], 0
+    started = time.perf_counter()
+    for _ in range(total):
+        start = time.perf_counter()
+        errors += request().status_code >= 400
+        samples.append(time.perf_counter() - start)
+    elapsed = time.perf_counter() - started
+    return {"requests": total, "errors": errors, "throughput_rps": round(total / elapsed, 1), **summarize(samples)}
+
+
+def run_storefront(data, scenarios, total, warmup, seed):
+    """Runs each scenario against the seeded data and returns {scenario: result}."""
+    storefront = Storefront(data)
+    results = {}
+    for name in scenarios:
+        storefront.rng = random.Random(f"{seed}-{name}")
+        results[name] = run_scenario(getattr(storefront, name), total, warmup)
+    return results
+
+
+def compare(current, baseline):
+    """Returns the change of throughput and p95 latency of every scenario present in both reports, in percent."""
+    changes = {}
+    for name, result in current.items():
+        before = baseline.get(name)
+        if not before:
+            continue
+        changes[name] = {
+            "throughput_change_pct": round((result["throughput_rps"] / before["throughput_rps"] - 1) * 100, 1),
+            "p95_change_pct": round((result["p95_ms"] / before["p95_ms"] - 1) * 100, 1) if before["p95_ms"] else None,
+        }
+    return changes
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=settings.BASE_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Seeds a synthetic storefront in a throwaway SQLite database and drives the real URL routes "
+        "(home, category filters, search, product detail, cart AJAX, checkout), reporting throughput "
+        "and p50/p95/p99 latency per scenario as JSON. Save a run with --output and pass it to "
+        "--compare on a later commit to see the change."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=20000, help="Size of the synthetic catalog.")
+        parser.add_argument("--users", type=int, default=500, help="Seeded shoppers.")
+        parser.add_argument("--cart-lines", type=int, default=5, help="Cart lines per shopper.")
+        parser.add_argument("--orders", type=int, default=50, help="Order history lines per shopper.")
+        parser.add_argument("--requests", type=int, default=200, help="Measured requests per scenario.")
+        parser.add_argument("--warmup", type=int, default=10, help="Unmeasured requests per scenario.")
+        parser.add_argument("--seed", type=int, default=1, help="Seed of the data and of the request mix.")
+        parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="Comma separated scenarios to run.")
+        parser.add_argument("--output", help="Also write the report to this file.")
+        parser.add_argument("--compare", help="A report of an earlier run to compare against.")
+        parser.add_argument(
+            "--max-regression", type=float, help="Fail if any scenario's p95 latency grew by more than this percentage."
+        )
+
+    def handle(self, *args, **options):
+        scenarios = options["scenarios"].split(",")
+        unknown = set(scenarios) - set(SCENARIOS)
+        if unknown:
+            raise CommandError(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+        if options["max_regression"] is not None and not options["compare"]:
+            raise CommandError("--max-regression needs a --compare report.")
+
+        report = {
+            "benchmark": "storefront",
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "scale": {key: options[key] for key in ("products", "users", "cart_lines", "orders", "requests", "seed")},
+        }
+        with benchmark_database(), override_settings(ALLOWED_HOSTS=["testserver"]):
+            report["database"] = connection.vendor
+            data = seed_storefront(options["products"], options["users"], options["cart_lines"], options["orders"], options["seed"])
+            self.stderr.write(f"seeded {options['products']} products and {options['users']} shoppers")
+            report["scenarios"] = run_storefront(data, scenarios, options["requests"], options["warmup"], options["seed"])
+        for name, result in report["scenarios"].items():
+            self.stderr.write(f"{name}: {result['throughput_rps']} req/s, p95 {result['p95_ms']} ms, {result['errors']} errors")
+
+        if options["compare"]:
+            with open(options["compare"]) as f:
+                baseline = json.load(f)
+            report["baseline_commit"] = baseline.get("commit")
+            report["comparison"] = compare(report["scenarios"], baseline["scenarios"])
+        output = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                f.write(output + "\n")
+        self.stdout.write(output)
+
+        if options["max_regression"] is not None:
+            regressed = [
+                name
+                for name, change in report["comparison"].items()
+                if change["p95_change_pct"] is not None and change["p95_change_pct"] > options["max_regression"]
+            ]
+            if regressed:
+                raise CommandError(f"p95 latency regressed by more than {options['max_regression']}%: {', '.join(regressed)}")
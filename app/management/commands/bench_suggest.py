@@ -0,0 +1,52 @@
+import json
+import random
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+
+from app.benchmarking import benchmark_database, measure, seed_products
+from app.models import Product
+from app.suggest import PrefixIndex
+
+
+class Command(BaseCommand):
+    help = "Measures build time, memory footprint and lookup latency of the suggestion prefix index."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=100000, help="Size of the synthetic catalog.")
+        parser.add_argument("--lookups", type=int, default=2000, help="Number of measured lookups.")
+        parser.add_argument("--k", type=int, default=8, help="Suggestions per lookup.")
+
+    def handle(self, *args, **options):
+        with benchmark_database():
+            seed_products(options["products"])
+            rows = list(Product.objects.values_list("id", "title", "brand"))
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        index = PrefixIndex()
+        index.build(rows)
+        build_seconds = time.perf_counter() - start
+        footprint, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        rng = random.Random(0)
+        prefixes = []
+        for _ in range(options["lookups"]):
+            _, title, brand = rng.choice(rows)
+            word = rng.choice(title.split() + [brand])
+            prefixes.append(word[: rng.randint(1, len(word))])
+        prefixes = iter(prefixes * 2)
+        latency = measure(lambda: index.lookup(next(prefixes), options["k"]), repeat=options["lookups"], warmup=0)
+
+        result = {
+            "benchmark": "suggest",
+            "products": len(index),
+            "keys": len(index._keys),
+            "build_seconds": round(build_seconds, 3),
+            "memory_bytes": footprint,
+            "memory_bytes_per_product": round(footprint / max(1, len(index)), 1),
+            "lookup": latency,
+        }
+        self.stdout.write(json.dumps(result, indent=2))
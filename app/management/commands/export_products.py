@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from app.catalog_io import FeedError, export_rows, feed_format, write_feed
+
+
+class Command(BaseCommand):
+    help = "Streams every product to a CSV or JSON Lines feed that import_products reads back."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--output", default="-", help='The feed file, or "-" for standard output.')
+        parser.add_argument("--format", choices=["csv", "jsonl"], help="Feed format (default: from the file extension, else csv).")
+        parser.add_argument("--chunk-size", type=int, default=2000, help="Products fetched per query.")
+
+    def handle(self, *args, **options):
+        try:
+            fmt = options["format"] or ("csv" if options["output"] == "-" else feed_format(options["output"]))
+        except FeedError as e:
+            raise CommandError(f"{e} Pass --format.")
+        rows = export_rows(options["chunk_size"])
+        if options["output"] == "-":
+            write_feed(self.stdout, fmt, rows)
+            return
+        with open(options["output"], "w", newline="", encoding="utf-8") as stream:
+            count = write_feed(stream, fmt, rows)
+        self.stderr.write(f"Exported {count} products to {options['output']}.")
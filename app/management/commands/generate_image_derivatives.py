@@ -0,0 +1,59 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand
+
+from app.catalog import bump_catalog_version
+from app.images import generate_derivatives
+from app.models import Product
+from app.rails import invalidate_rails
+
+
+def _init_worker():
+    # Workers started with "spawn" (macOS, Windows) import nothing from the parent.
+    django.setup()
+
+
+def _generate(name):
+    try:
+        return name, generate_derivatives(name), None
+    except OSError as exc:
+        return name, None, str(exc)
+
+
+class Command(BaseCommand):
+    help = "Backfills resized WebP/AVIF/JPEG derivatives of product images using a process pool."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: one per CPU).")
+        parser.add_argument("--force", action="store_true", help="Regenerate manifests of products that already have one.")
+        parser.add_argument("--batch-size", type=int, default=500, help="Products updated per bulk_update.")
+
+    def handle(self, *args, **options):
+        products = Product.objects.exclude(product_image="").only("id", "product_image", "image_variants")
+        pending = [
+            p for p in products.iterator()
+            if options["force"] or p.image_variants.get("source") != p.product_image.name
+        ]
+        # Several products often share one upload; every image is processed once.
+        names = sorted({p.product_image.name for p in pending})
+        self.stdout.write(f"Generating derivatives of {len(names)} images for {len(pending)} products.")
+
+        manifests, failed = {}, 0
+        with ProcessPoolExecutor(max_workers=options["workers"], initializer=_init_worker) as pool:
+            for name, manifest, error in pool.map(_generate, names, chunksize=4):
+                if error:
+                    failed += 1
+                    self.stderr.write(f"{name}: {error}")
+                else:
+                    manifests[name] = manifest
+
+        updated = [p for p in pending if p.product_image.name in manifests]
+        for p in updated:
+            p.image_variants = manifests[p.product_image.name]
+        Product.objects.bulk_update(updated, ["image_variants"], batch_size=options["batch_size"])
+        if updated:
+            # bulk_update() sends no post_save, so cached pages still showing the plain <img> are dropped here.
+            bump_catalog_version()
+            invalidate_rails()
+        self.stdout.write(self.style.SUCCESS(f"Updated {len(updated)} products, {failed} images failed."))
@@ -0,0 +1,41 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app.catalog_io import FeedError, feed_format, import_feed
+
+# Failed rows listed individually before the rest are only counted.
+MAX_REPORTED_ERRORS = 50
+
+
+class Command(BaseCommand):
+    help = (
+        "Creates and updates products from a CSV or JSON Lines feed keyed on SKU, streaming it in "
+        "chunks. Columns: sku, title, selling_price, discounted_price, description, brand, category "
+        "and image, a path relative to --image-root. Run generate_image_derivatives afterwards for new images."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("feed", help='The feed file, or "-" for standard input.')
+        parser.add_argument("--format", choices=["csv", "jsonl"], help="Feed format (default: from the file extension).")
+        parser.add_argument("--image-root", help="Directory image paths are relative to (default: MEDIA_ROOT).")
+        parser.add_argument("--chunk-size", type=int, default=1000, help="Rows per transaction.")
+        parser.add_argument("--workers", type=int, default=None, help="Threads copying images.")
+
+    def handle(self, *args, **options):
+        try:
+            fmt = feed_format(options["feed"], options["format"])
+        except FeedError as e:
+            raise CommandError(f"{e} Pass --format.")
+        if options["feed"] == "-":
+            stats, errors = import_feed(sys.stdin, fmt, options["image_root"], options["chunk_size"], options["workers"])
+        else:
+            with open(options["feed"], newline="", encoding="utf-8") as stream:
+                stats, errors = import_feed(stream, fmt, options["image_root"], options["chunk_size"], options["workers"])
+
+        for line, message in errors[:MAX_REPORTED_ERRORS]:
+            self.stderr.write(f"line {line}: {message}")
+        if len(errors) > MAX_REPORTED_ERRORS:
+            self.stderr.write(f"... and {len(errors) - MAX_REPORTED_ERRORS} more failed rows")
+        summary = "Imported feed: " + ", ".join(f"{count} {outcome}" for outcome, count in stats.items()) + "."
+        self.stdout.write(summary if errors else self.style.SUCCESS(summary))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from app.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = "Recomputes the sales rollups from the order history, streaming it in id ranges."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=50000, help="Order ids aggregated per query.")
+
+    def handle(self, *args, **options):
+        rows = rebuild_rollups(
+            options["chunk_size"], progress=lambda last_id: self.stderr.write(f"scanned orders up to id {last_id}")
+        )
+        self.stdout.write(self.style.SUCCESS(f"Wrote {rows} rollup rows."))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from app.models import Product
+from app.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the product search index from the Product table, e.g. after bulk imports."
+
+    def handle(self, *args, **options):
+        get_search_backend().rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Indexed {Product.objects.count()} products."))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from app.rails import refresh_rails
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the cached home page product rails. Run it from cron to refresh them on a schedule."
+
+    def handle(self, *args, **options):
+        rails = refresh_rails()
+        counts = ", ".join(f"{name}: {len(cards)}" for name, cards in rails.items())
+        self.stdout.write(self.style.SUCCESS(f"Refreshed home rails ({counts})."))
@@ -0,0 +1,60 @@
+import multiprocessing
+import signal
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand
+
+from app.jobs import DONE, FAILED, RETRIED, Worker, purge_jobs
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs the background jobs queued in the database on a thread or process pool until stopped "
+        "with SIGINT or SIGTERM, which lets the jobs in flight finish. Reports throughput every "
+        "--report-interval seconds."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=4, help="Jobs run at the same time.")
+        parser.add_argument(
+            "--pool", choices=("thread", "process"), default="thread",
+            help="Run jobs on threads (I/O bound work such as email) or processes (CPU bound work such as images).",
+        )
+        parser.add_argument("--burst", action="store_true", help="Exit once no job is due, e.g. when run from cron.")
+        parser.add_argument("--poll-interval", type=float, default=1.0, help="Seconds between polls of an idle queue.")
+        parser.add_argument("--report-interval", type=float, default=60.0, help="Seconds between throughput reports.")
+
+    def report(self, outcomes, elapsed):
+        total = sum(outcomes.values())
+        self.stderr.write(
+            f"{total} jobs in {elapsed:.0f}s ({total / elapsed if elapsed else 0:.1f}/s): "
+            f"{outcomes[DONE]} done, {outcomes[RETRIED]} retried, {outcomes[FAILED]} failed"
+        )
+
+    def handle(self, *args, **options):
+        purged = purge_jobs()
+        if purged:
+            self.stderr.write(f"purged {purged} finished jobs")
+        if options["pool"] == "process":
+            # Spawned processes share no database connection with this one. They
+            # set Django up before unpickling the first job, which needs the models.
+            executor = ProcessPoolExecutor(
+                options["workers"], mp_context=multiprocessing.get_context("spawn"), initializer=django.setup
+            )
+        else:
+            executor = ThreadPoolExecutor(options["workers"])
+        worker = Worker(executor, options["workers"], options["poll_interval"])
+
+        previous = {sig: signal.signal(sig, lambda *_: worker.stop()) for sig in (signal.SIGINT, signal.SIGTERM)}
+        started = time.monotonic()
+        try:
+            with executor:
+                outcomes = worker.run(options["burst"], self.report, options["report_interval"])
+        finally:
+            for sig, handler in previous.items():
+                signal.signal(sig, handler)
+        self.stdout.write(
+            self.style.SUCCESS(f"Ran {sum(outcomes.values())} jobs in {time.monotonic() - started:.1f}s.")
+        )
@@ -0,0 +1,56 @@
+import sys
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from app.order_status import InvalidTransition, transition_orders
+
+
+def read_ids(stream, errors):
+    """Yields the order ids of a file with one id per line, collecting the line numbers of the others."""
+    for line_number, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        try:
+            yield int(line)
+        except ValueError:
+            errors.append(line_number)
+
+
+class Command(BaseCommand):
+    help = (
+        "Moves the orders whose ids are listed in a file, one per line, to a new status. Orders "
+        "whose current status cannot move there are left unchanged and reported."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--to", required=True, dest="to_status", help="The status to move the orders to.")
+        parser.add_argument("--file", required=True, help="The file of order ids, or - for standard input.")
+        parser.add_argument("--chunk-size", type=int, default=1000, help="Orders updated per transaction.")
+        parser.add_argument("--user", help="Username recorded as having made the change.")
+
+    def handle(self, *args, **options):
+        user = None
+        if options["user"]:
+            user = User.objects.filter(username=options["user"]).first()
+            if user is None:
+                raise CommandError(f"No user named {options['user']!r}.")
+
+        errors = []
+        stream = sys.stdin if options["file"] == "-" else open(options["file"])
+        try:
+            result = transition_orders(read_ids(stream, errors), options["to_status"], user, options["chunk_size"])
+        except InvalidTransition as e:
+            raise CommandError(str(e))
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        for line_number in errors:
+            self.stderr.write(f"line {line_number}: not an order id")
+        for status, count in sorted(result["skipped"].items()):
+            self.stderr.write(f"{count} orders left {status}: cannot move to {options['to_status']}")
+        if result["missing"]:
+            self.stderr.write(f"{result['missing']} ids matched no order")
+        self.stdout.write(self.style.SUCCESS(f"Moved {result['changed']} orders to {options['to_status']}."))
@@ -0,0 +1,90 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY
+from django.contrib.sessions.middleware import SessionMiddleware
+
+# Set alongside the session cookie, with the same lifetime. It carries no
+# credentials: "1" tells catalog requests that the session is worth loading and
+# "0" that it belongs to an anonymous visitor.
+LOGGED_IN_COOKIE = "shopper_logged_in"
+
+
+class CatalogSessionMiddleware(SessionMiddleware):
+    """
+    SessionMiddleware that leaves the session store alone on anonymous catalog reads.
+
+    GET and HEAD requests to the views named in settings.SESSIONLESS_URL_NAMES
+    get an empty session instead of the one named by their session cookie when
+    LOGGED_IN_COOKIE says the session is anonymous, or when there is no session
+    cookie at all, so anonymous visitors cost no session-store read and no
+    write. A session cookie without LOGGED_IN_COOKIE, e.g. from a login made
+    before the marker existed or whose marker expired first, loads the session
+    once and the response sets the marker. Every other request behaves as with
+    SessionMiddleware, which also keeps LOGGED_IN_COOKIE following logins,
+    logouts and the session cookie's expiry.
+
+    Replaces django.contrib.sessions.middleware.SessionMiddleware in MIDDLEWARE.
+    """
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        marker = request.COOKIES.get(LOGGED_IN_COOKIE)
+        if (
+            request.method in ("GET", "HEAD")
+            and (marker == "0" or (marker is None and settings.SESSION_COOKIE_NAME not in request.COOKIES))
+            and request.resolver_match.url_name in settings.SESSIONLESS_URL_NAMES
+        ):
+            # request.user is resolved lazily from request.session, so it becomes AnonymousUser.
+            request.session = self.SessionStore(None)
+            request.session_skipped = True
+        return None
+
+    def process_response(self, request, response):
+        if getattr(request, "session_skipped", False) and not request.session.modified:
+            # Keep the session cookie the client sent, whatever it points at.
+            return response
+        response = super().process_response(request, response)
+        session = getattr(request, "session", None)
+        if session is None or not session.accessed or getattr(request, "session_skipped", False):
+            return response
+        if SESSION_KEY in session:
+            marker = "1"
+        elif not session.is_empty():
+            marker = "0"
+        else:
+            marker = None
+        if marker is None:
+            if LOGGED_IN_COOKIE in request.COOKIES:
+                response.delete_cookie(
+                    LOGGED_IN_COOKIE,
+                    path=settings.SESSION_COOKIE_PATH,
+                    domain=settings.SESSION_COOKIE_DOMAIN,
+                    samesite=settings.SESSION_COOKIE_SAMESITE,
+                )
+        elif marker != request.COOKIES.get(LOGGED_IN_COOKIE) or settings.SESSION_COOKIE_NAME in response.cookies:
+            # Set again whenever the session cookie is, so neither outlives the other.
+            max_age = None if session.get_expire_at_browser_close() else session.get_expiry_age()
+            response.set_cookie(
+                LOGGED_IN_COOKIE,
+                marker,
+                max_age=max_age,
+                path=settings.SESSION_COOKIE_PATH,
+                domain=settings.SESSION_COOKIE_DOMAIN,
+                secure=settings.SESSION_COOKIE_SECURE or None,
+                httponly=True,
+                samesite=settings.SESSION_COOKIE_SAMESITE,
+            )
+        return response
+
+
+async def aget_user(request):
+    """
+    Returns request.user from an async view.
+
+    AuthenticationMiddleware resolves the user lazily from the session, which
+    may query the session store, so the first access is made in a worker
+    thread unless the session was skipped and is known to be empty.
+    """
+    if getattr(request, "session_skipped", False):
+        return request.user
+    await sync_to_async(lambda: request.user.is_authenticated)()
+    return request.user
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.30 on 2026-10-18 16:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0003_alter_product_category'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='product',
+            name='category',
+            field=models.CharField(choices=[('M', 'Mobile'), ('L', 'Laptop'), ('TV', 'Television'), ('TW', 'Top Wear'), ('BW', 'Bottom Wear'), ('WW', 'Wrist Watch'), ('SH', 'Shoes')], max_length=2),
+        ),
+        migrations.AddIndex(
+            model_name='placedorder',
+            index=models.Index(fields=['user', 'orered_date', 'id'], name='app_order_user_date_idx'),
+        ),
+    ]
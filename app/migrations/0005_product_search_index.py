@@ -0,0 +1,47 @@
+from django.db import migrations
+
+CATEGORY_NAMES = {
+    "M": "Mobile",
+    "L": "Laptop",
+    "TV": "Television",
+    "TW": "Top Wear",
+    "BW": "Bottom Wear",
+    "WW": "Wrist Watch",
+    "SH": "Shoes",
+}
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    Product = apps.get_model("app", "Product")
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS app_product_fts USING fts5("
+            "title, brand, category, description, "
+            "tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+        )
+        cursor.executemany(
+            "INSERT INTO app_product_fts (rowid, title, brand, category, description) VALUES (%s, %s, %s, %s, %s)",
+            [
+                (p.id, p.title, p.brand, CATEGORY_NAMES.get(p.category, p.category), p.description)
+                for p in Product.objects.order_by("id").iterator()
+            ],
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("DROP TABLE IF EXISTS app_product_fts")
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("app", "0004_placedorder_user_date_index"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.30 on 2026-10-18 17:27
+
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+def merge_duplicate_cart_rows(apps, schema_editor):
+    """Collapses repeated (user, product) cart rows into the oldest one, summing their quantities."""
+    Cart = apps.get_model("app", "Cart")
+    duplicates = (
+        Cart.objects.values("user_id", "product_id")
+        .annotate(rows=Count("id"), keep=Min("id"), quantity=Sum("quantity"))
+        .filter(rows__gt=1)
+        .order_by()
+    )
+    for group in duplicates.iterator():
+        lines = Cart.objects.filter(user_id=group["user_id"], product_id=group["product_id"])
+        lines.filter(id=group["keep"]).update(quantity=group["quantity"])
+        lines.exclude(id=group["keep"]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0007_hot_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_cart_rows, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='cart',
+            name='app_cart_user_product_idx',
+        ),
+        migrations.AddConstraint(
+            model_name='cart',
+            constraint=models.UniqueConstraint(fields=('user', 'product'), name='app_cart_user_product_uniq'),
+        ),
+    ]
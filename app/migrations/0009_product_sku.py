@@ -0,0 +1,29 @@
+# Generated by Django 4.2.30 on 2026-10-18 17:39
+
+from django.db import migrations, models
+from django.db.models import CharField, Value
+from django.db.models.functions import Cast, Concat, LPad
+
+
+def assign_skus(apps, schema_editor):
+    """Gives every existing product the SKU "P" + its zero-padded id, e.g. "P00000042", in one UPDATE."""
+    Product = apps.get_model("app", "Product")
+    Product.objects.filter(sku__isnull=True).update(
+        sku=Concat(Value("P"), LPad(Cast("id", CharField()), 8, Value("0")))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0008_cart_unique_user_product'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='sku',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True),
+        ),
+        migrations.RunPython(assign_skus, migrations.RunPython.noop),
+    ]
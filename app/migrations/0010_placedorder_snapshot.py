@@ -0,0 +1,79 @@
+from django.db import migrations, models, transaction
+
+# Products whose order lines are filled per transaction.
+CHUNK_SIZE = 500
+# app.images.THUMBNAIL_WIDTH when this migration was written.
+THUMBNAIL_WIDTH = 300
+
+
+def thumbnail_name(source, manifest):
+    """A frozen copy of app.images.thumbnail_name(), so later changes to it do not alter this migration."""
+    if not manifest or manifest.get("source") != source:
+        return source
+    variants = sorted(manifest.get("variants", {}).get("jpg", {}).items(), key=lambda item: int(item[0]))
+    if not variants:
+        return source
+    return next((name for w, name in variants if int(w) >= THUMBNAIL_WIDTH), variants[-1][1])
+
+
+def snapshot_order_lines(apps, schema_editor):
+    """
+    Copies the current price, title and thumbnail of each product onto its existing order lines.
+
+    The lines of a product are filled with one UPDATE through the product_id
+    index, and every CHUNK_SIZE products are committed together, so a large
+    order table is never held in memory nor locked in one long transaction.
+    """
+    Product = apps.get_model("app", "Product")
+    PlacedOrder = apps.get_model("app", "PlacedOrder")
+    ordered = PlacedOrder.objects.filter(unit_price__isnull=True).values("product_id").distinct()
+    products = (
+        Product.objects.filter(id__in=ordered)
+        .order_by("id")
+        .values_list("id", "discounted_price", "title", "product_image", "image_variants")
+    )
+    chunk = []
+    for row in products.iterator(chunk_size=CHUNK_SIZE):
+        chunk.append(row)
+        if len(chunk) == CHUNK_SIZE:
+            _snapshot_chunk(PlacedOrder, chunk)
+            chunk = []
+    _snapshot_chunk(PlacedOrder, chunk)
+
+
+def _snapshot_chunk(PlacedOrder, products):
+    with transaction.atomic():
+        for product_id, price, title, image, variants in products:
+            PlacedOrder.objects.filter(product_id=product_id, unit_price__isnull=True).update(
+                unit_price=price, title=title, image=thumbnail_name(image, variants)
+            )
+
+
+class Migration(migrations.Migration):
+    # Each chunk commits on its own.
+    atomic = False
+
+    dependencies = [
+        ('app', '0009_product_sku'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='placedorder',
+            name='unit_price',
+            field=models.FloatField(null=True),
+        ),
+        migrations.AddField(
+            model_name='placedorder',
+            name='title',
+            field=models.CharField(default='', max_length=200),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='placedorder',
+            name='image',
+            field=models.CharField(default='', max_length=255),
+            preserve_default=False,
+        ),
+        migrations.RunPython(snapshot_order_lines, migrations.RunPython.noop),
+    ]
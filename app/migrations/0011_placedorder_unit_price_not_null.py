@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0010_placedorder_snapshot'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='placedorder',
+            name='unit_price',
+            field=models.FloatField(),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-18 17:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0012_sales_rollup'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='placedorder',
+            index=models.Index(fields=['status', 'orered_date'], name='app_order_status_date_idx'),
+        ),
+    ]
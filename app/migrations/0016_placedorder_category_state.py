@@ -0,0 +1,50 @@
+from django.db import migrations, models, transaction
+from django.db.models import Max, OuterRef, Subquery
+
+# Order ids whose lines are filled per transaction.
+CHUNK_SIZE = 5000
+
+
+def snapshot_category_and_state(apps, schema_editor):
+    """
+    Copies the current category of each order line's product and state of its address onto the line.
+
+    Each CHUNK_SIZE ids are filled with one UPDATE and committed on their
+    own, so a large order table is never locked in one long transaction.
+    """
+    Product = apps.get_model("app", "Product")
+    Customer = apps.get_model("app", "Customer")
+    PlacedOrder = apps.get_model("app", "PlacedOrder")
+    category = Product.objects.filter(pk=OuterRef("product_id")).values("category")[:1]
+    state = Customer.objects.filter(pk=OuterRef("customer_id")).values("state")[:1]
+    last_id = PlacedOrder.objects.aggregate(last=Max("id"))["last"] or 0
+    for start in range(0, last_id, CHUNK_SIZE):
+        with transaction.atomic():
+            PlacedOrder.objects.filter(id__gt=start, id__lte=start + CHUNK_SIZE).update(
+                category=Subquery(category), state=Subquery(state)
+            )
+
+
+class Migration(migrations.Migration):
+    # Each chunk commits on its own.
+    atomic = False
+
+    dependencies = [
+        ('app', '0015_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='placedorder',
+            name='category',
+            field=models.CharField(choices=[('M', 'Mobile'), ('L', 'Laptop'), ('TV', 'Television'), ('TW', 'Top Wear'), ('BW', 'Bottom Wear'), ('WW', 'Wrist Watch'), ('SH', 'Shoes')], default='', max_length=2),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='placedorder',
+            name='state',
+            field=models.CharField(choices=[('Andhra Pradesh', 'Andhra Pradesh'), ('Arunachal Pradesh ', 'Arunachal Pradesh '), ('Assam', 'Assam'), ('Bihar', 'Bihar'), ('Chhattisgarh', 'Chhattisgarh'), ('Goa', 'Goa'), ('Gujarat', 'Gujarat'), ('Haryana', 'Haryana'), ('Himachal Pradesh', 'Himachal Pradesh'), ('Jammu and Kashmir ', 'Jammu and Kashmir '), ('Jharkhand', 'Jharkhand'), ('Karnataka', 'Karnataka'), ('Kerala', 'Kerala'), ('Madhya Pradesh', 'Madhya Pradesh'), ('Maharashtra', 'Maharashtra'), ('Manipur', 'Manipur'), ('Meghalaya', 'Meghalaya'), ('Mizoram', 'Mizoram'), ('Nagaland', 'Nagaland'), ('Odisha', 'Odisha'), ('Punjab', 'Punjab'), ('Rajasthan', 'Rajasthan'), ('Sikkim', 'Sikkim'), ('Tamil Nadu', 'Tamil Nadu'), ('Telangana', 'Telangana'), ('Tripura', 'Tripura'), ('Uttar Pradesh', 'Uttar Pradesh'), ('Uttarakhand', 'Uttarakhand'), ('West Bengal', 'West Bengal'), ('Andaman and Nicobar Islands', 'Andaman and Nicobar Islands'), ('Chandigarh', 'Chandigarh'), ('Dadra and Nagar Haveli', 'Dadra and Nagar Haveli'), ('Daman and Diu', 'Daman and Diu'), ('Lakshadweep', 'Lakshadweep'), ('National Capital Territory of Delhi', 'National Capital Territory of Delhi'), ('Puducherry', 'Puducherry')], default='', max_length=50),
+            preserve_default=False,
+        ),
+        migrations.RunPython(snapshot_category_and_state, migrations.RunPython.noop),
+    ]
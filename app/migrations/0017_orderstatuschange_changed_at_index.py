@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0016_placedorder_category_state'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='orderstatuschange',
+            index=models.Index(fields=['changed_at'], name='app_status_change_at_idx'),
+        ),
+    ]
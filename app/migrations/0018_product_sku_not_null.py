@@ -0,0 +1,30 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:48
+
+import app.models
+from django.db import migrations, models
+from django.db.models import CharField, Q, Value
+from django.db.models.functions import Cast, Concat, LPad
+
+
+def assign_missing_skus(apps, schema_editor):
+    """Gives products created without a SKU since migration 0009 the SKU "P" + their zero-padded id, in one UPDATE."""
+    Product = apps.get_model("app", "Product")
+    Product.objects.filter(Q(sku__isnull=True) | Q(sku="")).update(
+        sku=Concat(Value("P"), LPad(Cast("id", CharField()), 8, Value("0")))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0017_orderstatuschange_changed_at_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(assign_missing_skus, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='product',
+            name='sku',
+            field=models.CharField(default=app.models.new_sku, max_length=64, unique=True),
+        ),
+    ]
@@ -1,5 +1,8 @@
+import secrets
+
 from django.db import models
 from django.contrib.auth.models import User
+from django.core.files.storage import default_storage
 from django.core.validators import MinValueValidator, MaxValueValidator
 
 STATE_CHOICES = (
@@ -60,6 +63,13 @@ STATUS_CHOICES = (
     ("Cancel", "Cancel"),
 )
 
+JOB_STATUS_CHOICES = (
+    ("queued", "Queued"),
+    ("running", "Running"),
+    ("done", "Done"),
+    ("failed", "Failed"),
+)
+
 
 class Customer(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -73,6 +83,17 @@ class Customer(models.Model):
         return str(self.id)  # type: ignore
 
 
+def new_sku():
+    """
+    Returns a SKU for a product created without one, e.g. in the admin or by a seeder.
+
+    Products that existed before SKUs got "P" + their 8-digit id (migration
+    0009); these have 12 random hex digits instead, so the two never collide
+    and no id is needed before the INSERT.
+    """
+    return f"P{secrets.token_hex(6).upper()}"
+
+
 class Product(models.Model):
     title = models.CharField(max_length=200)
     selling_price = models.FloatField()
@@ -81,21 +102,65 @@ class Product(models.Model):
     brand = models.CharField(max_length=100)
     category = models.CharField(choices=CATEGORY_CHOICES, max_length=2)
     product_image = models.ImageField(upload_to="productimg")
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
+    # The stable key catalog feeds update products by (see app/catalog_io.py).
+    sku = models.CharField(max_length=64, unique=True, default=new_sku)
+
+    class Meta:
+        indexes = [
+            # Listings filter on category and sort by id (featured, newest, home rails) ...
+            models.Index(fields=["category", "id"], name="app_product_cat_id_idx"),
+            # ... or filter a price band and sort by price ...
+            models.Index(fields=["category", "discounted_price"], name="app_product_cat_price_idx"),
+            # ... or filter on brands. The facet counts are answered from this index alone.
+            models.Index(fields=["category", "brand", "discounted_price"], name="app_product_cat_brand_idx"),
+        ]
 
     def __str__(self) -> str:
         return str(self.id)  # type: ignore
 
 
+class LineItemQuerySet(models.QuerySet):
+    def with_line_total(self):
+        """Joins each line's product and lets the database compute quantity * discounted_price as line_total."""
+        return self.select_related("product").annotate(
+            line_total=models.ExpressionWrapper(
+                models.F("quantity") * models.F("product__discounted_price"),
+                output_field=models.FloatField(),
+            )
+        )
+
+
+class PlacedOrderQuerySet(models.QuerySet):
+    def with_line_total(self):
+        """Lets the database compute quantity * unit_price as line_total, from the order row alone."""
+        return self.annotate(
+            line_total=models.ExpressionWrapper(
+                models.F("quantity") * models.F("unit_price"), output_field=models.FloatField()
+            )
+        )
+
+
 class Cart(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField(default=1)
 
+    objects = LineItemQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            # One line per product; adding it again raises the quantity (see app.cart.add_cart_item).
+            models.UniqueConstraint(fields=["user", "product"], name="app_cart_user_product_uniq"),
+        ]
+
     def __str__(self) -> str:
         return str(self.id)  # type: ignore
 
     @property
     def total_cost(self):
+        if hasattr(self, "line_total"):
+            return self.line_total
         return self.quantity * self.product.discounted_price
 
 
@@ -106,10 +171,112 @@ class PlacedOrder(models.Model):
     quantity = models.PositiveIntegerField(default=1)
     orered_date = models.DateTimeField(auto_now_add=True)
     status = models.CharField(choices=STATUS_CHOICES, max_length=50, default="Pending")
+    # Copied from the product and address at checkout, so later price, catalog
+    # or address edits never change an order, its history or the sales rollups,
+    # and neither reads Product or Customer rows.
+    unit_price = models.FloatField()
+    title = models.CharField(max_length=200)
+    image = models.CharField(max_length=255)
+    category = models.CharField(choices=CATEGORY_CHOICES, max_length=2)
+    state = models.CharField(choices=STATE_CHOICES, max_length=50)
+
+    objects = PlacedOrderQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "orered_date", "id"], name="app_order_user_date_idx"),
+            # The admin's status filter, newest first.
+            models.Index(fields=["status", "orered_date"], name="app_order_status_date_idx"),
+        ]
 
     def __str__(self) -> str:
         return str(self.id)  # type: ignore
 
     @property
     def total_cost(self):
-        return self.quantity * self.product.discounted_price
\ No newline at end of file
+        if hasattr(self, "line_total"):
+            return self.line_total
+        return self.quantity * self.unit_price
+
+    @property
+    def image_url(self):
+        return default_storage.url(self.image)
+
+
+class SalesRollup(models.Model):
+    """
+    Order line totals per day, product category, delivery state and order status.
+
+    Kept current by app.rollups as orders are placed, edited and deleted, and
+    rebuilt from PlacedOrder by the rebuild_sales_rollups command.
+    """
+
+    day = models.DateField()
+    category = models.CharField(choices=CATEGORY_CHOICES, max_length=2)
+    state = models.CharField(choices=STATE_CHOICES, max_length=50)
+    status = models.CharField(choices=STATUS_CHOICES, max_length=50)
+    orders = models.IntegerField(default=0)
+    units = models.IntegerField(default=0)
+    revenue = models.FloatField(default=0.0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["day", "category", "state", "status"], name="app_salesrollup_key_uniq"),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.day} {self.category} {self.state} {self.status}"
+
+
+class OrderStatusChange(models.Model):
+    """One status transition of an order line, as applied by app.order_status."""
+
+    order = models.ForeignKey(PlacedOrder, on_delete=models.CASCADE, related_name="status_changes")
+    from_status = models.CharField(max_length=50)
+    to_status = models.CharField(choices=STATUS_CHOICES, max_length=50)
+    changed_at = models.DateTimeField()
+    changed_by = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL, related_name="+")
+
+    class Meta:
+        indexes = [
+            # The admin lists the history newest first.
+            models.Index(fields=["changed_at"], name="app_status_change_at_idx"),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.order_id}: {self.from_status} -> {self.to_status}"
+
+
+class Job(models.Model):
+    """
+    A unit of work queued by app.jobs.enqueue() and run outside the request by the run_jobs worker.
+
+    A running job is leased to the worker that claimed it until locked_until;
+    past that another worker may take it over.
+    """
+
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(choices=JOB_STATUS_CHOICES, max_length=10, default="queued")
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField()
+    # How long a worker may run the job before it is presumed dead.
+    timeout = models.DurationField()
+    run_at = models.DateTimeField()
+    locked_until = models.DateTimeField(null=True, blank=True)
+    claim = models.CharField(max_length=32, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Due jobs, and leases that ran out.
+            models.Index(fields=["status", "run_at"], name="app_job_due_idx"),
+            models.Index(fields=["status", "locked_until"], name="app_job_lease_idx"),
+            # Throughput metrics and purging of finished jobs.
+            models.Index(fields=["status", "finished_at"], name="app_job_finished_idx"),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.name} #{self.id}"
@@ -0,0 +1,94 @@
+"""
+Bulk order status transitions.
+
+Orders move Pending -> Accepted -> Packed -> On The Way -> Delivered, and may
+be cancelled until they leave the warehouse. transition_orders() applies one
+target status to any number of orders a chunk at a time: each chunk is one
+transaction with one UPDATE, one INSERT of history rows and one update of the
+sales rollups, whatever its size.
+"""
+from collections import Counter, defaultdict
+from itertools import islice
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import STATUS_CHOICES, OrderStatusChange, PlacedOrder
+from .rollups import aggregate_orders, apply_deltas
+
+TRANSITIONS = {
+    "Pending": {"Accepted", "Cancel"},
+    "Accepted": {"Packed", "Cancel"},
+    "Packed": {"On The Way", "Cancel"},
+    "On The Way": {"Delivered"},
+    "Delivered": set(),
+    "Cancel": set(),
+}
+STATUSES = {code for code, _ in STATUS_CHOICES}
+
+
+class InvalidTransition(ValueError):
+    """Raised for a target status that is not a status orders can be moved to."""
+
+
+def sources_of(to_status):
+    """Returns the statuses an order may move to to_status from."""
+    if to_status not in STATUSES:
+        raise InvalidTransition(f"Unknown order status {to_status!r}.")
+    return {status for status, targets in TRANSITIONS.items() if to_status in targets}
+
+
+def _transition_chunk(order_ids, to_status, sources, user, result):
+    with transaction.atomic():
+        current = dict(PlacedOrder.objects.select_for_update().filter(id__in=order_ids).values_list("id", "status"))
+        result["missing"] += len(set(order_ids) - set(current))
+        moving = [pk for pk, status in current.items() if status in sources]
+        for status in (status for status in current.values() if status not in sources):
+            result["skipped"][status] += 1
+        if not moving:
+            return
+
+        # The rollup rows of the old statuses lose these lines and those of the new status gain them,
+        # keyed on the category and state the lines were placed with.
+        deltas = defaultdict(lambda: [0, 0, 0.0])
+        for (day, category, state, status), values in aggregate_orders(PlacedOrder.objects.filter(id__in=moving)).items():
+            for i, value in enumerate(values):
+                deltas[(day, category, state, status)][i] -= value
+                deltas[(day, category, state, to_status)][i] += value
+
+        now = timezone.now()
+        OrderStatusChange.objects.bulk_create(
+            OrderStatusChange(order_id=pk, from_status=current[pk], to_status=to_status, changed_at=now, changed_by=user)
+            for pk in moving
+        )
+        PlacedOrder.objects.filter(id__in=moving).update(status=to_status)
+        apply_deltas(deltas)
+    result["changed"] += len(moving)
+
+
+def transition_orders(order_ids, to_status, user=None, chunk_size=1000):
+    """
+    Moves orders to a new status where TRANSITIONS allows it, recording each change.
+
+    Orders whose current status does not lead to to_status are left as they
+    are and counted as skipped. Each chunk is committed on its own, so a long
+    run holds its locks briefly and its progress survives an interruption.
+
+    Args:
+        order_ids (iterable): The ids of the orders to move; read a chunk at a time.
+        to_status (str): The status to move them to.
+        user (User, optional): Who made the change, for the history. Default is None.
+        chunk_size (int, optional): Orders per transaction. Default is 1000.
+
+    Returns:
+        dict: changed (int), skipped ({current status: count}) and missing (ids of no order).
+
+    Raises:
+        InvalidTransition: If to_status is not a known status.
+    """
+    sources = sources_of(to_status)
+    result = {"changed": 0, "skipped": Counter(), "missing": 0}
+    ids = iter(order_ids)
+    while chunk := list(islice(ids, chunk_size)):
+        _transition_chunk(chunk, to_status, sources, user, result)
+    return result
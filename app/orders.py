@@ -0,0 +1,77 @@
+from django.db import connection, transaction
+from django.db.models import F
+
+from .images import thumbnail_name
+from .models import Cart, PlacedOrder
+from .rollups import record_orders
+
+
+class CheckoutConflict(Exception):
+    """Raised when another request checked out the same cart rows first."""
+
+
+def snapshot(product, customer):
+    """
+    Returns the PlacedOrder fields copied at checkout.
+
+    unit_price, title, image and category come from the product, and state
+    from the delivery address.
+    """
+    return {
+        "unit_price": product.discounted_price,
+        "title": product.title,
+        "image": thumbnail_name(product.product_image.name, product.image_variants),
+        "category": product.category,
+        "state": customer.state,
+    }
+
+
+def place_order(user, customer):
+    """
+    Converts every row of a user's cart into placed orders as one atomic unit.
+
+    The cart rows are locked, deleted and turned into orders with a fixed
+    number of queries regardless of the cart size. SQLite ignores
+    select_for_update(), so there the transaction opens with a write to the
+    cart, which takes the database's write lock before anything is read: a
+    concurrent checkout waits for this one and then finds the cart empty,
+    instead of failing to upgrade its read lock with "database is locked".
+    Each order line keeps the price, title, thumbnail and category its product
+    had at that moment, and the state of the address. If a concurrent checkout
+    of the same cart deletes some of the rows first, the whole transaction is
+    rolled back so no order is ever placed twice.
+
+    Args:
+        user (User): The user checking out.
+        customer (Customer): The delivery address the orders are placed for.
+
+    Returns:
+        list: The created PlacedOrder objects (empty if the cart was empty).
+
+    Raises:
+        CheckoutConflict: If the cart was checked out concurrently.
+    """
+    with transaction.atomic():
+        if connection.vendor == "sqlite":
+            Cart.objects.filter(user=user).update(quantity=F("quantity"))
+        items = list(
+            Cart.objects.select_for_update(of=("self",))
+            .filter(user=user)
+            .select_related("product")
+            .only(
+                "id", "product_id", "quantity", "product__discounted_price", "product__title",
+                "product__product_image", "product__image_variants", "product__category",
+            )
+        )
+        if not items:
+            return []
+        deleted, _ = Cart.objects.filter(id__in=[item.id for item in items]).delete()
+        if deleted != len(items):
+            raise CheckoutConflict(f"Cart of user {user.pk} was checked out concurrently")
+        orders = PlacedOrder.objects.bulk_create(
+            PlacedOrder(user=user, customer=customer, product=item.product, quantity=item.quantity, **snapshot(item.product, customer))
+            for item in items
+        )
+        # bulk_create sends no post_save, so the rollups are updated here, in the same transaction.
+        record_orders(orders)
+        return orders
@@ -0,0 +1,159 @@
+import asyncio
+import hashlib
+import time
+from functools import wraps
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag, urlencode
+
+from .cart import aget_cart_summary, get_cart_summary
+from .catalog import acatalog_version, catalog_version
+from .middleware import aget_user
+
+PAGE_CACHE_TIMEOUT = 60 * 15
+# Rendered in place of the cart badge count when a page shell is cached, and
+# replaced by the count of the requesting user when the shell is served.
+CART_BADGE_PLACEHOLDER = "[[cart-badge:3f9a]]"
+
+
+def page_cache_key(request, version=None, query_params=()):
+    """
+    Returns the cache key of a page.
+
+    Only the query_params the view reads are part of the key, sorted by name
+    and without empty values, so junk in a query string cannot fill the cache
+    with copies of the same page.
+    """
+    owner = request.user.pk if request.user.is_authenticated else "anon"
+    query = urlencode([(name, value) for name in sorted(query_params) for value in request.GET.getlist(name) if value])
+    path = hashlib.md5(f"{request.path}?{query}".encode()).hexdigest()
+    return f"page:{catalog_version() if version is None else version}:{owner}:{path}"
+
+
+def _render_shell(view, request, *args, **kwargs):
+    request.cart_badge_placeholder = True
+    try:
+        return view(request, *args, **kwargs)
+    finally:
+        request.cart_badge_placeholder = False
+
+
+async def _arender_shell(view, request, *args, **kwargs):
+    request.cart_badge_placeholder = True
+    try:
+        return await view(request, *args, **kwargs)
+    finally:
+        request.cart_badge_placeholder = False
+
+
+def _stitch(content, count):
+    """Fills the cart badge placeholder of a shell with a cart count."""
+    return content.replace(CART_BADGE_PLACEHOLDER.encode(), str(count).encode())
+
+
+def _cacheable(response, count):
+    """Returns whether a freshly rendered response may be cached; the others get their badge now."""
+    if response.status_code != 200 or response.streaming:
+        if count is not None and not response.streaming:
+            response.content = _stitch(response.content, count())
+        return False
+    return True
+
+
+def _entry(response):
+    return {
+        "content": response.content,
+        "content_type": response["Content-Type"],
+        "etag": hashlib.md5(response.content).hexdigest(),
+        "last_modified": int(time.time()),
+    }
+
+
+def _serve(request, entry, count=None):
+    """Builds the response for a cached shell; count is the cart count of a logged-in user."""
+    response = HttpResponse(entry["content"], content_type=entry["content_type"])
+    if count is not None:
+        # The badge is not part of the shell, so it is part of the validator
+        # and Last-Modified, which cannot see badge changes, is left out.
+        response.content = _stitch(entry["content"], count)
+        response["ETag"] = quote_etag(f"{entry['etag']}-{count}")
+        patch_cache_control(response, private=True, max_age=0, must_revalidate=True)
+        last_modified = None
+    else:
+        response["ETag"] = quote_etag(entry["etag"])
+        response["Last-Modified"] = http_date(entry["last_modified"])
+        patch_cache_control(response, public=True, max_age=0, must_revalidate=True)
+        last_modified = entry["last_modified"]
+    patch_vary_headers(response, ("Cookie",))
+    return get_conditional_response(request, etag=response["ETag"], last_modified=last_modified, response=response)
+
+
+def cache_page_shell(user_shell=True, timeout=PAGE_CACHE_TIMEOUT, query_params=()):
+    """
+    Caches the rendered page of a catalog view and answers conditional requests with 304.
+
+    Anonymous visitors share one cached copy per URL. Logged-in users get their
+    own cached shell in which the cart badge is left as a placeholder and filled
+    in with their current cart count on every request, so cart changes never
+    invalidate the shell. Every cached page is keyed on the catalog version,
+    which changes with any Product change. Both sync and async views can be
+    decorated.
+
+    Args:
+        user_shell (bool, optional): Whether logged-in users are served cached shells too.
+            Pages with other per-user content should pass False. Default is True.
+        timeout (int, optional): Seconds a page stays cached. Default is PAGE_CACHE_TIMEOUT.
+        query_params (iterable, optional): The GET parameters the view reads. Pages differing
+            only in other parameters share one cache entry. Default is none.
+    """
+
+    def decorator(view):
+        if asyncio.iscoroutinefunction(view):
+            return _async_decorator(view, user_shell, timeout, query_params)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            authenticated = request.user.is_authenticated
+            if request.method not in ("GET", "HEAD") or (authenticated and not user_shell):
+                return view(request, *args, **kwargs)
+
+            def count():
+                return get_cart_summary(request.user)["count"] if authenticated else None
+
+            key = page_cache_key(request, query_params=query_params)
+            entry = cache.get(key)
+            if entry is None:
+                response = _render_shell(view, request, *args, **kwargs)
+                if not _cacheable(response, count if authenticated else None):
+                    return response
+                entry = _entry(response)
+                cache.set(key, entry, timeout)
+            return _serve(request, entry, count())
+
+        return wrapper
+
+    return decorator
+
+
+def _async_decorator(view, user_shell, timeout, query_params):
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        user = await aget_user(request)
+        authenticated = user.is_authenticated
+        if request.method not in ("GET", "HEAD") or (authenticated and not user_shell):
+            return await view(request, *args, **kwargs)
+
+        count = (await aget_cart_summary(user))["count"] if authenticated else None
+        key = page_cache_key(request, await acatalog_version(), query_params)
+        entry = await cache.aget(key)
+        if entry is None:
+            response = await _arender_shell(view, request, *args, **kwargs)
+            if not _cacheable(response, (lambda: count) if authenticated else None):
+                return response
+            entry = _entry(response)
+            await cache.aset(key, entry, timeout)
+        return _serve(request, entry, count)
+
+    return wrapper
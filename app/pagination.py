@@ -0,0 +1,104 @@
+import base64
+from datetime import datetime
+
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Max, Q
+from django.utils.functional import cached_property
+
+# Tables estimated to hold fewer rows than this are still counted exactly.
+ESTIMATED_COUNT_THRESHOLD = 100000
+
+
+def encode_cursor(date, pk):
+    """Encodes the position of a row as an opaque, URL safe cursor."""
+    raw = f"{date.isoformat()}|{pk}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """
+    Decodes a cursor produced by encode_cursor().
+
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        date, pk = raw.split("|")
+        return datetime.fromisoformat(date), int(pk)
+    except (TypeError, UnicodeDecodeError, ValueError) as exc:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from exc
+
+
+def keyset_page(queryset, cursor=None, size=20, date_field="orered_date"):
+    """
+    Returns one page of a queryset ordered newest first by (date_field, id).
+
+    Instead of an OFFSET, each page starts strictly after the last row of the
+    previous page, so the database seeks straight to it through the
+    (user, date_field, id) index and deep pages cost the same as the first.
+
+    Args:
+        queryset (QuerySet): The rows to paginate.
+        cursor (str, optional): The cursor returned with the previous page. Default is None.
+        size (int, optional): The number of rows per page. Default is 20.
+        date_field (str, optional): The date column to order by. Default is "orered_date".
+
+    Returns:
+        tuple: The list of rows on the page and the cursor of the next page, or None on the last page.
+
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+    if cursor:
+        date, pk = decode_cursor(cursor)
+        # The redundant "<=" bound lets the database seek the index instead of
+        # scanning every newer row and rejecting it through the OR.
+        queryset = queryset.filter(**{f"{date_field}__lte": date}).filter(
+            Q(**{f"{date_field}__lt": date}) | Q(id__lt=pk)
+        )
+    rows = list(queryset.order_by(f"-{date_field}", "-id")[: size + 1])
+    next_cursor = None
+    if len(rows) > size:
+        rows = rows[:size]
+        last = rows[-1]
+        next_cursor = encode_cursor(getattr(last, date_field), last.id)
+    return rows, next_cursor
+
+
+def estimate_row_count(model, using="default"):
+    """
+    Returns a cheap estimate of the number of rows of a model's table, or None if there is none.
+
+    PostgreSQL keeps one in its statistics; elsewhere the highest primary key,
+    read from the end of the primary key index, stands in for it.
+    """
+    connection = connections[using]
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [model._meta.db_table])
+            row = cursor.fetchone()
+        # -1 until the table is first analyzed.
+        return row[0] if row and row[0] >= 0 else None
+    return model._default_manager.using(using).aggregate(last=Max("pk"))["last"]
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that skips the full COUNT(*) of large unfiltered querysets.
+
+    Counting every row of a table with millions of orders scans all of them on
+    each changelist page. Without filters the count is estimated by
+    estimate_row_count() instead; filtered querysets, and tables estimated
+    below ESTIMATED_COUNT_THRESHOLD rows, are counted exactly.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimate_row_count(queryset.model, queryset.db)
+            if estimate is not None and estimate >= ESTIMATED_COUNT_THRESHOLD:
+                return estimate
+        return super().count
@@ -0,0 +1,73 @@
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+
+from .models import Product
+
+HOME_RAILS_KEY = "home-rails"
+RAIL_SIZE = 12
+# Product changes drop the snapshot and refresh_home_rails replaces it; the
+# timeout bounds how stale it can get if an invalidation is ever missed.
+RAILS_TIMEOUT = 15 * 60
+
+# Context name and category of every product rail on the home page, in page order.
+RAILS = (
+    ("topwear", "TW"),
+    ("bottomwear", "BW"),
+    ("mobile", "M"),
+    ("laptop", "L"),
+)
+
+
+def build_rails():
+    """
+    Builds the home page rails: the newest RAIL_SIZE products of every rail category.
+
+    Returns:
+        dict: A list of product cards per rail name. Every card is a plain dict with
+        the id, title, discounted_price and image_url of a product.
+    """
+    rails = {}
+    for name, category in RAILS:
+        products = (
+            Product.objects.filter(category=category)
+            .order_by("-id")
+            .values("id", "title", "discounted_price", "product_image")[:RAIL_SIZE]
+        )
+        rails[name] = [
+            {
+                "id": p["id"],
+                "title": p["title"],
+                "discounted_price": p["discounted_price"],
+                "image_url": default_storage.url(p["product_image"]),
+            }
+            for p in products
+        ]
+    return rails
+
+
+def refresh_rails():
+    """Rebuilds the rails snapshot and stores it in the cache."""
+    rails = build_rails()
+    cache.set(HOME_RAILS_KEY, rails, RAILS_TIMEOUT)
+    return rails
+
+
+def invalidate_rails():
+    cache.delete(HOME_RAILS_KEY)
+
+
+def get_rails():
+    """Returns the rails snapshot with one cache read, rebuilding it if it is missing."""
+    rails = cache.get(HOME_RAILS_KEY)
+    if rails is None:
+        rails = refresh_rails()
+    return rails
+
+
+async def aget_rails():
+    """Async version of get_rails(); a missing snapshot is rebuilt in a worker thread."""
+    rails = await cache.aget(HOME_RAILS_KEY)
+    if rails is None:
+        rails = await sync_to_async(refresh_rails)()
+    return rails
@@ -0,0 +1,193 @@
+"""
+Incremental maintenance of the SalesRollup table.
+
+Every change to an order line is turned into deltas of the (day, category,
+state, status) rows it counts towards, and the deltas are added to those rows
+in the same transaction as the change. Analytics then read a few hundred
+rollup rows instead of scanning PlacedOrder joined to Product and Customer.
+Category and state are read from the order line's checkout snapshot, so
+later edits to a product or an address never move an order between rows.
+"""
+from collections import defaultdict
+
+from django.db import connection, transaction
+from django.db.models import Count, ExpressionWrapper, F, FloatField, Max, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import PlacedOrder, SalesRollup
+
+MEASURES = ("orders", "units", "revenue")
+
+
+def _zero():
+    return [0, 0, 0.0]
+
+
+def line_contribution(day, category, state, status, quantity, unit_price):
+    """Returns (rollup key, [orders, units, revenue]) of one order line."""
+    return (day, category, state, status), [1, quantity, quantity * unit_price]
+
+
+def order_contributions(orders):
+    """
+    Returns {rollup key: [orders, units, revenue]} of order lines.
+
+    Args:
+        orders (iterable): PlacedOrder objects.
+    """
+    deltas = defaultdict(_zero)
+    for order in orders:
+        key, values = line_contribution(
+            timezone.localdate(order.orered_date), order.category, order.state,
+            order.status, order.quantity, order.unit_price,
+        )
+        for i, value in enumerate(values):
+            deltas[key][i] += value
+    return deltas
+
+
+def apply_deltas(deltas):
+    """
+    Adds deltas to their rollup rows, creating missing rows.
+
+    On SQLite and PostgreSQL each row is one INSERT ... ON CONFLICT DO UPDATE
+    against the unique rollup key, so concurrent checkouts add up. Other
+    databases lock the existing row first.
+
+    Args:
+        deltas (dict): {(day, category, state, status): [orders, units, revenue]}.
+    """
+    deltas = {key: values for key, values in deltas.items() if any(values)}
+    if not deltas:
+        return
+    if connection.vendor in ("sqlite", "postgresql"):
+        table = connection.ops.quote_name(SalesRollup._meta.db_table)
+        updates = ", ".join(f"{m} = {table}.{m} + excluded.{m}" for m in MEASURES)
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"INSERT INTO {table} (day, category, state, status, orders, units, revenue) "
+                f"VALUES (%s, %s, %s, %s, %s, %s, %s) "
+                f"ON CONFLICT (day, category, state, status) DO UPDATE SET {updates}",
+                [
+                    (connection.ops.adapt_datefield_value(day), category, state, status, *values)
+                    for (day, category, state, status), values in sorted(deltas.items())
+                ],
+            )
+        return
+    with transaction.atomic():
+        for (day, category, state, status), (orders, units, revenue) in sorted(deltas.items()):
+            row, created = SalesRollup.objects.select_for_update().get_or_create(
+                day=day, category=category, state=state, status=status,
+                defaults={"orders": orders, "units": units, "revenue": revenue},
+            )
+            if not created:
+                SalesRollup.objects.filter(pk=row.pk).update(
+                    orders=F("orders") + orders, units=F("units") + units, revenue=F("revenue") + revenue
+                )
+
+
+def record_orders(orders):
+    """Adds the contribution of new order lines to the rollups."""
+    apply_deltas(order_contributions(orders))
+
+
+def _contribution_of_saved_line(order_id):
+    row = (
+        PlacedOrder.objects.filter(pk=order_id)
+        .values_list("orered_date", "category", "state", "status", "quantity", "unit_price")
+        .first()
+    )
+    if row is None:
+        return None
+    date, *rest = row
+    return line_contribution(timezone.localdate(date), *rest)
+
+
+def snapshot_line(order):
+    """Returns what a saved order line currently contributes, read before it is changed."""
+    return None if order.pk is None else _contribution_of_saved_line(order.pk)
+
+
+def record_line_change(before, order):
+    """
+    Moves an order line's contribution from what it was to what it is now.
+
+    Args:
+        before (tuple): The snapshot_line() of the order before the change, or None for a new line.
+        order (PlacedOrder): The saved order.
+    """
+    deltas = defaultdict(_zero)
+    after = _contribution_of_saved_line(order.pk)
+    for contribution, sign in ((before, -1), (after, 1)):
+        if contribution is not None:
+            key, values = contribution
+            for i, value in enumerate(values):
+                deltas[key][i] += sign * value
+    apply_deltas(deltas)
+
+
+def remove_line(contribution):
+    if contribution is not None:
+        key, values = contribution
+        apply_deltas({key: [-value for value in values]})
+
+
+LINE_REVENUE = ExpressionWrapper(F("quantity") * F("unit_price"), output_field=FloatField())
+
+
+def aggregate_orders(orders):
+    """Returns {rollup key: [orders, units, revenue]} of a PlacedOrder queryset, aggregated by the database."""
+    rows = (
+        orders.annotate(day=TruncDate("orered_date"))
+        .values("day", "category", "state", "status")
+        .annotate(lines=Count("id"), units=Sum("quantity"), amount=Sum(LINE_REVENUE))
+        .order_by()
+    )
+    return {
+        (row["day"], row["category"], row["state"], row["status"]): [row["lines"], row["units"], row["amount"]]
+        for row in rows
+    }
+
+
+def rebuild_rollups(chunk_size=50000, progress=None):
+    """
+    Recomputes every rollup row from PlacedOrder.
+
+    Orders are aggregated an id range at a time, so each read holds the order
+    table only briefly. The table is then replaced in one transaction, which
+    also counts orders placed since the scan began. Status changes made to
+    already scanned orders while the rebuild runs are lost, so run it while
+    the shop is quiet, or again afterwards.
+
+    Args:
+        chunk_size (int, optional): Order ids aggregated per query. Default is 50000.
+        progress (callable, optional): Called with the last scanned id after each chunk.
+
+    Returns:
+        int: The number of rollup rows written.
+    """
+    totals = defaultdict(_zero)
+
+    def add(deltas):
+        for key, values in deltas.items():
+            for i, value in enumerate(values):
+                totals[key][i] += value
+
+    last_id = PlacedOrder.objects.aggregate(last=Max("id"))["last"] or 0
+    for start in range(0, last_id, chunk_size):
+        add(aggregate_orders(PlacedOrder.objects.filter(id__gt=start, id__lte=start + chunk_size)))
+        if progress:
+            progress(min(start + chunk_size, last_id))
+    with transaction.atomic():
+        add(aggregate_orders(PlacedOrder.objects.filter(id__gt=last_id)))
+        SalesRollup.objects.all().delete()
+        SalesRollup.objects.bulk_create(
+            (
+                SalesRollup(day=day, category=category, state=state, status=status, orders=o, units=u, revenue=r)
+                for (day, category, state, status), (o, u, r) in totals.items()
+                if o
+            ),
+            batch_size=2000,
+        )
+    return sum(1 for o, _, _ in totals.values() if o)
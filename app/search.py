@@ -0,0 +1,147 @@
+import re
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.utils.module_loading import import_string
+
+from .models import CATEGORY_CHOICES, Product
+
+SEARCH_RESULTS_LIMIT = 200
+CATEGORY_NAMES = dict(CATEGORY_CHOICES)
+
+
+def search_terms(query):
+    """Splits a free text query into lower-cased word tokens."""
+    return re.findall(r"\w+", query.lower())
+
+
+class ContainsSearchBackend:
+    """
+    Portable search backend that matches every term against the product text with icontains.
+
+    It needs no index, so index() and remove() do nothing, but its cost grows
+    linearly with the catalog size. It is used on databases without a native
+    full-text engine.
+    """
+
+    def search(self, query, limit=SEARCH_RESULTS_LIMIT):
+        terms = search_terms(query)
+        if not terms:
+            return []
+        condition = Q()
+        for term in terms:
+            term_codes = [code for code, name in CATEGORY_CHOICES if term in name.lower()]
+            condition &= (
+                Q(title__icontains=term)
+                | Q(brand__icontains=term)
+                | Q(description__icontains=term)
+                | Q(category__in=term_codes)
+            )
+        return list(Product.objects.filter(condition).order_by("id")[:limit])
+
+    def index(self, products, replace=True):
+        pass
+
+    def remove(self, product_ids):
+        pass
+
+    def rebuild(self):
+        pass
+
+
+class SqliteFTSSearchBackend:
+    """
+    Search backend using an SQLite FTS5 virtual table that mirrors the product text.
+
+    Rows of the virtual table share their rowid with the product id. Results
+    are ranked with bm25(), weighting title matches above brand, category and
+    description matches.
+    """
+
+    table = "app_product_fts"
+    weights = (10.0, 5.0, 2.0, 1.0)
+
+    def match_expression(self, query):
+        # Quote every term so user input can never be parsed as FTS syntax, and
+        # match it as a prefix so "sam" finds "Samsung".
+        return " ".join('"%s"*' % term for term in search_terms(query))
+
+    def search(self, query, limit=SEARCH_RESULTS_LIMIT):
+        expression = self.match_expression(query)
+        if not expression:
+            return []
+        weights = ", ".join(str(w) for w in self.weights)
+        return list(
+            Product.objects.raw(
+                f"SELECT p.* FROM {Product._meta.db_table} p "
+                f"JOIN {self.table} f ON f.rowid = p.id "
+                f"WHERE {self.table} MATCH %s "
+                f"ORDER BY bm25({self.table}, {weights}), p.id LIMIT %s",
+                [expression, limit],
+            )
+        )
+
+    def index(self, products, replace=True):
+        rows = [
+            (p.id, p.title, p.brand, CATEGORY_NAMES.get(p.category, p.category), p.description)
+            for p in products
+        ]
+        if not rows:
+            return
+        with connection.cursor() as cursor:
+            if replace:
+                cursor.executemany(f"DELETE FROM {self.table} WHERE rowid = %s", [(row[0],) for row in rows])
+            cursor.executemany(
+                f"INSERT INTO {self.table} (rowid, title, brand, category, description) "
+                "VALUES (%s, %s, %s, %s, %s)",
+                rows,
+            )
+
+    def remove(self, product_ids):
+        with connection.cursor() as cursor:
+            cursor.executemany(f"DELETE FROM {self.table} WHERE rowid = %s", [(pk,) for pk in product_ids])
+
+    def rebuild(self, chunk_size=5000):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table}")
+        chunk = []
+        for product in Product.objects.order_by("id").iterator(chunk_size=chunk_size):
+            chunk.append(product)
+            if len(chunk) == chunk_size:
+                self.index(chunk, replace=False)
+                chunk = []
+        self.index(chunk, replace=False)
+        with connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {self.table} ({self.table}) VALUES ('optimize')")
+
+
+def search_results(query):
+    """
+    Searches the catalog for the search page.
+
+    One result beyond SEARCH_RESULTS_LIMIT is fetched, so the page can say
+    when the results were cut off without counting every match.
+
+    Returns:
+        tuple: The first SEARCH_RESULTS_LIMIT matching products, and whether more matched.
+    """
+    products = get_search_backend().search(query, limit=SEARCH_RESULTS_LIMIT + 1)
+    return products[:SEARCH_RESULTS_LIMIT], len(products) > SEARCH_RESULTS_LIMIT
+
+
+@lru_cache(maxsize=None)
+def get_search_backend():
+    """
+    Returns the configured search backend instance.
+
+    The backend is the dotted path in settings.SEARCH_BACKEND. When unset,
+    SQLite databases use SqliteFTSSearchBackend and every other database falls
+    back to ContainsSearchBackend.
+    """
+    path = getattr(settings, "SEARCH_BACKEND", None)
+    if path is None:
+        backend = SqliteFTSSearchBackend if connection.vendor == "sqlite" else ContainsSearchBackend
+        return backend()
+    return import_string(path)()
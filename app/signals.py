@@ -0,0 +1,76 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .cart import invalidate_cart_summary
+from .catalog import bump_catalog_version
+from .jobs import enqueue
+from .models import Cart, PlacedOrder, Product
+from .rails import invalidate_rails
+from .rollups import record_line_change, remove_line, snapshot_line
+from .search import get_search_backend
+
+
+@receiver(post_save, sender=Cart)
+@receiver(post_delete, sender=Cart)
+def cart_changed(sender, instance, **kwargs):
+    """Drops the cached cart summary when a cart row changes outside the cart views (admin, cascades)."""
+    invalidate_cart_summary(instance.user_id)
+
+
+def invalidate_catalog():
+    bump_catalog_version()
+    invalidate_rails()
+
+
+@receiver(pre_save, sender=Product)
+def product_saving(sender, instance, raw=False, **kwargs):
+    """Notes whether this save uploads a new image; the file is only written by the save itself."""
+    image = instance.product_image
+    instance._image_uploaded = not raw and bool(image) and not image._committed
+
+
+@receiver(post_save, sender=Product)
+def product_saved(sender, instance, raw=False, **kwargs):
+    """
+    Invalidates catalog caches, which also retires the suggestion indexes, and keeps the search index in sync.
+
+    The catalog version is bumped once the product changes, when the
+    transaction commits: done earlier, a concurrent request could cache the old
+    rows again under the new version, or rebuild a suggestion index without the
+    change. The search index is a table, so it is written in the transaction
+    itself. Resizing a newly
+    uploaded image is queued for the run_jobs worker rather than done in the
+    request.
+    """
+    transaction.on_commit(invalidate_catalog)
+    if not raw:
+        get_search_backend().index([instance])
+    if getattr(instance, "_image_uploaded", False):
+        enqueue("product_derivatives", product_id=instance.pk)
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted(sender, instance, **kwargs):
+    transaction.on_commit(invalidate_catalog)
+    get_search_backend().remove([instance.id])
+
+
+@receiver(pre_save, sender=PlacedOrder)
+@receiver(pre_delete, sender=PlacedOrder)
+def order_changing(sender, instance, raw=False, **kwargs):
+    """Notes what the order line counted towards in the sales rollups before it changes."""
+    if not raw:
+        instance._rollup_before = snapshot_line(instance)
+
+
+@receiver(post_save, sender=PlacedOrder)
+def order_saved(sender, instance, raw=False, **kwargs):
+    """Moves the order line's contribution to the sales rollups; place_order() records its bulk inserts itself."""
+    if not raw:
+        record_line_change(getattr(instance, "_rollup_before", None), instance)
+
+
+@receiver(post_delete, sender=PlacedOrder)
+def order_deleted(sender, instance, **kwargs):
+    remove_line(getattr(instance, "_rollup_before", None))
@@ -22,53 +22,101 @@ $("#slider1, #slider2, #slider3").owlCarousel({
   }
 })
 
-$(".plus-cart").click(function () {
-  var id = $(this).attr("pid").toString();
-  var eml = this.parentNode.children[2]
-  $.ajax({
-    type: "GET",
-    url: "/pluscart",
-    data: {
-      prod_id: id,
-    },
+// Cart edits are applied to the page at once and sent to /cart/batch/ together
+// once the clicks pause, so ten presses of + cost one request.
+var CART_BATCH_DELAY = 400
+var pendingCartOps = {}
+var cartBatchTimer = null
+var cartBatchRequest = null
+
+function getCookie(name) {
+  var match = document.cookie.match("(^|;)\\s*" + name + "=([^;]*)")
+  return match ? decodeURIComponent(match[2]) : null
+}
+
+function queueCartOp(id, op) {
+  pendingCartOps[id] = op
+  clearTimeout(cartBatchTimer)
+  cartBatchTimer = setTimeout(sendCartBatch, CART_BATCH_DELAY)
+}
+
+function sendCartBatch() {
+  var operations = Object.values(pendingCartOps)
+  pendingCartOps = {}
+  if (!operations.length) {
+    return
+  }
+  cartBatchRequest = $.ajax({
+    type: "POST",
+    url: "/cart/batch/",
+    contentType: "application/json",
+    headers: { "X-CSRFToken": getCookie("csrftoken") },
+    data: JSON.stringify({ operations: operations }),
     success: function (data) {
-      eml.innerText = data.quantity
+      data.items.forEach(function (item) {
+        // Clicks made while the batch was in flight win over its result.
+        if (!(item.product in pendingCartOps)) {
+          $(".plus-cart[pid='" + item.product + "']").siblings("#quantity").text(item.quantity)
+        }
+      })
       document.getElementById('amount').innerText = data.amount
-      document.getElementById('total_amount').innerText = data.total_amount 
+      document.getElementById('total_amount').innerText = data.total_amount
+    },
+    error: function () {
+      // The batch was rejected as a whole, so the page no longer matches the cart.
+      window.location.reload()
     }
   })
+}
+
+function changeCartQuantity(button, delta) {
+  var id = $(button).attr("pid").toString()
+  var eml = button.parentNode.children[2]
+  var quantity = Math.max(1, parseInt(eml.innerText, 10) + delta)
+  eml.innerText = quantity
+  queueCartOp(id, { op: "set", product: parseInt(id, 10), quantity: quantity })
+}
+
+$(".plus-cart").click(function () {
+  changeCartQuantity(this, 1)
 })
 
 $(".minus-cart").click(function () {
-  var id = $(this).attr("pid").toString();
-  var eml = this.parentNode.children[2]
-  $.ajax({
-    type: "GET",
-    url: "/minuscart",
-    data: {
-      prod_id: id,
-    },
-    success: function (data) {
-      eml.innerText = data.quantity
-      document.getElementById('amount').innerText = data.amount 
-      document.getElementById('total_amount').innerText = data.total_amount 
-    }
-  })
+  changeCartQuantity(this, -1)
 })
 
-$(".remove-cart").click(function () {
-  var id = $(this).attr("pid").toString();
-  var eml = this
-  $.ajax({
-    type: "GET",
-    url: "/removecart",
-    data: {
-      prod_id: id,
-    },
-    success: function (data) {
-        document.getElementById('amount').innerText = data.amount
-        document.getElementById('total_amount').innerText = data.total_amount
-        eml.parentNode.parentNode.parentNode.parentNode.remove()
-    }
+$(".remove-cart").click(function (event) {
+  event.preventDefault()
+  var id = $(this).attr("pid").toString()
+  this.parentNode.parentNode.parentNode.parentNode.remove()
+  queueCartOp(id, { op: "remove", product: parseInt(id, 10) })
+})
+
+// Flush edits still waiting for the debounce when the user leaves the cart.
+window.addEventListener("pagehide", function () {
+  clearTimeout(cartBatchTimer)
+  var operations = Object.values(pendingCartOps)
+  if (operations.length) {
+    pendingCartOps = {}
+    fetch("/cart/batch/", {
+      method: "POST",
+      keepalive: true,
+      headers: { "Content-Type": "application/json", "X-CSRFToken": getCookie("csrftoken") },
+      body: JSON.stringify({ operations: operations }),
+    })
+  }
+})
+
+// Place Order would otherwise load the checkout before the last edits are sent,
+// so send them first and follow the link once every batch has been saved. A
+// rejected batch reloads the cart instead, as it does on the page.
+$("#place-order").click(function (event) {
+  var href = this.href
+  event.preventDefault()
+  var inFlight = cartBatchRequest
+  clearTimeout(cartBatchTimer)
+  sendCartBatch()
+  $.when(inFlight, cartBatchRequest).done(function () {
+    window.location.href = href
   })
-})
\ No newline at end of file
+})
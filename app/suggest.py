@@ -0,0 +1,164 @@
+import bisect
+import re
+import threading
+
+from .catalog import catalog_version
+from .models import Product
+
+MAX_KEY_LENGTH = 32
+MAX_WORDS = 4
+MAX_SUGGESTIONS = 20
+
+
+def normalize(text):
+    """Lower-cases text and collapses everything that is not a word character into single spaces."""
+    return " ".join(re.findall(r"\w+", text.lower()))
+
+
+def product_keys(title, brand):
+    """
+    Returns the prefix keys a product can be suggested for.
+
+    Every key is the title starting at one of its first MAX_WORDS words, plus
+    the brand, so "s23" finds "Galaxy S23". Keys are truncated to
+    MAX_KEY_LENGTH characters, which bounds the memory used per product.
+    """
+    words = normalize(title).split()
+    keys = {" ".join(words[i:])[:MAX_KEY_LENGTH] for i in range(min(len(words), MAX_WORDS))}
+    brand = normalize(brand)[:MAX_KEY_LENGTH]
+    if brand:
+        keys.add(brand)
+    return sorted(keys)
+
+
+class PrefixIndex:
+    """
+    In-memory prefix index over product titles and brands.
+
+    Keys are kept in one sorted list with the matching product ids in a
+    parallel list, so a lookup is a binary search followed by a short scan.
+    Mutations and lookups share a lock: an add() shifts both lists, and a
+    lookup reading them halfway through would pair a key with the wrong id.
+    A lookup holds it only for a binary search and a scan of at most k keys.
+    """
+
+    def __init__(self):
+        self._keys = []
+        self._ids = []
+        self._labels = {}
+        self._product_keys = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._labels)
+
+    def build(self, rows):
+        """Replaces the index contents with (id, title, brand) rows."""
+        pairs = []
+        labels, keys_by_product = {}, {}
+        for pk, title, brand in rows:
+            keys = product_keys(title, brand)
+            labels[pk] = (title, brand)
+            keys_by_product[pk] = keys
+            pairs.extend((key, pk) for key in keys)
+        pairs.sort()
+        with self._lock:
+            self._keys = [key for key, _ in pairs]
+            self._ids = [pk for _, pk in pairs]
+            self._labels = labels
+            self._product_keys = keys_by_product
+
+    def add(self, pk, title, brand):
+        """Adds or replaces a single product."""
+        with self._lock:
+            self._remove(pk)
+            keys = product_keys(title, brand)
+            for key in keys:
+                position = bisect.bisect_right(self._keys, key)
+                self._keys.insert(position, key)
+                self._ids.insert(position, pk)
+            self._labels[pk] = (title, brand)
+            self._product_keys[pk] = keys
+
+    def remove(self, pk):
+        with self._lock:
+            self._remove(pk)
+
+    def _remove(self, pk):
+        for key in self._product_keys.pop(pk, ()):
+            position = bisect.bisect_left(self._keys, key)
+            while self._ids[position] != pk:
+                position += 1
+            del self._keys[position]
+            del self._ids[position]
+        self._labels.pop(pk, None)
+
+    def lookup(self, prefix, k=8):
+        """
+        Returns up to k products whose title or brand has a word starting with prefix.
+
+        Args:
+            prefix (str): The text typed so far.
+            k (int, optional): The maximum number of suggestions. Default is 8.
+
+        Returns:
+            list: (id, title, brand) tuples in key order.
+        """
+        prefix = normalize(prefix)[:MAX_KEY_LENGTH]
+        if not prefix:
+            return []
+        seen, results = set(), []
+        with self._lock:
+            keys, ids, labels = self._keys, self._ids, self._labels
+            position = bisect.bisect_left(keys, prefix)
+            while position < len(keys) and len(results) < k and keys[position].startswith(prefix):
+                pk = ids[position]
+                label = labels.get(pk)
+                if pk not in seen and label is not None:
+                    seen.add(pk)
+                    results.append((pk, *label))
+                position += 1
+        return results
+
+
+_index = None
+# The catalog version _index was built at.
+_index_version = None
+_index_lock = threading.Lock()
+
+
+def get_suggestion_index():
+    """
+    Returns the process-wide suggestion index, building it from the database on first use.
+
+    Each process holds its own copy, stamped with the catalog version read
+    before it was built. Every product change, in any process, import or job,
+    bumps that version in the shared cache, and the next lookup here rebuilds
+    the copy. One thread rebuilds while the others keep answering from the
+    copy they have.
+    """
+    global _index, _index_version
+    version = catalog_version()
+    if _index is not None and _index_version == version:
+        return _index
+    if _index_lock.acquire(blocking=_index is None):
+        try:
+            if _index is None or _index_version != version:
+                index = PrefixIndex()
+                index.build(Product.objects.values_list("id", "title", "brand").iterator(chunk_size=5000))
+                _index, _index_version = index, version
+        finally:
+            _index_lock.release()
+    return _index
+
+
+def loaded_suggestion_index():
+    """Returns the suggestion index if it has been built, without building it."""
+    return _index
+
+
+def reset_suggestion_index():
+    """Drops the suggestion index so that the next lookup rebuilds it."""
+    global _index, _index_version
+    with _index_lock:
+        _index = _index_version = None
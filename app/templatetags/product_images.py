@@ -0,0 +1,46 @@
+from django import template
+from django.utils.html import format_html, format_html_join
+
+from app.images import FORMATS, srcset
+
+register = template.Library()
+
+
+@register.simple_tag
+def product_picture(product, sizes="100vw", **attrs):
+    """
+    Renders a <picture> for a product image with AVIF/WebP/JPEG srcsets of its derivatives.
+
+    Products whose derivatives have not been generated yet fall back to a plain
+    <img> of the original upload.
+
+    Usage:
+        {% load product_images %}
+        {% product_picture cart.product sizes="150px" class="img-fluid" width=150 height=150 %}
+
+    Args:
+        product (Product): The product whose image is rendered.
+        sizes (str, optional): The sizes attribute telling the browser the rendered width. Default is "100vw".
+        **attrs: Extra attributes of the <img> tag, e.g. class, alt, width, height or style.
+    """
+    attrs.setdefault("alt", product.title)
+    attributes = format_html_join(" ", '{}="{}"', sorted(attrs.items()))
+    manifest = product.image_variants
+    if not manifest or not manifest.get("variants") or manifest.get("source") != product.product_image.name:
+        return format_html('<img src="{}" {}>', product.product_image.url, attributes)
+
+    *sources, (fallback_ext, _, _) = FORMATS
+    fallback = srcset(manifest, fallback_ext)
+    largest = fallback.rsplit(", ", 1)[-1].split(" ")[0]
+    return format_html(
+        '<picture>{}<img src="{}" srcset="{}" sizes="{}" loading="lazy" {}></picture>',
+        format_html_join(
+            "",
+            '<source type="{}" srcset="{}" sizes="{}">',
+            ((mime, srcset(manifest, ext), sizes) for ext, _, mime in sources),
+        ),
+        largest,
+        fallback,
+        sizes,
+        attributes,
+    )
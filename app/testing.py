@@ -0,0 +1,38 @@
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class QueryBudgetTestRunner(DiscoverRunner):
+    """
+    Test runner that fails any test whose requests make a view exceed its entry in settings.VIEW_QUERY_BUDGETS.
+
+    It turns on app.instrumentation.ViewMetricsMiddleware for the whole run,
+    so test clients count the queries of every request they send. Tests use a
+    file-based cache of their own, so clearing it never touches the site's.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._saved = settings.VIEW_METRICS, settings.VIEW_QUERY_BUDGET_ENFORCE
+        settings.VIEW_METRICS = True
+        settings.VIEW_QUERY_BUDGET_ENFORCE = True
+        self._cache_dir = tempfile.mkdtemp()
+        self._caches = override_settings(
+            CACHES={
+                "default": {
+                    "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+                    "LOCATION": self._cache_dir,
+                }
+            }
+        )
+        self._caches.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._caches.disable()
+        shutil.rmtree(self._cache_dir, ignore_errors=True)
+        settings.VIEW_METRICS, settings.VIEW_QUERY_BUDGET_ENFORCE = self._saved
+        super().teardown_test_environment(**kwargs)
@@ -1,3 +1,1913 @@
-from django.test import TestCase
+import csv
+import gzip
+import importlib
+import io
+import json
+import os
+import random
+import re
+import shutil
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.contrib.staticfiles import finders
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, OperationalError, connection, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.db.models import Sum
+from django.template import Context, Template
+from django.test import AsyncClient, Client, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+
+from .assets import accepted_encodings
+from .cart import SHIPPING_AMOUNT, add_cart_item, cart_summary_key, cart_totals, get_cart_summary
+from .catalog import LISTINGS, bump_catalog_version, catalog_version, compute_facets, get_facets
+from .catalog_io import FEED_FIELDS
+from .images import generate_derivatives
+from .management.commands.bench_storefront import SCENARIOS, compare, run_storefront, seed_storefront
+from .instrumentation import QUERY_COUNT, QueryBudgetExceeded, reset_metrics
+from .jobs import HANDLERS, UnknownJob, claim, enqueue, job, queue_stats, run_due_jobs, run_job
+from .middleware import LOGGED_IN_COOKIE
+from .models import Cart, Customer, Job, OrderStatusChange, PlacedOrder, Product, SalesRollup
+from .order_status import InvalidTransition, transition_orders
+from .orders import place_order, snapshot
+from .pagination import EstimatedCountPaginator, keyset_page
+from .rails import HOME_RAILS_KEY, RAIL_SIZE, RAILS_TIMEOUT, get_rails
+from .rollups import rebuild_rollups
+from .search import ContainsSearchBackend, SqliteFTSSearchBackend
+from .suggest import PrefixIndex, loaded_suggestion_index, reset_suggestion_index
+
+
+def make_product(title="Phone", price=100.0, category="M", brand="Samsung"):
+    return Product.objects.create(
+        title=title,
+        selling_price=price * 2,
+        discounted_price=price,
+        description=f"{title} description",
+        brand=brand,
+        category=category,
+        product_image="productimg/1.jpg",
+    )
+
+
+def log_in(client, user):
+    """Logs a test client in with the cookies a login through the login page leaves behind."""
+    client.force_login(user)
+    client.cookies[LOGGED_IN_COOKIE] = "1"
+
+
+def make_customer(user):
+    return Customer.objects.create(
+        user=user, name="Alice", locality="MG Road", city="Pune", zipcode=411001, state="Maharashtra"
+    )
+
+
+class CartTotalsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("alice", password="pw")
+        self.other = User.objects.create_user("bob", password="pw")
+        self.phone = make_product("Phone", 100.0)
+        self.laptop = make_product("Laptop", 250.0, category="L", brand="Dell")
+
+    def test_empty_cart(self):
+        self.assertEqual(
+            cart_totals(self.user),
+            {"count": 0, "amount": 0.0, "shipping_amount": 0.0, "total_amount": 0.0},
+        )
+
+    def test_totals_are_scoped_to_user(self):
+        Cart.objects.create(user=self.user, product=self.phone, quantity=2)
+        Cart.objects.create(user=self.user, product=self.laptop, quantity=1)
+        Cart.objects.create(user=self.other, product=self.laptop, quantity=5)
+        totals = cart_totals(self.user)
+        self.assertEqual(totals["count"], 2)
+        self.assertEqual(totals["amount"], 450.0)
+        self.assertEqual(totals["total_amount"], 450.0 + SHIPPING_AMOUNT)
+
+    def test_single_query(self):
+        Cart.objects.create(user=self.user, product=self.phone, quantity=2)
+        with self.assertNumQueries(1):
+            cart_totals(self.user)
+
+    def test_plus_minus_remove_endpoints(self):
+        Cart.objects.create(user=self.user, product=self.phone, quantity=1)
+        Cart.objects.create(user=self.other, product=self.phone, quantity=3)
+        self.client.force_login(self.user)
+
+        data = self.client.get("/pluscart/", {"prod_id": self.phone.id}).json()
+        self.assertEqual(data, {"quantity": 2, "amount": 200.0, "total_amount": 270.0})
+
+        data = self.client.get("/minuscart/", {"prod_id": self.phone.id}).json()
+        self.assertEqual(data, {"quantity": 1, "amount": 100.0, "total_amount": 170.0})
+
+        data = self.client.get("/removecart/", {"prod_id": self.phone.id}).json()
+        self.assertEqual(data, {"amount": 0.0, "total_amount": 0.0})
+        self.assertEqual(Cart.objects.filter(user=self.other).get().quantity, 3)
+
+    def test_show_cart_and_checkout_totals(self):
+        Cart.objects.create(user=self.user, product=self.laptop, quantity=2)
+        self.client.force_login(self.user)
+        response = self.client.get("/cart/")
+        self.assertEqual(response.context["amount"], 500.0)
+        self.assertEqual(response.context["total_amount"], 570.0)
+        response = self.client.get("/checkout/")
+        self.assertEqual(response.context["total_amount"], 570.0)
+
+
+class CartSummaryCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("alice", password="pw")
+        self.products = [make_product(f"P{i}", 10.0 * (i + 1)) for i in range(4)]
+        self.client.force_login(self.user)
+
+    def assertCacheMatchesDb(self):
+        cached = cache.get(cart_summary_key(self.user.pk, catalog_version()))
+        if cached is not None:
+            self.assertEqual(cached, cart_totals(self.user))
+
+    def test_badge_costs_no_queries_when_warm(self):
+        Cart.objects.create(user=self.user, product=self.products[0])
+        get_cart_summary(self.user)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_cart_summary(self.user)["count"], 1)
+
+    def test_cache_never_drifts_from_db(self):
+        rng = random.Random(7)
+        customer = make_customer(self.user)
+        for _ in range(60):
+            product = rng.choice(self.products)
+            in_cart = Cart.objects.filter(user=self.user, product=product).exists()
+            action = rng.choice(["add", "buy", "plus", "minus", "remove", "pay"])
+            if action == "add" and not in_cart:
+                self.client.get("/add-to-cart/", {"prod_id": product.id})
+            elif action == "buy" and not in_cart:
+                self.client.get("/buynow/", {"prod_id": product.id})
+            elif action in ("plus", "minus", "remove") and in_cart:
+                self.client.get(f"/{action}cart/", {"prod_id": product.id})
+            elif action == "pay":
+                self.client.get("/paymentdone/", {"custid": customer.id})
+            self.assertCacheMatchesDb()
+
+    def test_changes_outside_views_invalidate(self):
+        row = Cart.objects.create(user=self.user, product=self.products[0])
+        get_cart_summary(self.user)
+        row.delete()
+        self.assertEqual(get_cart_summary(self.user)["count"], 0)
+
+    def test_price_changes_invalidate(self):
+        Cart.objects.create(user=self.user, product=self.products[0], quantity=2)
+        self.assertEqual(get_cart_summary(self.user)["amount"], 20.0)
+        self.products[0].discounted_price = 15.0
+        with self.captureOnCommitCallbacks(execute=True):
+            self.products[0].save()
+        self.assertEqual(get_cart_summary(self.user)["amount"], 30.0)
+
+
+class ViewQueryCountTests(TestCase):
+    """The number of queries a page makes must not grow with the number of rows it lists."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("alice", password="pw")
+        self.customer = make_customer(self.user)
+        self.products = [make_product(f"P{i}", 10.0 + i) for i in range(30)]
+        self.client.force_login(self.user)
+
+    def fill(self, rows):
+        Cart.objects.filter(user=self.user).delete()
+        PlacedOrder.objects.filter(user=self.user).delete()
+        for product in self.products[:rows]:
+            Cart.objects.create(user=self.user, product=product, quantity=2)
+            PlacedOrder.objects.create(user=self.user, customer=self.customer, product=product, quantity=2, **snapshot(product, self.customer))
+
+    def count_queries(self, url):
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def assertConstantQueries(self, url):
+        self.fill(1)
+        small = self.count_queries(url)
+        self.fill(30)
+        self.assertEqual(self.count_queries(url), small)
+
+    def test_cart(self):
+        self.assertConstantQueries("/cart/")
+
+    def test_checkout(self):
+        self.assertConstantQueries("/checkout/")
+
+    def test_orders(self):
+        self.assertConstantQueries("/orders/")
+
+    def test_line_total_is_computed_by_db(self):
+        self.fill(3)
+        order = PlacedOrder.objects.with_line_total().first()
+        with self.assertNumQueries(0):
+            self.assertEqual(order.total_cost, order.quantity * order.unit_price)
+
+
+class OrderHistoryPaginationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("alice", password="pw")
+        customer = make_customer(self.user)
+        product = make_product()
+        self.orders = PlacedOrder.objects.bulk_create(
+            PlacedOrder(user=self.user, customer=customer, product=product, quantity=i + 1, **snapshot(product, customer))
+            for i in range(45)
+        )
+        # Give a block of orders the same timestamp to exercise the id tie-breaker.
+        PlacedOrder.objects.filter(id__in=[o.id for o in self.orders[10:30]]).update(
+            orered_date=self.orders[10].orered_date
+        )
+        self.client.force_login(self.user)
+
+    def walk(self, queryset, size):
+        seen, cursor = [], None
+        while True:
+            page, cursor = keyset_page(queryset, cursor, size)
+            seen.extend(o.id for o in page)
+            if cursor is None:
+                return seen
+
+    def test_pages_cover_every_order_once_newest_first(self):
+        queryset = PlacedOrder.objects.filter(user=self.user)
+        expected = list(queryset.order_by("-orered_date", "-id").values_list("id", flat=True))
+        for size in (1, 7, 20, 45, 100):
+            self.assertEqual(self.walk(queryset, size), expected)
+
+    def test_json_endpoint(self):
+        data = self.client.get("/orders/json/").json()
+        self.assertEqual(len(data["orders"]), 20)
+        collected = [o["id"] for o in data["orders"]]
+        while data["next"]:
+            data = self.client.get("/orders/json/", {"cursor": data["next"]}).json()
+            collected.extend(o["id"] for o in data["orders"])
+        self.assertEqual(sorted(collected), sorted(o.id for o in self.orders))
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.client.get("/orders/", {"cursor": "not-a-cursor"}).status_code, 400)
+        self.assertEqual(self.client.get("/orders/json/", {"cursor": "%%%"}).status_code, 400)
+
+    def test_deep_page_seeks_index(self):
+        queryset = PlacedOrder.objects.filter(user=self.user)
+        _, cursor = keyset_page(queryset, None, 40)
+        with CaptureQueriesContext(connection) as ctx:
+            keyset_page(queryset, cursor, 20)
+        self.assertEqual(len(ctx.captured_queries), 1)
+        sql = ctx.captured_queries[0]["sql"]
+        self.assertNotIn("OFFSET", sql)
+        with connection.cursor() as cursor:
+            cursor.execute("EXPLAIN QUERY PLAN " + sql)
+            plan = " ".join(str(row[-1]) for row in cursor.fetchall())
+        self.assertIn("app_order_user_date_idx (user_id=? AND orered_date<?)", plan)
+
+
+class CheckoutTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("alice", password="pw")
+        self.customer = make_customer(self.user)
+        self.products = [make_product(f"P{i}", 10.0 + i) for i in range(25)]
+
+    def fill(self, rows):
+        for product in self.products[:rows]:
+            Cart.objects.create(user=self.user, product=product, quantity=3)
+
+    def test_place_order_converts_cart(self):
+        self.fill(4)
+        orders = place_order(self.user, self.customer)
+        self.assertEqual(len(orders), 4)
+        self.assertFalse(Cart.objects.filter(user=self.user).exists())
+        self.assertEqual(
+            sorted(PlacedOrder.objects.values_list("product_id", "quantity")),
+            [(p.id, 3) for p in self.products[:4]],
+        )
+        self.assertEqual(place_order(self.user, self.customer), [])
+
+    def test_constant_queries_per_checkout(self):
+        self.fill(1)
+        with CaptureQueriesContext(connection) as small:
+            place_order(self.user, self.customer)
+        self.fill(25)
+        with CaptureQueriesContext(connection) as large:
+            place_order(self.user, self.customer)
+        self.assertEqual(len(large.captured_queries), len(small.captured_queries))
+
+    def test_other_users_address_is_rejected(self):
+        other = User.objects.create_user("bob", password="pw")
+        self.fill(1)
+        self.client.force_login(other)
+        response = self.client.get("/paymentdone/", {"custid": self.customer.id})
+        self.assertEqual(response.status_code, 404)
+
+
+class ConcurrentCheckoutTests(TransactionTestCase):
+    def test_concurrent_submits_never_duplicate_orders(self):
+        user = User.objects.create_user("alice", password="pw")
+        customer = make_customer(user)
+        products = [make_product(f"P{i}", 10.0 + i) for i in range(10)]
+        for product in products:
+            Cart.objects.create(user=user, product=product, quantity=2)
+
+        clients = []
+        for _ in range(8):
+            client = Client()
+            client.force_login(user)
+            clients.append(client)
+        barrier = threading.Barrier(len(clients), timeout=10)
+
+        responses, errors = [], []
+
+        def submit(client):
+            try:
+                barrier.wait()
+                responses.append(client.get("/paymentdone/", {"custid": customer.id}).status_code)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=submit, args=(client,)) for client in clients]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(responses, [302] * len(clients))
+        self.assertEqual(
+            sorted(PlacedOrder.objects.values_list("product_id", flat=True)),
+            sorted(p.id for p in products),
+        )
+        self.assertFalse(Cart.objects.exists())
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.galaxy = make_product("Galaxy S23 phone", 70000.0, category="M", brand="Samsung")
+        self.redmi = make_product("Note 12", 15000.0, category="M", brand="Redmi")
+        self.xps = make_product("XPS 13", 90000.0, category="L", brand="Dell")
+        self.xps.description = "Thin laptop with a Samsung display panel"
+        self.xps.save()
+
+    def titles(self, results):
+        return [p.title for p in results]
+
+    def test_fts_ranks_title_and_brand_above_description(self):
+        self.assertEqual(self.titles(SqliteFTSSearchBackend().search("samsung")), ["Galaxy S23 phone", "XPS 13"])
+
+    def test_fts_matches_prefixes_category_names_and_all_terms(self):
+        backend = SqliteFTSSearchBackend()
+        self.assertEqual(self.titles(backend.search("redm")), ["Note 12"])
+        self.assertEqual(set(self.titles(backend.search("mobile"))), {"Galaxy S23 phone", "Note 12"})
+        self.assertEqual(self.titles(backend.search("samsung thin")), ["XPS 13"])
+        self.assertEqual(backend.search('" OR * NEAR('), [])
+
+    def test_index_follows_product_changes(self):
+        backend = SqliteFTSSearchBackend()
+        self.redmi.title = "Poco F5"
+        self.redmi.description = "Budget phone"
+        self.redmi.save()
+        self.assertEqual(backend.search("note"), [])
+        self.assertEqual(self.titles(backend.search("poco")), ["Poco F5"])
+        self.redmi.delete()
+        self.assertEqual(backend.search("poco"), [])
+
+    def test_rebuild_indexes_bulk_created_products(self):
+        Product.objects.bulk_create([Product(title="Bulk Tee", selling_price=1, discounted_price=1, description="",
+                                             brand="Levis", category="TW", product_image="productimg/1.jpg")])
+        backend = SqliteFTSSearchBackend()
+        self.assertEqual(backend.search("tee"), [])
+        backend.rebuild()
+        self.assertEqual(self.titles(backend.search("tee")), ["Bulk Tee"])
+
+    def test_contains_backend_agrees(self):
+        for query in ("samsung", "mobile", "samsung thin", "xps"):
+            self.assertEqual(
+                set(self.titles(ContainsSearchBackend().search(query))),
+                set(self.titles(SqliteFTSSearchBackend().search(query))),
+            )
+
+    def test_search_view_runs_one_search_query(self):
+        with self.assertNumQueries(1):
+            response = self.client.get("/search/", {"query": "dell"})
+        self.assertEqual(self.titles(response.context["allprods"]), ["XPS 13"])
+        self.assertNotContains(response, "Showing the first")
+
+    def test_search_page_says_when_results_are_cut_off(self):
+        with mock.patch("app.search.SEARCH_RESULTS_LIMIT", 1):
+            response = self.client.get("/search/", {"query": "samsung"})
+        self.assertEqual(len(response.context["allprods"]), 1)
+        self.assertContains(response, "Showing the first 1 results")
+
+
+class SuggestTests(TestCase):
+    def setUp(self):
+        reset_suggestion_index()
+        self.galaxy = make_product("Galaxy S23 Ultra", 90000.0, brand="Samsung")
+        self.note = make_product("Redmi Note 12", 15000.0, brand="Xiaomi")
+
+    def tearDown(self):
+        reset_suggestion_index()
+
+    def test_prefix_index(self):
+        index = PrefixIndex()
+        index.build([(1, "Galaxy S23 Ultra", "Samsung"), (2, "Galaxy Tab", "Samsung"), (3, "Pixel 8", "Google")])
+        self.assertEqual([r[0] for r in index.lookup("gal")], [1, 2])
+        self.assertEqual([r[0] for r in index.lookup("S23")], [1])
+        self.assertEqual([r[0] for r in index.lookup("sams", k=1)], [1])
+        self.assertEqual(index.lookup("  "), [])
+        index.add(2, "Galaxy Watch", "Samsung")
+        index.remove(1)
+        self.assertEqual(index.lookup("gal"), [(2, "Galaxy Watch", "Samsung")])
+        self.assertEqual(index.lookup("ultra"), [])
+
+    def test_lookups_see_consistent_index_during_writes(self):
+        index = PrefixIndex()
+        index.build((pk, f"Alpha {pk}", "Acme") for pk in range(50))
+        stop, errors = threading.Event(), []
+
+        def write():
+            # Adding and removing keys that sort before "alpha" shifts the lists under the readers.
+            while not stop.is_set():
+                for pk in range(100, 150):
+                    index.add(pk, "Aardvark", "Aa")
+                for pk in range(100, 150):
+                    index.remove(pk)
+
+        writer = threading.Thread(target=write)
+        writer.start()
+        try:
+            for _ in range(2000):
+                try:
+                    results = index.lookup("alpha", k=50)
+                except IndexError as e:
+                    errors.append(e)
+                    continue
+                if any(title != f"Alpha {pk}" for pk, title, _ in results) or len(results) != 50:
+                    errors.append(results)
+        finally:
+            stop.set()
+            writer.join()
+        self.assertEqual(errors, [])
+
+    def test_endpoint_loads_lazily_and_answers_without_queries(self):
+        self.assertIsNone(loaded_suggestion_index())
+        data = self.client.get("/suggest/", {"q": "note"}).json()
+        self.assertEqual([s["id"] for s in data["suggestions"]], [self.note.id])
+        self.assertEqual(data["suggestions"][0]["url"], f"/product-detail/{self.note.id}")
+        with self.assertNumQueries(0):
+            self.client.get("/suggest/", {"q": "gal"})
+
+    def test_index_follows_product_signals(self):
+        self.client.get("/suggest/", {"q": "x"})
+        self.galaxy.title = "Galaxy Fold"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.galaxy.save()
+            make_product("Pixel 8", brand="Google")
+            self.note.delete()
+            # Nothing changes before the commit.
+            self.assertEqual(len(loaded_suggestion_index()), 2)
+        suggest = lambda q: [s["title"] for s in self.client.get("/suggest/", {"q": q}).json()["suggestions"]]
+        self.assertEqual(suggest("gal"), ["Galaxy Fold"])
+        self.assertEqual(suggest("goo"), ["Pixel 8"])
+        self.assertEqual(suggest("redmi"), [])
+        self.assertEqual(len(loaded_suggestion_index()), 2)
+
+    def test_rolled_back_changes_leave_the_index_alone(self):
+        self.client.get("/suggest/", {"q": "x"})
+        note_id = self.note.id
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    make_product("Pixel 8", brand="Google")
+                    self.note.delete()
+                    raise IntegrityError
+            except IntegrityError:
+                pass
+        self.assertEqual(loaded_suggestion_index().lookup("pixel"), [])
+        self.assertEqual(loaded_suggestion_index().lookup("note"), [(note_id, "Redmi Note 12", "Xiaomi")])
+
+    def test_index_follows_changes_made_without_signals(self):
+        self.client.get("/suggest/", {"q": "x"})
+        # What another process, an import or a job does: no signal here, only a version bump.
+        Product.objects.filter(pk=self.note.pk).update(title="Redmi Note 13")
+        bump_catalog_version()
+        suggest = lambda q: [s["title"] for s in self.client.get("/suggest/", {"q": q}).json()["suggestions"]]
+        self.assertEqual(suggest("redmi"), ["Redmi Note 13"])
+        with self.assertNumQueries(0):
+            suggest("gal")
+
+
+class CatalogTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.s1 = make_product("Galaxy A14", 9000.0, category="M", brand="Samsung")
+        self.s2 = make_product("Galaxy S23", 70000.0, category="M", brand="Samsung")
+        self.r1 = make_product("Redmi 12", 10000.0, category="M", brand="Redmi")
+        self.r2 = make_product("Redmi Note", 15000.0, category="M", brand="Redmi")
+        self.tee = make_product("Tee", 400.0, category="TW", brand="Levis")
+        self.jeans = make_product("Jeans", 1500.0, category="BW", brand="Levis")
+
+    def ids(self, response):
+        return [p.id for p in response.context["products"]]
+
+    def test_legacy_urls_keep_working(self):
+        self.assertEqual(self.ids(self.client.get("/mobile/")), [self.s1.id, self.s2.id, self.r1.id, self.r2.id])
+        self.assertEqual(self.ids(self.client.get("/mobile/Samsung")), [self.s1.id, self.s2.id])
+        self.assertEqual(self.ids(self.client.get("/mobile/Below10000")), [self.s1.id])
+        self.assertEqual(self.ids(self.client.get("/mobile/10000-20000")), [self.r1.id, self.r2.id])
+        self.assertEqual(self.ids(self.client.get("/mobile/Above10000")), [self.s2.id])
+        self.assertEqual(self.ids(self.client.get("/clothing/BW")), [self.jeans.id])
+        self.assertEqual(self.ids(self.client.get("/clothing/Below1000")), [self.tee.id])
+
+    def test_unknown_filters_are_not_found(self):
+        self.assertEqual(self.client.get("/mobile/Nokia").status_code, 404)
+        self.assertEqual(self.client.get("/catalog/furniture/").status_code, 404)
+        self.assertEqual(self.client.get("/catalog/m/", {"price": "cheap"}).status_code, 404)
+        self.assertEqual(self.client.get("/catalog/m/", {"sort": "random"}).status_code, 404)
+
+    def test_combined_filters_and_sort(self):
+        response = self.client.get("/catalog/m/", {"brand": ["Samsung", "Redmi"], "price": "10000-20000", "sort": "price_desc"})
+        self.assertEqual(self.ids(response), [self.r2.id, self.r1.id])
+        self.assertEqual(self.ids(self.client.get("/catalog/m/", {"sort": "price_asc"}))[0], self.s1.id)
+
+    def test_facets_in_one_query(self):
+        with self.assertNumQueries(1):
+            facets = compute_facets(LISTINGS["mobile"])
+        self.assertEqual(facets["brands"], {"Samsung": 2, "Redmi": 2})
+        self.assertEqual(facets["price"], {"-10000": 1, "10000-20000": 2, "20000-": 1})
+        self.assertEqual(compute_facets(LISTINGS["clothing"])["categories"], {"TW": 1, "BW": 1})
+
+    def test_facets_are_cached_until_products_change(self):
+        get_facets(LISTINGS["mobile"])
+        with self.assertNumQueries(0):
+            get_facets(LISTINGS["mobile"])
+        with self.captureOnCommitCallbacks(execute=True):
+            make_product("Realme 11", 12000.0, category="M", brand="Realme")
+        self.assertEqual(get_facets(LISTINGS["mobile"])["brands"]["Realme"], 1)
+
+    def test_facet_links_keep_other_filters(self):
+        response = self.client.get("/catalog/m/", {"brand": "Redmi"})
+        prices = response.context["facets"]["prices"]
+        self.assertEqual(prices[1]["query"], "?brand=Redmi&price=10000-20000")
+        brands = {b["label"]: b for b in response.context["facets"]["brands"]}
+        self.assertTrue(brands["Redmi"]["selected"])
+        self.assertEqual(brands["Redmi"]["query"], "?")
+
+
+class HomeRailsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.phones = [make_product(f"Phone {i}", 1000.0 + i, category="M") for i in range(RAIL_SIZE + 3)]
+
+    def test_rails_are_bounded_and_newest_first(self):
+        rails = get_rails()
+        self.assertEqual([card["id"] for card in rails["mobile"]], [p.id for p in reversed(self.phones)][:RAIL_SIZE])
+        self.assertEqual(rails["laptop"], [])
+        self.assertEqual(rails["mobile"][0]["image_url"], "/media/productimg/1.jpg")
+
+    def test_home_page_serves_from_cache(self):
+        self.client.get("/")
+        with self.assertNumQueries(0):
+            response = self.client.get("/")
+        self.assertContains(response, "Phone 14")
+
+    def test_rails_expire(self):
+        call_command("refresh_home_rails", stdout=io.StringIO())
+        self.assertIsNotNone(cache.get(HOME_RAILS_KEY))
+        later = time.time() + RAILS_TIMEOUT + 1
+        with mock.patch("django.core.cache.backends.filebased.time.time", return_value=later):
+            self.assertIsNone(cache.get(HOME_RAILS_KEY))
+
+    def test_product_change_refreshes_rails(self):
+        get_rails()
+        with self.captureOnCommitCallbacks(execute=True):
+            laptop = make_product("New Laptop", 50000.0, category="L")
+        self.assertEqual([card["id"] for card in get_rails()["laptop"]], [laptop.id])
+
+
+class PageCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.phone = make_product("Galaxy", 9000.0, category="M")
+        self.user = User.objects.create_user("alice", password="pw")
+
+    def test_anonymous_pages_are_cached_with_validators(self):
+        for url in ("/", f"/product-detail/{self.phone.id}", "/mobile/", "/catalog/m/?sort=price_asc"):
+            first = self.client.get(url)
+            self.assertEqual(first.status_code, 200)
+            self.assertIn("ETag", first)
+            self.assertIn("Last-Modified", first)
+            with self.assertNumQueries(0):
+                second = self.client.get(url)
+            self.assertEqual(second.content, first.content)
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=first["ETag"]).status_code, 304)
+            self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=first["Last-Modified"]).status_code, 304)
+
+    def test_unread_query_parameters_share_the_cached_page(self):
+        first = self.client.get("/catalog/m/?sort=price_asc&brand=")
+        self.client.get("/?utm_source=mail")
+        with self.assertNumQueries(0):
+            for junk in ("utm_source=mail", "x=1&y=2", "z=3"):
+                self.assertEqual(self.client.get(f"/catalog/m/?sort=price_asc&{junk}").content, first.content)
+            self.client.get("/")
+        make_product("Pixel", 5000.0, category="M", brand="Google")
+        # A parameter the view reads is still part of the key.
+        self.assertContains(self.client.get("/catalog/m/?sort=price_desc"), "Pixel")
+
+    def test_product_change_invalidates_pages(self):
+        first = self.client.get("/mobile/")
+        self.phone.title = "Galaxy Renamed"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.phone.save()
+        second = self.client.get("/mobile/", HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(second.status_code, 200)
+        self.assertContains(second, "Galaxy Renamed")
+
+    def test_pages_are_invalidated_only_when_the_change_commits(self):
+        version = catalog_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                self.phone.title = "Galaxy Renamed"
+                self.phone.save()
+                self.assertEqual(catalog_version(), version)
+        self.assertGreater(catalog_version(), version)
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            try:
+                with transaction.atomic():
+                    self.phone.delete()
+                    raise IntegrityError
+            except IntegrityError:
+                pass
+        self.assertEqual(callbacks, [])
+
+    def test_logged_in_shell_gets_current_cart_badge(self):
+        log_in(self.client, self.user)
+        first = self.client.get("/mobile/")
+        self.assertContains(first, '<span class="badge bg-danger">0</span>', html=False)
+        Cart.objects.create(user=self.user, product=self.phone)
+        second = self.client.get("/mobile/", HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(second.status_code, 200)
+        self.assertContains(second, '<span class="badge bg-danger">1</span>', html=False)
+        self.assertNotContains(second, "cart-badge:")
+        self.assertEqual(second["Cache-Control"], "private, max-age=0, must-revalidate")
+        self.assertEqual(self.client.get("/mobile/", HTTP_IF_NONE_MATCH=second["ETag"]).status_code, 304)
+
+    def test_shells_are_per_user_and_detail_pages_are_not_shared(self):
+        other = User.objects.create_user("bob", password="pw")
+        log_in(self.client, self.user)
+        self.assertContains(self.client.get("/"), "alice")
+        log_in(self.client, other)
+        self.assertNotContains(self.client.get("/"), "alice")
+        Cart.objects.create(user=other, product=self.phone)
+        self.assertContains(self.client.get(f"/product-detail/{self.phone.id}"), "Go to Cart")
+
+    def test_missing_product_is_not_found(self):
+        self.assertEqual(self.client.get("/product-detail/999").status_code, 404)
+
+
+def make_image(name="photo.jpg", size=(800, 600)):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, (200, 40, 40)).save(buffer, "JPEG")
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type="image/jpeg")
+
+
+class ImageDerivativeTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def render(self, product):
+        return Template('{% load product_images %}{% product_picture product sizes="100px" width=100 %}').render(
+            Context({"product": product})
+        )
+
+    def upload(self, product, image):
+        product.product_image = image
+        product.save()
+        self.assertFalse(Product.objects.get(pk=product.pk).image_variants)
+        version = catalog_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(run_due_jobs(), {"done": 1})
+        # Pages cached before the derivatives existed are dropped.
+        self.assertGreater(catalog_version(), version)
+        product.refresh_from_db()
+
+    def test_upload_queues_hashed_derivatives(self):
+        product = make_product()
+        self.upload(product, make_image())
+        manifest = product.image_variants
+        self.assertEqual(manifest["source"], product.product_image.name)
+        self.assertEqual(sorted(manifest["variants"]["webp"]), ["100", "300", "600"])
+        name = manifest["variants"]["webp"]["300"]
+        self.assertIn(manifest["hash"], name)
+        with product.product_image.storage.open(name) as f, Image.open(f) as image:
+            self.assertEqual(image.format, "WEBP")
+            self.assertEqual(image.size, (300, 225))
+
+    def test_small_images_are_not_upscaled(self):
+        product = make_product()
+        self.upload(product, make_image(size=(200, 100)))
+        self.assertEqual(sorted(product.image_variants["variants"]["jpg"]), ["100", "200"])
+
+    def test_picture_tag_emits_srcsets(self):
+        product = make_product()
+        self.upload(product, make_image())
+        html = self.render(product)
+        self.assertIn('<source type="image/webp" srcset="/media/productimg/derivatives/', html)
+        self.assertIn(" 100w, ", html)
+        self.assertIn('sizes="100px"', html)
+        self.assertIn('alt="Phone"', html)
+
+    def test_picture_tag_falls_back_without_derivatives(self):
+        product = make_product()
+        self.assertEqual(self.render(product), '<img src="/media/productimg/1.jpg" alt="Phone" width="100">')
+        product.product_image = "productimg/2.jpg"
+        product.image_variants = {"source": "productimg/1.jpg", "variants": {"jpg": {"100": "x.jpg"}}}
+        self.assertIn('<img src="/media/productimg/2.jpg"', self.render(product))
+
+    def test_backfill_command_fills_stale_products(self):
+        image = make_image()
+        path = default_storage.save("productimg/backfill.jpg", image)
+        first, second = make_product(), make_product("Tablet")
+        Product.objects.update(product_image=path)
+        version = catalog_version()
+        call_command("generate_image_derivatives", workers=1, stdout=io.StringIO())
+        self.assertGreater(catalog_version(), version)
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.image_variants, second.image_variants)
+        self.assertEqual(first.image_variants, generate_derivatives(path))
+
+
+def drain(response):
+    """
+    Reads a file response to the end, which closes its file.
+
+    Calling response.close() instead would send request_finished, which closes
+    the test's database connection.
+    """
+    if response.streaming:
+        b"".join(response.streaming_content)
+
+
+class BrowserCache:
+    """Replays page visits the way a browser with an HTTP cache fetches the assets they link to."""
+
+    ASSET_URL = re.compile(r'(?:src|href)="(/(?:static|media)/[^"]+)"')
+
+    def __init__(self, client):
+        self.client = client
+        self.expires = {}
+
+    def visit(self, path, now):
+        """Loads a page and returns the asset requests that went to the server."""
+        html = self.client.get(path).content.decode()
+        requested = []
+        for url in sorted(set(self.ASSET_URL.findall(html))):
+            if self.expires.get(url, 0) > now:
+                continue
+            response = self.client.get(url, HTTP_ACCEPT_ENCODING="gzip, deflate, br")
+            requested.append((url, response))
+            max_age = re.search(r"max-age=(\d+)", response["Cache-Control"])
+            self.expires[url] = now + int(max_age.group(1))
+            drain(response)
+        return requested
+
+
+class AssetServingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        static_root, media_root = tempfile.mkdtemp(), tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, static_root)
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(
+            STATIC_ROOT=static_root,
+            MEDIA_ROOT=media_root,
+            STATICFILES_STORAGE="app.assets.CompressedManifestStaticFilesStorage",
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        # The bundled Font Awesome stylesheet references webfonts that are not shipped.
+        with self.assertLogs("app.assets", "WARNING"):
+            call_command("collectstatic", interactive=False, verbosity=0)
+        product = make_product()
+        product.product_image = make_image()
+        product.save()
+
+    def test_repeat_visits_make_no_asset_requests(self):
+        browser = BrowserCache(self.client)
+        first = browser.visit("/", now=0)
+        urls = [url for url, _ in first]
+        self.assertIn(True, [re.search(r"/static/app/css/style\.[0-9a-f]{12}\.css$", url) is not None for url in urls])
+        self.assertIn(True, [url.startswith("/media/productimg/") for url in urls])
+        self.assertEqual([response.status_code for _, response in first], [200] * len(first))
+        self.assertEqual(browser.visit("/", now=60), [])
+        browser.visit("/mobile/", now=120)
+        self.assertEqual(browser.visit("/mobile/", now=180), [])
+
+    def test_hashed_assets_are_immutable_and_precompressed(self):
+        css = re.search(r'href="(/static/app/css/style\.[0-9a-f]{12}\.css)"', self.client.get("/").content.decode())[1]
+        response = self.client.get(css, HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(response["Cache-Control"], "public, max-age=31536000, immutable")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(response["Content-Type"], "text/css")
+        self.assertEqual(response["Vary"], "Accept-Encoding")
+        body = gzip.decompress(b"".join(response.streaming_content))
+        self.assertIn(b"{", body)
+
+        plain = self.client.get(css)
+        self.assertFalse(plain.has_header("Content-Encoding"))
+        self.assertEqual(b"".join(plain.streaming_content), body)
+        self.assertNotEqual(plain["ETag"], response["ETag"])
+        self.assertEqual(self.client.get(css, HTTP_IF_NONE_MATCH=plain["ETag"]).status_code, 304)
+
+    def test_refused_encodings_are_not_served(self):
+        css = re.search(r'href="(/static/app/css/style\.[0-9a-f]{12}\.css)"', self.client.get("/").content.decode())[1]
+        for header in ("gzip;q=0", "gzip;q=0, br;q=0", "*;q=0", "identity", "x-gzip-ish"):
+            with self.subTest(header=header):
+                response = self.client.get(css, HTTP_ACCEPT_ENCODING=header)
+                self.assertFalse(response.has_header("Content-Encoding"))
+                drain(response)
+        for header in ("br;q=0, gzip", "GZIP; Q=0.5", "br;q=0, *"):
+            with self.subTest(header=header):
+                response = self.client.get(css, HTTP_ACCEPT_ENCODING=header)
+                self.assertEqual(response["Content-Encoding"], "gzip")
+                drain(response)
+        self.assertEqual(
+            accepted_encodings("gzip;q=0.5, br ;q=0 , *;q=1.5, deflate;q=bad"),
+            {"gzip": 0.5, "br": 0.0, "*": 1.0, "deflate": 0.0},
+        )
+
+    def test_unhashed_files_are_revalidated_and_traversal_is_refused(self):
+        response = self.client.get("/static/app/css/style.css")
+        self.assertEqual(response["Cache-Control"], "public, max-age=300")
+        drain(response)
+        self.assertEqual(self.client.get("/media/../manage.py").status_code, 404)
+        self.assertEqual(self.client.get("/static/app/missing.css").status_code, 404)
+
+
+def session_queries(queries):
+    return [q["sql"] for q in queries if "django_session" in q["sql"]]
+
+
+class SessionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("alice", password="pw")
+        self.phone = make_product("Galaxy")
+
+    def test_login_and_logout_follow_logged_in_cookie(self):
+        response = self.client.post("/accounts/login", {"username": "alice", "password": "pw"})
+        self.assertEqual(response.status_code, 302)
+        self.assertIn(LOGGED_IN_COOKIE, response.cookies)
+        self.assertContains(self.client.get("/mobile/"), "alice")
+        response = self.client.post("/logout/")
+        self.assertEqual(response.cookies[LOGGED_IN_COOKIE].value, "")
+        self.assertNotContains(self.client.get("/mobile/"), "alice")
+
+    def test_session_without_marker_is_loaded_and_marked(self):
+        # A login made before the marker existed, or whose marker expired before the session.
+        self.client.force_login(self.user)
+        self.assertNotIn(LOGGED_IN_COOKIE, self.client.cookies)
+        response = self.client.get("/mobile/")
+        self.assertContains(response, "alice")
+        marker = response.cookies[LOGGED_IN_COOKIE]
+        self.assertEqual(marker.value, "1")
+        self.assertEqual(marker["max-age"], self.client.session.get_expiry_age())
+        self.assertContains(self.client.get("/"), "alice")
+
+    @override_settings(SESSION_ENGINE="django.contrib.sessions.backends.db")
+    def test_anonymous_catalog_requests_skip_session_store(self):
+        self.client.force_login(self.user)
+        self.client.logout()
+        self.client.cookies["sessionid"] = "stale0session0key0that0is0long"
+        # A session cookie without the marker is looked up once, and dropped as it names no session.
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get("/mobile/")
+        self.assertEqual(len(session_queries(ctx.captured_queries)), 1)
+        self.assertEqual(response.cookies["sessionid"].value, "")
+        self.client.cookies["sessionid"] = "stale0session0key0that0is0long"
+        self.client.cookies[LOGGED_IN_COOKIE] = "0"
+        for url in ("/", "/mobile/", f"/product-detail/{self.phone.id}", "/search/?query=galaxy", "/suggest/?q=ga"):
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(session_queries(ctx.captured_queries), [], url)
+            self.assertNotIn("sessionid", response.cookies)
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get("/cart/")
+        self.assertEqual(len(session_queries(ctx.captured_queries)), 1)
+
+    @override_settings(SESSION_ENGINE="django.contrib.sessions.backends.cached_db")
+    def test_cached_db_sessions_are_read_from_cache(self):
+        self.client.post("/accounts/login", {"username": "alice", "password": "pw"})
+        self.client.get("/profile/")
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertContains(self.client.get("/profile/"), "alice")
+            self.assertContains(self.client.get("/mobile/"), "alice")
+        self.assertEqual(session_queries(ctx.captured_queries), [])
+
+    @override_settings(SESSION_ENGINE="django.contrib.sessions.backends.signed_cookies")
+    def test_signed_cookie_sessions(self):
+        self.client.post("/accounts/login", {"username": "alice", "password": "pw"})
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertContains(self.client.get("/cart/"), "alice")
+        self.assertEqual(session_queries(ctx.captured_queries), [])
+
+
+@override_settings(ROOT_URLCONF="app.async_urls")
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("alice", password="pw")
+        self.phone = make_product("Galaxy", 100.0)
+        self.laptop = make_product("ThinkPad", 500.0, category="L", brand="Lenovo")
+        self.client = AsyncClient()
+
+    async def test_read_paths_render_like_sync_views(self):
+        home = await self.client.get("/")
+        self.assertContains(home, "Galaxy")
+        listing = await self.client.get("/mobile/Samsung")
+        self.assertContains(listing, "Galaxy")
+        self.assertNotContains(listing, "ThinkPad")
+        self.assertEqual((await self.client.get("/mobile/Unknown")).status_code, 404)
+        detail = await self.client.get(f"/product-detail/{self.phone.id}")
+        self.assertContains(detail, "Galaxy")
+        self.assertEqual((await self.client.get("/product-detail/999")).status_code, 404)
+        self.assertContains(await self.client.get("/search/?query=thinkpad"), "ThinkPad")
+
+    async def test_cart_endpoints(self):
+        await Cart.objects.acreate(user=self.user, product=self.phone)
+        await sync_to_async(log_in)(self.client, self.user)
+        self.assertContains(await self.client.get("/mobile/"), '<span class="badge bg-danger">1</span>', html=False)
+        detail = await self.client.get(f"/product-detail/{self.phone.id}")
+        self.assertContains(detail, "Go to Cart")
+
+        response = await self.client.get("/pluscart/", {"prod_id": self.phone.id})
+        self.assertEqual(response.json(), {"quantity": 2, "amount": 200.0, "total_amount": 270.0})
+        response = await self.client.get("/minuscart/", {"prod_id": self.phone.id})
+        self.assertEqual(response.json(), {"quantity": 1, "amount": 100.0, "total_amount": 170.0})
+        response = await self.client.get("/removecart/", {"prod_id": self.phone.id})
+        self.assertEqual(response.json(), {"amount": 0.0, "total_amount": 0.0})
+        self.assertEqual((await self.client.get("/removecart/", {"prod_id": self.phone.id})).status_code, 404)
+        self.assertEqual(get_cart_summary(self.user)["count"], 0)
+
+    async def test_search_renders_for_logged_in_users(self):
+        await sync_to_async(log_in)(self.client, self.user)
+        response = await self.client.get("/search/?query=thinkpad")
+        self.assertContains(response, "ThinkPad")
+        self.assertContains(response, "alice")
+
+    async def test_cart_endpoints_need_login(self):
+        self.assertEqual((await self.client.get("/pluscart/", {"prod_id": self.phone.id})).status_code, 403)
+
+
+def full_table_scans(queries):
+    """Returns the (table, sql) pairs of queries whose SQLite plan reads a whole table."""
+    scans = []
+    with connection.cursor() as cursor:
+        for sql in {q["sql"] for q in queries}:
+            if not sql.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE")):
+                continue
+            cursor.execute("EXPLAIN QUERY PLAN " + sql)
+            for row in cursor.fetchall():
+                # "SCAN app_product" (or "SCAN TABLE app_product" before SQLite 3.36) without an index.
+                match = re.fullmatch(r"SCAN (?:TABLE )?(\w+)(?: AS \w+)?", row[-1])
+                if match:
+                    scans.append((match[1], sql))
+    return scans
+
+
+class QueryPlanTests(TestCase):
+    """The queries of the hot views must be answered from indexes, not by scanning whole tables."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("alice", password="pw")
+        self.customer = make_customer(self.user)
+        self.products = [
+            make_product(f"P{i}", 100.0 * i, category, brand)
+            for i, (category, brand) in enumerate(
+                [("M", "Samsung"), ("M", "Apple"), ("L", "Dell"), ("TW", "Levis"), ("BW", "Levis")] * 4
+            )
+        ]
+        Cart.objects.create(user=self.user, product=self.products[0])
+        PlacedOrder.objects.create(user=self.user, customer=self.customer, product=self.products[1], **snapshot(self.products[1], self.customer))
+        log_in(self.client, self.user)
+
+    def assertNoFullScans(self, *urls):
+        for url in urls:
+            cache.clear()
+            with CaptureQueriesContext(connection) as ctx:
+                self.assertEqual(self.client.get(url).status_code, 200, url)
+            self.assertEqual(full_table_scans(ctx.captured_queries), [], url)
+
+    def test_catalog_views(self):
+        self.assertNoFullScans(
+            "/",
+            "/mobile/",
+            "/mobile/Samsung",
+            "/mobile/Below10000",
+            "/catalog/m/?sort=price_desc",
+            "/catalog/clothing/?brand=Levis&sort=newest",
+            f"/product-detail/{self.products[0].id}",
+        )
+
+    def test_cart_and_order_views(self):
+        self.assertNoFullScans(
+            "/cart/",
+            f"/pluscart/?prod_id={self.products[0].id}",
+            f"/minuscart/?prod_id={self.products[0].id}",
+            "/checkout/",
+            "/orders/",
+        )
+
+
+class AddToCartTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("alice", password="pw")
+        self.phone = make_product("Galaxy", 100.0)
+        self.client.force_login(self.user)
+
+    def test_adding_again_raises_quantity(self):
+        add_cart_item(self.user, self.phone)
+        self.assertEqual(list(Cart.objects.values_list("quantity", flat=True)), [1])
+        add_cart_item(self.user, self.phone, 3)
+        self.assertEqual(list(Cart.objects.values_list("quantity", flat=True)), [4])
+
+    def test_double_click_and_buy_now_keep_one_line(self):
+        self.client.get("/add-to-cart/", {"prod_id": self.phone.id})
+        self.client.get("/add-to-cart/", {"prod_id": self.phone.id})
+        self.client.get("/buynow/", {"prod_id": self.phone.id})
+        self.assertEqual(list(Cart.objects.values_list("quantity", flat=True)), [3])
+        self.assertEqual(get_cart_summary(self.user)["amount"], 300.0)
+        response = self.client.get("/pluscart/", {"prod_id": self.phone.id})
+        self.assertEqual(response.json()["quantity"], 4)
+
+    def test_duplicate_lines_are_rejected(self):
+        Cart.objects.create(user=self.user, product=self.phone)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Cart.objects.create(user=self.user, product=self.phone)
+
+
+class CartBatchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("alice", password="pw")
+        self.phone = make_product("Galaxy", 100.0)
+        self.laptop = make_product("Zenbook", 1000.0, category="L")
+        self.tv = make_product("Bravia", 500.0, category="TV")
+        Cart.objects.create(user=self.user, product=self.phone, quantity=1)
+        Cart.objects.create(user=self.user, product=self.laptop, quantity=2)
+        self.client.force_login(self.user)
+
+    def batch(self, *operations, client=None):
+        return (client or self.client).post("/cart/batch/", {"operations": list(operations)}, content_type="application/json")
+
+    def test_batch_applies_every_operation_and_returns_totals_once(self):
+        response = self.batch(
+            {"op": "set", "product": self.phone.id, "quantity": 4},
+            {"op": "remove", "product": self.laptop.id},
+            {"op": "add", "product": self.tv.id},
+            {"op": "add", "product": self.tv.id, "quantity": 2},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json(),
+            {
+                "items": sorted(
+                    [
+                        {"product": self.phone.id, "quantity": 4},
+                        {"product": self.laptop.id, "quantity": 0},
+                        {"product": self.tv.id, "quantity": 3},
+                    ],
+                    key=lambda item: item["product"],
+                ),
+                "count": 2,
+                "amount": 1900.0,
+                "total_amount": 1900.0 + SHIPPING_AMOUNT,
+            },
+        )
+        self.assertEqual(dict(Cart.objects.values_list("product_id", "quantity")), {self.phone.id: 4, self.tv.id: 3})
+        self.assertEqual(get_cart_summary(self.user)["amount"], 1900.0)
+
+    def test_totals_are_computed_once_per_batch(self):
+        operations = [{"op": "set", "product": self.phone.id, "quantity": q} for q in range(1, 11)]
+        with CaptureQueriesContext(connection) as ctx:
+            self.batch(*operations)
+        self.assertEqual(sum("SUM(" in q["sql"].upper() for q in ctx.captured_queries), 1)
+        self.assertEqual(Cart.objects.get(product=self.phone).quantity, 10)
+
+    def test_set_to_zero_removes_the_line(self):
+        response = self.batch({"op": "set", "product": self.phone.id, "quantity": 0})
+        self.assertEqual(response.json()["items"], [{"product": self.phone.id, "quantity": 0}])
+        self.assertFalse(Cart.objects.filter(product=self.phone).exists())
+
+    def test_invalid_batch_changes_nothing(self):
+        for body in (
+            [{"op": "set", "product": self.phone.id, "quantity": 5}, {"op": "set", "product": 9999, "quantity": 1}],
+            [{"op": "set", "product": self.phone.id, "quantity": -1}],
+            [{"op": "add", "product": self.phone.id, "quantity": 0}],
+            [{"op": "set", "product": self.phone.id}],
+            [{"op": "bump", "product": self.phone.id}],
+            [],
+        ):
+            with self.subTest(body=body):
+                response = self.batch(*body)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn("error", response.json())
+        response = self.client.post("/cart/batch/", "not json", content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Cart.objects.get(product=self.phone).quantity, 1)
+
+    def test_requires_post_and_login(self):
+        self.assertEqual(self.client.get("/cart/batch/").status_code, 405)
+        response = self.batch({"op": "remove", "product": self.phone.id}, client=Client())
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(Cart.objects.filter(product=self.phone).exists())
+
+    def test_csrf_is_enforced(self):
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.user)
+        self.assertEqual(self.batch({"op": "remove", "product": self.phone.id}, client=client).status_code, 403)
+
+    def test_cart_page_sets_the_token_batches_send(self):
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.user)
+        token = client.get("/cart/").cookies["csrftoken"].value
+        response = client.post(
+            "/cart/batch/",
+            {"operations": [{"op": "remove", "product": self.phone.id}]},
+            content_type="application/json",
+            HTTP_X_CSRFTOKEN=token,
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Cart.objects.filter(product=self.phone).exists())
+
+    def test_place_order_waits_for_pending_edits(self):
+        # The script holds the Place Order click until the debounced batch is sent.
+        self.client.force_login(self.user)
+        self.assertContains(self.client.get("/cart/"), 'id="place-order"')
+        with open(finders.find("app/js/myscript.js")) as script:
+            self.assertIn('$("#place-order").click', script.read())
+
+
+class CartDeduplicationMigrationTests(TransactionTestCase):
+    before = [("app", "0007_hot_filter_indexes")]
+    after = [("app", "0008_cart_unique_user_product")]
+
+    def tearDown(self):
+        MigrationExecutor(connection).migrate(MigrationExecutor(connection).loader.graph.leaf_nodes())
+
+    def test_duplicate_rows_are_merged(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.before)
+        apps = executor.loader.project_state(self.before).apps
+        user = apps.get_model("auth", "User").objects.create(username="alice")
+        other = apps.get_model("auth", "User").objects.create(username="bob")
+        Product = apps.get_model("app", "Product")
+        phone, laptop = [
+            Product.objects.create(
+                title=title, selling_price=1, discounted_price=1, description="", brand="B", category="M",
+                product_image="productimg/1.jpg",
+            )
+            for title in ("Phone", "Laptop")
+        ]
+        OldCart = apps.get_model("app", "Cart")
+        for owner, product, quantity in [(user, phone, 1), (user, phone, 2), (user, phone, 1), (user, laptop, 1), (other, phone, 5)]:
+            OldCart.objects.create(user=owner, product=product, quantity=quantity)
+
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.after)
+        self.assertEqual(
+            sorted(Cart.objects.values_list("user__username", "product__title", "quantity")),
+            [("alice", "Laptop", 1), ("alice", "Phone", 4), ("bob", "Phone", 5)],
+        )
+
+
+class OrderSnapshotTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("alice", password="pw")
+        self.customer = make_customer(self.user)
+        self.phone = make_product("Galaxy", 100.0)
+        self.phone.image_variants = {
+            "source": self.phone.product_image.name,
+            "variants": {"jpg": {"100": "derived/1-ab-100w.jpg", "300": "derived/1-ab-300w.jpg"}},
+        }
+        self.phone.save()
+        self.client.force_login(self.user)
+
+    def test_orders_keep_the_price_title_and_thumbnail_of_checkout_time(self):
+        add_cart_item(self.user, self.phone, 2)
+        (order,) = place_order(self.user, self.customer)
+        self.assertEqual((order.unit_price, order.title, order.image), (100.0, "Galaxy", "derived/1-ab-300w.jpg"))
+
+        Product.objects.filter(pk=self.phone.pk).update(discounted_price=150.0, title="Galaxy S2")
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get("/orders/json/")
+        self.assertFalse([q for q in ctx.captured_queries if "app_product" in q["sql"]])
+        (line,) = response.json()["orders"]
+        self.assertEqual((line["title"], line["total_cost"]), ("Galaxy", 200.0))
+        self.assertTrue(line["image"].endswith("derived/1-ab-300w.jpg"))
+        self.assertContains(self.client.get("/orders/"), "<b>Price:</b> 200.0")
+
+    def test_revenue_is_computed_from_order_lines_alone(self):
+        add_cart_item(self.user, self.phone, 3)
+        place_order(self.user, self.customer)
+        Product.objects.filter(pk=self.phone.pk).update(discounted_price=1.0)
+        with CaptureQueriesContext(connection) as ctx:
+            revenue = PlacedOrder.objects.with_line_total().aggregate(total=Sum("line_total"))["total"]
+        self.assertEqual(revenue, 300.0)
+        self.assertNotIn("app_product", ctx.captured_queries[0]["sql"])
+
+
+class SalesRollupTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("alice", password="pw")
+        self.customer = make_customer(self.user)
+        self.phone = make_product("Galaxy", 100.0)
+        self.shirt = make_product("Polo", 20.0, category="TW")
+
+    def rollups(self):
+        return sorted(
+            SalesRollup.objects.filter(orders__gt=0).values_list("category", "state", "status", "orders", "units", "revenue")
+        )
+
+    def checkout(self):
+        add_cart_item(self.user, self.phone, 2)
+        add_cart_item(self.user, self.shirt, 3)
+        return place_order(self.user, self.customer)
+
+    def test_rollups_follow_checkout_status_changes_and_deletes(self):
+        phone_line, shirt_line = sorted(self.checkout(), key=lambda o: o.title)
+        self.assertEqual(
+            self.rollups(),
+            [("M", "Maharashtra", "Pending", 1, 2, 200.0), ("TW", "Maharashtra", "Pending", 1, 3, 60.0)],
+        )
+        self.assertEqual(SalesRollup.objects.get(category="M").day, timezone.localdate())
+
+        phone_line.status = "Packed"
+        phone_line.save()
+        shirt_line.delete()
+        self.assertEqual(self.rollups(), [("M", "Maharashtra", "Packed", 1, 2, 200.0)])
+
+    def test_rebuild_matches_incremental_rollups(self):
+        self.checkout()
+        self.checkout()
+        PlacedOrder.objects.create(
+            user=self.user, customer=self.customer, product=self.phone, quantity=1, status="Delivered", **snapshot(self.phone, self.customer)
+        )
+        incremental = self.rollups()
+        SalesRollup.objects.update(orders=0, revenue=0)
+        call_command("rebuild_sales_rollups", chunk_size=2, stdout=io.StringIO(), stderr=io.StringIO())
+        self.assertEqual(self.rollups(), incremental)
+        self.assertEqual(rebuild_rollups(chunk_size=1), 3)
+
+    def test_catalog_and_address_edits_do_not_move_placed_orders(self):
+        phone_line, _ = sorted(self.checkout(), key=lambda o: o.title)
+        Product.objects.filter(pk=self.phone.pk).update(category="L")
+        Customer.objects.filter(pk=self.customer.pk).update(state="Goa")
+        phone_line.status = "Packed"
+        phone_line.save()
+        expected = [("M", "Maharashtra", "Packed", 1, 2, 200.0), ("TW", "Maharashtra", "Pending", 1, 3, 60.0)]
+        self.assertEqual(self.rollups(), expected)
+        rebuild_rollups()
+        self.assertEqual(self.rollups(), expected)
+
+    def test_dashboard_reads_only_rollups(self):
+        self.checkout()
+        admin_user = User.objects.create_superuser("admin", "admin@example.com", "pw")
+        self.client.force_login(admin_user)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get("/admin/app/salesrollup/", {"days": 7})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([q for q in ctx.captured_queries if "app_placedorder" in q["sql"]])
+        self.assertContains(response, "<strong>2</strong> order lines")
+        self.assertContains(response, "<td>Top Wear</td><td>1</td><td>3</td><td>₹60.00</td>", html=False)
+        self.assertContains(response, "<strong>Last 7 days</strong>")
+
+    def test_dashboard_leaves_cancelled_lines_out_of_revenue(self):
+        phone_line, _ = sorted(self.checkout(), key=lambda o: o.title)
+        phone_line.status = "Cancel"
+        phone_line.save()
+        self.client.force_login(User.objects.create_superuser("admin", "admin@example.com", "pw"))
+        response = self.client.get("/admin/app/salesrollup/")
+        self.assertContains(response, "<strong>1</strong> order lines, <strong>3</strong> units, revenue <strong>₹60.00</strong>")
+        self.assertContains(response, "<strong>1</strong> cancelled order lines worth ₹200.00")
+        self.assertEqual([row["name"] for row in response.context["by_category"]], ["Top Wear"])
+        self.assertEqual([row["name"] for row in response.context["by_state"]], ["Maharashtra"])
+        self.assertEqual(response.context["by_state"][0]["revenue"], 60.0)
+        self.assertEqual(sum(row["revenue"] for row in response.context["by_day"]), 60.0)
+        self.assertContains(response, "<td>Cancel</td><td>1</td><td>2</td><td>₹200.00</td>", html=False)
+
+
+class AdminChangelistTests(TestCase):
+    """Changelist pages must make the same number of queries however many rows they list."""
+
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_superuser("admin", "admin@example.com", "pw")
+        self.client.force_login(self.admin)
+
+    def fill(self, rows):
+        start = PlacedOrder.objects.count()
+        for i in range(start, start + rows):
+            user = User.objects.create_user(f"shopper{i}")
+            customer = make_customer(user)
+            product = make_product(f"P{i}", 10.0 + i)
+            Cart.objects.create(user=user, product=product)
+            PlacedOrder.objects.create(user=user, customer=customer, product=product, **snapshot(product, customer))
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return [q["sql"] for q in ctx.captured_queries]
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        urls = [
+            "/admin/app/product/",
+            "/admin/app/product/?category__exact=M",
+            "/admin/app/cart/",
+            "/admin/app/placedorder/",
+            "/admin/app/placedorder/?status__exact=Pending",
+            "/admin/app/customer/",
+        ]
+        self.fill(1)
+        small = {url: len(self.count_queries(url)) for url in urls}
+        self.fill(29)
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(len(self.count_queries(url)), small[url])
+                self.assertLessEqual(small[url], 8)
+
+    def test_unfiltered_changelists_of_large_tables_are_not_counted(self):
+        self.fill(3)
+        with mock.patch("app.pagination.ESTIMATED_COUNT_THRESHOLD", 1):
+            queries = self.count_queries("/admin/app/placedorder/")
+            self.assertFalse([q for q in queries if "COUNT(" in q.upper() and "app_placedorder" in q])
+            queries = self.count_queries("/admin/app/placedorder/?status__exact=Pending")
+            self.assertEqual(len([q for q in queries if "COUNT(" in q.upper()]), 1)
+
+    def test_estimated_count_paginator(self):
+        self.fill(3)
+        PlacedOrder.objects.filter(pk=PlacedOrder.objects.order_by("pk").first().pk).delete()
+        self.assertEqual(EstimatedCountPaginator(PlacedOrder.objects.order_by("pk"), 10).count, 2)
+        with mock.patch("app.pagination.ESTIMATED_COUNT_THRESHOLD", 1):
+            # The highest id stands in for the count on SQLite.
+            self.assertEqual(EstimatedCountPaginator(PlacedOrder.objects.order_by("pk"), 10).count, PlacedOrder.objects.latest("pk").pk)
+            self.assertEqual(EstimatedCountPaginator(PlacedOrder.objects.filter(status="Pending").order_by("pk"), 10).count, 2)
+
+    def test_foreign_keys_use_autocomplete_widgets(self):
+        self.fill(3)
+        for url in ("/admin/app/cart/add/", "/admin/app/placedorder/add/", "/admin/app/customer/add/"):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertContains(response, "admin-autocomplete")
+                self.assertNotContains(response, ">shopper1</option>")
+                self.assertNotContains(response, ">P1</option>")
+
+
+class OrderStatusTransitionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("alice", password="pw")
+        self.customer = make_customer(self.user)
+        self.product = make_product("Galaxy", 100.0)
+        self.orders = [
+            PlacedOrder.objects.create(
+                user=self.user, customer=self.customer, product=self.product, quantity=2, **snapshot(self.product, self.customer)
+            ).pk
+            for _ in range(5)
+        ]
+
+    def statuses(self):
+        return list(PlacedOrder.objects.order_by("pk").values_list("status", flat=True))
+
+    def test_only_allowed_transitions_are_applied_in_chunks(self):
+        transition_orders(self.orders[:2], "Accepted")
+        with CaptureQueriesContext(connection) as ctx:
+            result = transition_orders(self.orders + [0], "Packed", user=self.user, chunk_size=2)
+        self.assertEqual(result["changed"], 2)
+        self.assertEqual(result["skipped"], {"Pending": 3})
+        self.assertEqual(result["missing"], 1)
+        self.assertEqual(self.statuses(), ["Packed", "Packed", "Pending", "Pending", "Pending"])
+        # One UPDATE for the chunk that moved, none for the others.
+        self.assertEqual(len([q for q in ctx.captured_queries if q["sql"].startswith("UPDATE")]), 1)
+
+        history = OrderStatusChange.objects.filter(order_id=self.orders[0]).order_by("pk")
+        self.assertEqual(
+            list(history.values_list("from_status", "to_status", "changed_by")),
+            [("Pending", "Accepted", None), ("Accepted", "Packed", self.user.pk)],
+        )
+        with self.assertRaises(InvalidTransition):
+            transition_orders(self.orders, "Lost")
+
+    def test_rollups_follow_transitions(self):
+        transition_orders(self.orders[:3], "Cancel")
+        self.assertEqual(
+            sorted(SalesRollup.objects.filter(orders__gt=0).values_list("status", "orders", "units", "revenue")),
+            [("Cancel", 3, 6, 600.0), ("Pending", 2, 4, 400.0)],
+        )
+        self.assertEqual(transition_orders(self.orders[:3], "Accepted")["skipped"], {"Cancel": 3})
+
+    def test_transitions_move_orders_between_their_checkout_rollups(self):
+        Product.objects.filter(pk=self.product.pk).update(category="L")
+        Customer.objects.filter(pk=self.customer.pk).update(state="Goa")
+        transition_orders(self.orders[:3], "Accepted")
+        self.assertEqual(
+            sorted(SalesRollup.objects.filter(orders__gt=0).values_list("category", "state", "status", "orders")),
+            [("M", "Maharashtra", "Accepted", 3), ("M", "Maharashtra", "Pending", 2)],
+        )
+
+    def test_admin_action(self):
+        admin_user = User.objects.create_superuser("admin", "admin@example.com", "pw")
+        self.client.force_login(admin_user)
+        response = self.client.post(
+            "/admin/app/placedorder/",
+            {"action": "mark_packed", "_selected_action": self.orders[:2]},
+            follow=True,
+        )
+        self.assertContains(response, "Moved 0 orders to Packed.")
+        self.assertContains(response, "Left 2 Pending orders unchanged")
+        self.client.post("/admin/app/placedorder/", {"action": "mark_accepted", "_selected_action": self.orders[:2]})
+        self.assertEqual(self.statuses()[:3], ["Accepted", "Accepted", "Pending"])
+        self.assertEqual(OrderStatusChange.objects.filter(changed_by=admin_user).count(), 2)
+
+        # The history is listed newest first from the changed_at index.
+        transition_orders(self.orders, "Cancel")
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertContains(self.client.get("/admin/app/orderstatuschange/"), "Cancel")
+        self.assertNotIn("app_orderstatuschange", [table for table, _ in full_table_scans(ctx.captured_queries)])
+
+    def test_change_form_cannot_edit_status(self):
+        self.client.force_login(User.objects.create_superuser("admin", "admin@example.com", "pw"))
+        response = self.client.get(f"/admin/app/placedorder/{self.orders[0]}/change/")
+        self.assertNotIn("status", response.context["adminform"].form.fields)
+
+    def test_command_reads_ids_from_file(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False) as f:
+            f.write("# shift 1\n" + "\n".join(map(str, self.orders[1:4])) + "\nabc\n")
+        self.addCleanup(os.remove, f.name)
+        out, err = io.StringIO(), io.StringIO()
+        call_command("transition_orders", "--to", "Accepted", "--file", f.name, "--user", "alice", stdout=out, stderr=err)
+        self.assertIn("Moved 3 orders to Accepted.", out.getvalue())
+        self.assertIn("line 5: not an order id", err.getvalue())
+        self.assertEqual(self.statuses(), ["Pending", "Accepted", "Accepted", "Accepted", "Pending"])
+        with self.assertRaises(CommandError):
+            call_command("transition_orders", "--to", "Lost", "--file", f.name, stdout=out, stderr=err)
+
+
+class OrderSnapshotMigrationTests(TransactionTestCase):
+    before = [("app", "0009_product_sku")]
+    after = [("app", "0011_placedorder_unit_price_not_null")]
+
+    def tearDown(self):
+        MigrationExecutor(connection).migrate(MigrationExecutor(connection).loader.graph.leaf_nodes())
+
+    def test_existing_orders_are_backfilled_in_chunks(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.before)
+        apps = executor.loader.project_state(self.before).apps
+        user = apps.get_model("auth", "User").objects.create(username="alice")
+        customer = apps.get_model("app", "Customer").objects.create(
+            user=user, name="Alice", locality="MG Road", city="Pune", zipcode=411001, state="Maharashtra"
+        )
+        Product = apps.get_model("app", "Product")
+        products = [
+            Product.objects.create(
+                title=f"P{i}", selling_price=20, discounted_price=10 + i, description="", brand="B", category="M",
+                product_image=f"productimg/{i}.jpg",
+            )
+            for i in range(5)
+        ]
+        OldOrder = apps.get_model("app", "PlacedOrder")
+        for product in products + products[:2]:
+            OldOrder.objects.create(user=user, customer=customer, product=product, quantity=2)
+
+        backfill = importlib.import_module("app.migrations.0010_placedorder_snapshot")
+        with mock.patch.object(backfill, "CHUNK_SIZE", 2):
+            MigrationExecutor(connection).migrate(self.after)
+        self.assertEqual(
+            sorted(PlacedOrder.objects.values_list("title", "unit_price", "image")),
+            sorted([(f"P{i}", 10.0 + i, f"productimg/{i}.jpg") for i in list(range(5)) + [0, 1]]),
+        )
+
+
+class OrderCategoryStateMigrationTests(TransactionTestCase):
+    before = [("app", "0015_job")]
+    after = [("app", "0016_placedorder_category_state")]
+
+    def tearDown(self):
+        MigrationExecutor(connection).migrate(MigrationExecutor(connection).loader.graph.leaf_nodes())
+
+    def test_existing_orders_are_backfilled_in_chunks(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.before)
+        apps = executor.loader.project_state(self.before).apps
+        User = apps.get_model("auth", "User")
+        Customer = apps.get_model("app", "Customer")
+        Product = apps.get_model("app", "Product")
+        OldOrder = apps.get_model("app", "PlacedOrder")
+        for i, (category, state) in enumerate([("M", "Goa"), ("L", "Kerala"), ("TV", "Goa")]):
+            user = User.objects.create(username=f"user{i}")
+            customer = Customer.objects.create(
+                user=user, name="Alice", locality="MG Road", city="Pune", zipcode=411001, state=state
+            )
+            product = Product.objects.create(
+                title=f"P{i}", selling_price=20, discounted_price=10, description="", brand="B", category=category
+            )
+            for _ in range(2):
+                OldOrder.objects.create(
+                    user=user, customer=customer, product=product, unit_price=10, title=f"P{i}", image=""
+                )
+
+        backfill = importlib.import_module("app.migrations.0016_placedorder_category_state")
+        with mock.patch.object(backfill, "CHUNK_SIZE", 4):
+            MigrationExecutor(connection).migrate(self.after)
+        self.assertEqual(
+            sorted(PlacedOrder.objects.values_list("title", "category", "state")),
+            [("P0", "M", "Goa")] * 2 + [("P1", "L", "Kerala")] * 2 + [("P2", "TV", "Goa")] * 2,
+        )
+
+
+class ProductSkuMigrationTests(TransactionTestCase):
+    before = [("app", "0017_orderstatuschange_changed_at_index")]
+    after = [("app", "0018_product_sku_not_null")]
+
+    def tearDown(self):
+        MigrationExecutor(connection).migrate(MigrationExecutor(connection).loader.graph.leaf_nodes())
+
+    def test_products_without_a_sku_get_one(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.before)
+        Product = executor.loader.project_state(self.before).apps.get_model("app", "Product")
+        fields = {"selling_price": 20, "discounted_price": 10, "description": "", "brand": "B", "category": "M"}
+        missing = Product.objects.create(title="No SKU", **fields)
+        Product.objects.create(title="Fed", sku="FEED-1", **fields)
+        MigrationExecutor(connection).migrate(self.after)
+        self.assertEqual(
+            dict(Product.objects.values_list("title", "sku")), {"No SKU": f"P{missing.id:08d}", "Fed": "FEED-1"}
+        )
+
+
+@override_settings(METRICS_TOKEN="s3cret")
+class InstrumentationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        reset_metrics()
+        self.phone = make_product("Galaxy", 100.0)
+
+    def test_requests_are_recorded_per_view_and_exposed(self):
+        self.client.get("/mobile/")
+        self.client.get("/mobile/")
+        self.client.get(f"/product-detail/{self.phone.id}")
+        cumulative, _ = QUERY_COUNT.snapshot()["mobile"]
+        self.assertEqual(cumulative[-1], 2)
+
+        response = self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer s3cret")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain; version=0.0.4"))
+        body = response.content.decode()
+        self.assertIn("# TYPE shopper_view_latency_seconds histogram", body)
+        self.assertIn('shopper_view_latency_seconds_count{view="mobile"} 2', body)
+        self.assertIn('shopper_view_render_seconds_bucket{view="product-detail",le="+Inf"} 1', body)
+        self.assertRegex(body, r'shopper_view_queries_sum\{view="mobile"\} [1-9]')
+        self.assertIn('shopper_view_db_seconds_count{view="mobile"} 2', body)
+
+    def test_metrics_need_the_token_or_staff(self):
+        # Behind a reverse proxy every request comes from 127.0.0.1.
+        self.assertEqual(self.client.get("/metrics", REMOTE_ADDR="127.0.0.1").status_code, 403)
+        self.assertEqual(self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer wrong").status_code, 403)
+        with override_settings(METRICS_TOKEN=""):
+            self.assertEqual(self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer ").status_code, 403)
+        self.assertEqual(self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer s3cret").status_code, 200)
+        staff = User.objects.create_user("admin", password="pw", is_staff=True)
+        self.client.force_login(staff)
+        self.assertEqual(self.client.get("/metrics", REMOTE_ADDR="203.0.113.9").status_code, 200)
+
+    @override_settings(VIEW_METRICS_SLOW_REQUEST_SECONDS=0)
+    def test_slow_requests_are_logged_with_their_sql(self):
+        with self.assertLogs("app.instrumentation", "WARNING") as logs:
+            self.client.get("/mobile/")
+        self.assertIn("Slow request GET /mobile/ (mobile)", logs.output[0])
+        self.assertIn('FROM "app_product"', logs.output[0])
+
+    @override_settings(VIEW_QUERY_BUDGETS={"mobile": 0})
+    def test_views_over_their_query_budget_fail(self):
+        with self.assertRaisesMessage(QueryBudgetExceeded, "mobile ran"):
+            self.client.get("/mobile/")
+        cache.clear()
+        with override_settings(VIEW_QUERY_BUDGET_ENFORCE=False), self.assertLogs("app.instrumentation", "WARNING"):
+            self.assertEqual(Client().get("/mobile/").status_code, 200)
+
+    @override_settings(VIEW_METRICS=False)
+    def test_disabled_metrics_record_nothing(self):
+        self.client.get("/mobile/")
+        self.assertEqual(QUERY_COUNT.snapshot(), {})
+        self.assertEqual(self.client.get("/metrics").status_code, 404)
+
+
+class StorefrontBenchmarkTests(TestCase):
+    def test_every_scenario_runs_cleanly_against_the_seeded_storefront(self):
+        data = seed_storefront(products=60, users=5, cart_lines=2, orders=3, seed=7)
+        self.assertEqual(Cart.objects.count(), 10)
+        self.assertEqual(PlacedOrder.objects.count(), 15)
+        results = run_storefront(data, SCENARIOS, total=3, warmup=1, seed=7)
+        self.assertEqual(list(results), list(SCENARIOS))
+        for name, result in results.items():
+            with self.subTest(scenario=name):
+                self.assertEqual(result["errors"], 0)
+                self.assertEqual(result["samples"], 3)
+                self.assertLessEqual(result["p50_ms"], result["p99_ms"])
+
+    def test_compare_reports_changes_in_percent(self):
+        baseline = {"home": {"throughput_rps": 100.0, "p95_ms": 10.0}}
+        current = {"home": {"throughput_rps": 80.0, "p95_ms": 12.5}, "search": {"throughput_rps": 5.0, "p95_ms": 1.0}}
+        self.assertEqual(compare(current, baseline), {"home": {"throughput_change_pct": -20.0, "p95_change_pct": 25.0}})
+
+
+class CatalogFeedTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.feed_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        self.addCleanup(shutil.rmtree, self.feed_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        with open(f"{self.feed_root}/galaxy.jpg", "wb") as f:
+            f.write(make_image().read())
+
+    def row(self, sku, **values):
+        return {
+            "sku": sku, "title": f"Phone {sku}", "selling_price": 200, "discounted_price": 150,
+            "description": "A phone", "brand": "Samsung", "category": "M", "image": "galaxy.jpg", **values,
+        }
+
+    def write_feed(self, rows, fmt="csv"):
+        path = f"{self.feed_root}/feed.{fmt}"
+        with open(path, "w", newline="") as f:
+            if fmt == "csv":
+                writer = csv.DictWriter(f, FEED_FIELDS)
+                writer.writeheader()
+                writer.writerows(rows)
+            else:
+                f.writelines(json.dumps(row) + "\n" for row in rows)
+        return path
+
+    def import_feed(self, path, **options):
+        stdout, stderr = io.StringIO(), io.StringIO()
+        call_command("import_products", path, image_root=self.feed_root, stdout=stdout, stderr=stderr, **options)
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_import_creates_then_updates_only_changed_products(self):
+        rows = [self.row(f"SKU-{i}") for i in range(5)]
+        out, _ = self.import_feed(self.write_feed(rows), chunk_size=2)
+        self.assertIn("5 created, 0 updated, 0 unchanged, 0 failed", out)
+        product = Product.objects.get(sku="SKU-3")
+        self.assertEqual(product.discounted_price, 150.0)
+        # The image is copied once, under a name derived from its content.
+        self.assertRegex(product.product_image.name, r"^productimg/[0-9a-f]{20}\.jpg$")
+        self.assertEqual(Product.objects.values("product_image").distinct().count(), 1)
+        self.assertEqual([p.id for p in SqliteFTSSearchBackend().search("Phone SKU-3")][:1], [product.id])
+
+        rows[3]["discounted_price"] = 99
+        with CaptureQueriesContext(connection) as ctx:
+            out, _ = self.import_feed(self.write_feed(rows, "jsonl"))
+        self.assertIn("0 created, 1 updated, 4 unchanged, 0 failed", out)
+        update = [q["sql"] for q in ctx.captured_queries if q["sql"].startswith('UPDATE "app_product"')]
+        self.assertEqual(len(update), 1)
+        self.assertIn('"discounted_price"', update[0])
+        self.assertNotIn('"title"', update[0])
+        self.assertEqual(Product.objects.get(sku="SKU-3").discounted_price, 99.0)
+        self.assertEqual(Product.objects.count(), 5)
+
+    def test_import_refreshes_cached_listings(self):
+        cache.clear()
+        self.import_feed(self.write_feed([self.row("SKU-1")]))
+        self.assertContains(self.client.get("/mobile/"), "Phone SKU-1")
+        version = catalog_version()
+        self.import_feed(self.write_feed([self.row("SKU-1"), self.row("SKU-2")]))
+        self.assertGreater(catalog_version(), version)
+        self.assertContains(self.client.get("/mobile/"), "Phone SKU-2")
+
+    def test_invalid_rows_are_reported_and_skipped(self):
+        rows = [
+            self.row("OK-1"),
+            self.row("BAD-1", category="XX"),
+            self.row("BAD-2", selling_price="free"),
+            self.row("BAD-3", image="missing.jpg"),
+            self.row("BAD-4", image="../../etc/passwd"),
+            self.row("", title="No SKU"),
+        ]
+        out, err = self.import_feed(self.write_feed(rows))
+        self.assertIn("1 created, 0 updated, 0 unchanged, 5 failed", out)
+        self.assertIn("line 3: unknown category 'XX'", err)
+        self.assertIn("line 4: selling_price must be a number", err)
+        self.assertIn("line 5: image 'missing.jpg' does not exist", err)
+        self.assertIn("line 6: image '../../etc/passwd' is outside", err)
+        self.assertIn("line 7: sku is required", err)
+        self.assertEqual(list(Product.objects.values_list("sku", flat=True)), ["OK-1"])
+
+    def test_export_round_trips_through_import(self):
+        self.import_feed(self.write_feed([self.row(f"SKU-{i}", title=f"Phone, \"{i}\"") for i in range(3)]))
+        # Products added outside feeds, e.g. in the admin, get a SKU of their own.
+        added = Product.objects.create(
+            title="Added by hand", selling_price=20, discounted_price=10, description="", brand="B", category="M",
+            product_image=Product.objects.first().product_image.name,
+        )
+        self.assertRegex(added.sku, r"^P[0-9A-F]{12}$")
+        for fmt in ("csv", "jsonl"):
+            with self.subTest(format=fmt):
+                path = f"{self.feed_root}/export.{fmt}"
+                call_command("export_products", output=path, stderr=io.StringIO())
+                with open(path, newline="") as f:
+                    self.assertEqual(len(f.readlines()), 5 if fmt == "csv" else 4)
+                stdout = io.StringIO()
+                call_command("import_products", path, stdout=stdout, stderr=io.StringIO())
+                self.assertIn("0 created, 0 updated, 4 unchanged, 0 failed", stdout.getvalue())
+
+
+class JobQueueTests(TestCase):
+    def setUp(self):
+        self.calls = []
+        job("tests.flaky")(self.flaky)
+        self.addCleanup(HANDLERS.pop, "tests.flaky")
+
+    def flaky(self, fail_times):
+        self.calls.append(fail_times)
+        if len(self.calls) <= fail_times:
+            raise RuntimeError("boom")
+
+    def test_failed_jobs_are_retried_with_backoff(self):
+        queued = enqueue("tests.flaky", fail_times=1)
+        before = timezone.now()
+        with self.assertLogs("app.jobs", "ERROR"):
+            self.assertEqual(run_due_jobs(), {"retried": 1})
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts), ("queued", 1))
+        self.assertIn("RuntimeError: boom", queued.last_error)
+        self.assertGreaterEqual(queued.run_at, before + timedelta(seconds=10))
+        # Not due yet.
+        self.assertEqual(run_due_jobs(), {})
+
+        Job.objects.update(run_at=timezone.now())
+        self.assertEqual(run_due_jobs(), {"done": 1})
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts), ("done", 2))
+        self.assertEqual(self.calls, [1, 1])
+
+    @override_settings(JOBS_MAX_ATTEMPTS=2, JOBS_RETRY_DELAY=0)
+    def test_jobs_fail_after_their_last_attempt(self):
+        queued = enqueue("tests.flaky", fail_times=5)
+        with self.assertLogs("app.jobs", "ERROR"):
+            self.assertEqual(run_due_jobs(), {"retried": 1, "failed": 1})
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts), ("failed", 2))
+        self.assertIsNotNone(queued.finished_at)
+        with self.assertRaises(UnknownJob):
+            enqueue("tests.missing")
+
+    def test_expired_leases_are_taken_over(self):
+        enqueue("tests.flaky", fail_times=0)
+        [first] = claim(10)
+        self.assertGreater(first.locked_until, timezone.now() + timedelta(seconds=250))
+        self.assertEqual(claim(10), [])
+
+        Job.objects.update(locked_until=timezone.now() - timedelta(seconds=1))
+        [second] = claim(10)
+        self.assertEqual(second.attempts, 2)
+        # The run that lost its lease cannot record an outcome over the new one.
+        run_job(first)
+        self.assertEqual(Job.objects.get().status, "running")
+        self.assertEqual(run_job(second), "done")
+        self.assertEqual(Job.objects.get().status, "done")
+
+    @override_settings(JOBS_MAX_ATTEMPTS=1)
+    def test_expired_lease_on_the_last_attempt_fails_the_job(self):
+        enqueue("tests.flaky", fail_times=0)
+        claim(10)
+        Job.objects.update(locked_until=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(claim(10), [])
+        self.assertEqual(Job.objects.get().status, "failed")
+
+    @override_settings(EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend")
+    def test_password_reset_email_is_sent_by_the_worker(self):
+        User.objects.create_user("alice", "alice@example.com", "pw")
+        response = self.client.post("/password-reset/", {"email": "alice@example.com"})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(mail.outbox, [])
+        queued = Job.objects.get()
+        self.assertEqual(queued.name, "password_reset_mail")
+        self.assertNotIn("password-reset-confirm", str(queued.payload))
+
+        self.assertEqual(run_due_jobs(), {"done": 1})
+        [message] = mail.outbox
+        self.assertEqual(message.to, ["alice@example.com"])
+        link = re.search(r"/password-reset-confirm/[^/]+/[^/]+/", message.body).group()
+        response = self.client.get(link, follow=True)
+        self.assertContains(response, "new_password1")
+
+    def test_job_admin_is_read_only_but_can_retry(self):
+        admin_user = User.objects.create_superuser("admin", "admin@example.com", "pw")
+        self.client.force_login(admin_user)
+        failed = enqueue("tests.flaky", fail_times=0, secret="tok-3f9a")
+        Job.objects.filter(pk=failed.pk).update(status="failed")
+
+        response = self.client.get(f"/admin/app/job/{failed.pk}/change/")
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, "tok-3f9a")
+        self.assertNotContains(response, 'name="_save"')
+        self.client.post(f"/admin/app/job/{failed.pk}/change/", {"name": "other"})
+        self.assertEqual(Job.objects.get(pk=failed.pk).name, "tests.flaky")
+
+        self.client.post("/admin/app/job/", {"action": "retry", "_selected_action": [failed.pk]})
+        self.assertEqual(Job.objects.get(pk=failed.pk).status, "queued")
+
+    @override_settings(VIEW_METRICS=True, METRICS_TOKEN="s3cret")
+    def test_queue_stats_are_exposed_as_metrics(self):
+        enqueue("tests.flaky", fail_times=0)
+        enqueue("tests.flaky", fail_times=0, delay=60)
+        Job.objects.filter(pk=enqueue("tests.flaky", fail_times=0).pk).update(status="done", finished_at=timezone.now())
+        stats = queue_stats()
+        self.assertEqual(stats["jobs"], {"queued": 2, "running": 0, "done": 1, "failed": 0})
+        self.assertEqual(stats["finished_last_minute"], {"done": 1, "failed": 0})
+        body = self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer s3cret").content.decode()
+        self.assertIn('shopper_jobs{status="queued"} 2', body)
+        self.assertIn('shopper_jobs_finished_last_minute{status="done"} 1', body)
+
+
+class JobWorkerTests(TransactionTestCase):
+    def test_worker_runs_jobs_on_a_thread_pool(self):
+        calls = []
+        job("tests.record")(lambda n: calls.append(n))
+        self.addCleanup(HANDLERS.pop, "tests.record")
+        for n in range(10):
+            enqueue("tests.record", n=n)
+        out, err = io.StringIO(), io.StringIO()
+        call_command("run_jobs", "--burst", "--workers", "3", stdout=out, stderr=err)
+        self.assertEqual(sorted(calls), list(range(10)))
+        self.assertIn("Ran 10 jobs", out.getvalue())
+        self.assertIn("10 done, 0 retried, 0 failed", err.getvalue())
+        self.assertFalse(Job.objects.exclude(status="done").exists())
+
+    def test_worker_survives_jobs_whose_outcome_cannot_be_written(self):
+        calls = []
+        job("tests.record")(lambda n: calls.append(n))
+        self.addCleanup(HANDLERS.pop, "tests.record")
+        locked = enqueue("tests.record", n=0)
+        for n in range(1, 4):
+            enqueue("tests.record", n=n)
+
+        def locked_database(job):
+            if job.pk == locked.pk:
+                raise OperationalError("database is locked")
+            return run_job(job)
+
+        out, err = io.StringIO(), io.StringIO()
+        with mock.patch("app.jobs.run_job", locked_database), self.assertLogs("app.jobs", "ERROR"):
+            call_command("run_jobs", "--burst", "--workers", "2", stdout=out, stderr=err)
+        self.assertEqual(sorted(calls), [1, 2, 3])
+        self.assertIn("3 done, 1 retried, 0 failed", err.getvalue())
+        # Left leased, so another run takes it over once the lease runs out.
+        self.assertEqual(Job.objects.get(pk=locked.pk).status, "running")
+
+    def test_derivative_jobs_invalidate_cached_pages(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        with override_settings(MEDIA_ROOT=media_root):
+            product = make_product()
+            product.product_image = make_image()
+            product.save()
+            version = catalog_version()
+            call_command("run_jobs", "--burst", "--workers", "2", stdout=io.StringIO(), stderr=io.StringIO())
+        self.assertTrue(Product.objects.get(pk=product.pk).image_variants)
+        self.assertGreater(catalog_version(), version)
@@ -1,8 +1,8 @@
 from django.urls import path
 from app import views
-from django.conf import settings
-from django.conf.urls.static import static
 from django.contrib.auth import views as auth_views
+from .assets import asset_urlpatterns
+from .instrumentation import metrics
 from .forms import *
 
 urlpatterns = [
@@ -13,33 +13,39 @@ urlpatterns = [
         name="product-detail",
     ),
     path("search/", views.search, name="search"),
+    path("metrics", metrics, name="metrics"),
+    path("suggest/", views.suggest, name="suggest"),
 
-    path("mobile/", views.mobile, name="mobile"),
-    path("mobile/<slug:data>", views.mobile, name="mobile_flt"),
+    path("catalog/<slug:slug>/", views.catalog, name="catalog"),
 
-    path("laptop/", views.laptop, name="laptop"),
-    path("laptop/<slug:data>", views.laptop, name="laptop_flt"),
+    path("mobile/", views.catalog, {"slug": "mobile"}, name="mobile"),
+    path("mobile/<slug:data>", views.catalog, {"slug": "mobile"}, name="mobile_flt"),
 
-    path("tv/", views.tv, name="tv"),
-    path("tv/<slug:data>", views.tv, name="tv_flt"),
+    path("laptop/", views.catalog, {"slug": "laptop"}, name="laptop"),
+    path("laptop/<slug:data>", views.catalog, {"slug": "laptop"}, name="laptop_flt"),
 
-    path("clothing/", views.clothing, name="clothing"),
-    path("clothing/<slug:data>", views.clothing, name="clothing_flt"),
+    path("tv/", views.catalog, {"slug": "tv"}, name="tv"),
+    path("tv/<slug:data>", views.catalog, {"slug": "tv"}, name="tv_flt"),
 
-    path("shoes/", views.shoe, name="shoes"),
-    path("shoes/<slug:data>", views.shoe, name="shoes_flt"),
+    path("clothing/", views.catalog, {"slug": "clothing"}, name="clothing"),
+    path("clothing/<slug:data>", views.catalog, {"slug": "clothing"}, name="clothing_flt"),
 
-    path("watch/", views.watches, name="watch"),
-    path("watch/<slug:data>", views.watches, name="watch_flt"),
+    path("shoes/", views.catalog, {"slug": "shoes"}, name="shoes"),
+    path("shoes/<slug:data>", views.catalog, {"slug": "shoes"}, name="shoes_flt"),
+
+    path("watch/", views.catalog, {"slug": "watch"}, name="watch"),
+    path("watch/<slug:data>", views.catalog, {"slug": "watch"}, name="watch_flt"),
 
     path("add-to-cart/", views.add_to_cart, name="add-to-cart"),
     path("cart/", views.show_cart, name="showcart"), #type: ignore
     path("pluscart/", views.plus_cart), #type: ignore
     path("minuscart/", views.minus_cart), #type: ignore
     path("removecart/", views.remove_cart), #type: ignore
+    path("cart/batch/", views.cart_batch, name="cart-batch"),
     path("profile/", views.ProfileView.as_view(), name="profile"),
     path("address/", views.address, name="address"),
     path("orders/", views.orders, name="orders"),
+    path("orders/json/", views.orders_json, name="orders-json"),
     path("checkout/", views.checkout, name="checkout"),
     path("paymentdone/", views.payment_done, name="paymentdone"),
     path("buynow/", views.buy_now, name="buynow"),
@@ -101,4 +107,4 @@ urlpatterns = [
         name="login",
     ),
     path("logout/", auth_views.LogoutView.as_view(next_page="login"), name="logout"),
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+] + asset_urlpatterns()
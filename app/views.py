@@ -1,16 +1,30 @@
-from django.shortcuts import render, redirect
+import json
+
+from django.shortcuts import get_object_or_404, render, redirect
 from django.views import View
+from django.views.decorators.csrf import ensure_csrf_cookie
+from django.views.decorators.http import require_POST
 from .models import *
 from .forms import *
 from django.contrib import messages
+from django.db import transaction
 from django.db.models import Q
-from django.http import JsonResponse
+from django.http import HttpResponseBadRequest, JsonResponse
+from django.urls import reverse
 from django.contrib.auth.decorators import login_required
 from django.utils.decorators import method_decorator
+from .cart import CartOperationError, add_cart_item, apply_cart_operations, cart_totals, get_cart_summary, refresh_cart_summary
+from .catalog import FILTER_PARAMS, facet_options, filter_products, get_facets, get_listing, parse_filters
+from .orders import CheckoutConflict, place_order
+from .pagecache import CART_BADGE_PLACEHOLDER, cache_page_shell
+from .pagination import keyset_page
+from .rails import get_rails
+from .search import search_results
+from .suggest import MAX_SUGGESTIONS, get_suggestion_index
 
 
 def cart_items_count(request):
-    """Returns the total count of items in the user's cart.
+    """Returns the total count of items in the user's cart, served from the cached cart summary.
 
     Args:
         request (HttpRequest): the request object containing the GET query parameter.
@@ -20,69 +34,90 @@ def cart_items_count(request):
     """
     total_items = 0
     if request.user.is_authenticated:
-        total_items = len(Cart.objects.filter(user=request.user))
+        if getattr(request, "cart_badge_placeholder", False):
+            # The page is rendered as a cached shell; the count is filled in per request.
+            return CART_BADGE_PLACEHOLDER
+        total_items = get_cart_summary(request.user)["count"]
     return total_items
 
 
 def search(request):
     """
-    Returns a search page with the products matching the given query, or a warning message if no products match.
+    Returns a search page with the products matching the given query, or search tips if no products match.
+
+    Matching and ranking are done by the configured search backend over the title, brand,
+    category and description of every product.
 
     Args:
         request (HttpRequest): the request object containing the GET query parameter.
 
     Returns:
-        HttpResponse: the search page with the matching products and query, or a warning message if no products match.
+        HttpResponse: the search page with the matching products and query. The page shows search tips
+        itself when nothing matches, so no message is queued for a later page, and says when only the
+        first SEARCH_RESULTS_LIMIT matches are shown.
 
     Raises:
     None.
     """
     query = request.GET["query"]
     if len(query) > 78:
-        allprods = Product.objects.none()
+        allprods, truncated = [], False
     else:
-        allprodtitle = Product.objects.filter(title__icontains=query)
-        allprodcat = Product.objects.filter(category__icontains=query)
-        allprodbrand = Product.objects.filter(brand__icontains=query)
-        allprods = allprodtitle.union(allprodcat, allprodbrand)
-    if allprods.count() == 0:
-        messages.warning(request, "No search results found. Please refine your query.")
-    params = {"allprods": allprods, "query": query}
+        allprods, truncated = search_results(query)
+    params = {"allprods": allprods, "query": query, "truncated": truncated}
     return render(request, "app/search.html", params)
 
 
+def suggest(request):
+    """
+    Returns search-as-you-type suggestions for the text typed so far.
+
+    Suggestions are answered from the in-process prefix index over product titles
+    and brands, without querying the database once the index is loaded.
+
+    Args:
+        request (HttpRequest): The request object containing the "q" and optional "k" GET parameters.
+
+    Returns:
+        JsonResponse: A JSON response containing the following keys:
+            - query (str): The text the suggestions are for.
+            - suggestions (list): Up to k products, each with id, title, brand and url.
+    """
+    query = request.GET.get("q", "")
+    try:
+        k = min(max(int(request.GET.get("k", 8)), 1), MAX_SUGGESTIONS)
+    except ValueError:
+        k = 8
+    suggestions = [
+        {"id": pk, "title": title, "brand": brand, "url": reverse("product-detail", args=[pk])}
+        for pk, title, brand in get_suggestion_index().lookup(query, k)
+    ]
+    return JsonResponse({"query": query, "suggestions": suggestions})
+
+
+@method_decorator(cache_page_shell(), name="get")
 class HomeView(View):
     def get(self, request):
         """
-        Return the home page with the list of products for top wear, bottom wear, mobile and laptop.
+        Return the home page with the product rails for top wear, bottom wear, mobile and laptop.
+
+        The rails are a bounded snapshot of product cards served from the cache, see app.rails.
 
         Args:
             request (HttpRequest): The HTTP request object representing the current request.
 
         Returns:
-            HttpResponse: The HTTP response object with the rendered home.html template containing the list of products for top wear, bottom wear, mobile, and laptop, as well as the total number of items in the user's cart.
+            HttpResponse: The HTTP response object with the rendered home.html template containing the rails for top wear, bottom wear, mobile, and laptop, as well as the total number of items in the user's cart.
         """
 
-        topwear = Product.objects.filter(category="TW")
-        bottomwear = Product.objects.filter(category="BW")
-        mobile = Product.objects.filter(category="M")
-        laptop = Product.objects.filter(category="L")
-        # if request.user.is_authenticated:
-        #     total_items = len(Cart.objects.filter(user=request.user))
-
         return render(
             request,
             "app/home.html",
-            {
-                "topwear": topwear,
-                "bottomwear": bottomwear,
-                "mobile": mobile,
-                "laptop": laptop,
-                "total_items_count": cart_items_count(request),
-            },
+            {**get_rails(), "total_items_count": cart_items_count(request)},
         )
 
 
+@method_decorator(cache_page_shell(user_shell=False), name="get")
 class ProductDetailView(View):
     def get(self, request, pk):
         """
@@ -101,7 +136,7 @@ class ProductDetailView(View):
             cart of the authenticated user, and the total number of items in the cart.
         """
 
-        product = Product.objects.get(pk=pk)
+        product = get_object_or_404(Product, pk=pk)
         already_in_cart = False
         if request.user.is_authenticated:
             already_in_cart = Cart.objects.filter(
@@ -118,214 +153,41 @@ class ProductDetailView(View):
         )
 
 
-def mobile(request, data=None):
-    """
-    Fetches and displays mobile products based on the provided data parameter.
-
-    Args:
-        request (HttpRequest): The HTTP request object.
-        data (str, optional): The filter criteria for the mobile products. Default is None.
-
-    Returns:
-        HttpResponse: An HTTP response that renders the mobile.html template, passing in a context dictionary
-        containing the filtered mobile products and the total number of items in the user's cart.
-    """
-    if data == None:
-        mobiles = Product.objects.filter(category="M")
-    elif data == "Redmi" or data == "Samsung" or data == "Realme":
-        mobiles = Product.objects.filter(category="M").filter(brand=data)
-    elif data == "Below10000":
-        mobiles = Product.objects.filter(category="M").filter(
-            discounted_price__lt=10000
-        )
-    elif data == "10000-20000":
-        mobiles = Product.objects.filter(category="M").filter(
-            discounted_price__range=(10000, 20000)
-        )
-    elif data == "Above10000":
-        mobiles = Product.objects.filter(category="M").filter(
-            discounted_price__gt=20000
-        )
-    return render(request, "app/mobile.html", {"context": mobiles, "total_items_count": cart_items_count(request)})  # type: ignore
-
-
-def laptop(request, data=None):
+@cache_page_shell(query_params=FILTER_PARAMS)
+def catalog(request, slug, data=None):
     """
-    Returns a list of laptops based on the given filter criteria.
-
-    If no filter criteria is provided (i.e., data is None).
-
-    Args:
-        request: The HTTP request object.
-        data(str, optional): filters the laptops by the specified criteria, which can be one of the following:
-            - "Hp", "Dell", "Acer", "Asus", "Lenovo", or "Apple": filters by brand.
-            - "Below40000": filters by price, showing laptops with a discounted price below 40,000.
-            - "40000-100000": filters by price, showing laptops with a discounted price between 40,000 and 100,000.
-            - "Above100000": filters by price, showing laptops with a discounted price above 100,000.
-
-    Returns:
-        A rendered template of the "laptop.html" file, with the following context variables:
-        - "context": a list of laptops that match the specified filter criteria.
-        - "total_items_count": the total number of items in the user's cart.
-    """
-    if data == None:
-        laptops = Product.objects.filter(category="L")
-    elif (
-        data == "Hp"
-        or data == "Dell"
-        or data == "Acer"
-        or data == "Asus"
-        or data == "Lenovo"
-        or data == "Apple"
-    ):
-        laptops = Product.objects.filter(category="L").filter(brand=data)
-    elif data == "Below40000":
-        laptops = Product.objects.filter(category="L").filter(
-            discounted_price__lt=40000
-        )
-    elif data == "40000-100000":
-        laptops = Product.objects.filter(category="L").filter(
-            discounted_price__range=(40000, 100000)
-        )
-    elif data == "Above100000":
-        laptops = Product.objects.filter(category="L").filter(
-            discounted_price__gt=100000
-        )
-    return render(request, "app/laptop.html", {"context": laptops, "total_items_count": cart_items_count(request)})  # type: ignore
+    Renders a product listing with brand, price band and category facets.
 
-
-def tv(request, data=None):
-    """
-    Fetches and displays television products based on the provided data parameter.
+    Every listing defined in app.catalog.LISTINGS is served by this view, both at
+    catalog/<slug>/ with the filters in the query string and at the old
+    per-category URLs, whose path filter is translated into the same filters.
 
     Args:
-        request (HttpRequest): The HTTP request object representing the current request.
-        data (str, optional): The filter criteria for the television products. Default is None.
+        request (HttpRequest): The HTTP request object, with the optional "brand" (repeatable),
+            "price", "category" and "sort" GET parameters.
+        slug (str): The listing to render.
+        data (str, optional): The filter slug of an old per-category URL. Default is None.
 
     Returns:
-        HttpResponse: An HTTP response that renders the laptop.html template, passing in a context dictionary
-        containing the filtered television products and the total number of items in the user's cart.
-    """
-    if data == None:
-        tvs = Product.objects.filter(category="TV")
-    elif data == "LG" or data == "Sony" or data == "Samsung":
-        tvs = Product.objects.filter(category="TV").filter(brand=data)
-    elif data == "Below50000":
-        tvs = Product.objects.filter(category="TV").filter(discounted_price__lt=50000)
-    elif data == "50000-100000":
-        tvs = Product.objects.filter(category="TV").filter(
-            discounted_price__range=(50000, 100000)
-        )
-    elif data == "Above100000":
-        tvs = Product.objects.filter(category="TV").filter(discounted_price__gt=100000)
-    return render(request, "app/tv.html", {"context": tvs, "total_items_count": cart_items_count(request)})  # type: ignore
-
-
-def clothing(request, data=None):
-    """
-    View function for displaying clothing products.
-
-    Args:
-        request (HttpRequest): The HTTP request object representing the current request.
-        data(str, optional) string parameter used for filtering products. Valid values include:
-            - "TW": Filter products by top-wear category.
-            - "BW": Filter products by bottom-wear category.
-            - "Below 1000": Filter products with discounted price less than 1000.
-            - "500-1000": Filter products with discounted price between 500 and 1000 (inclusive).
-            - "Above1000": Filter products with discounted price greater than 1000.
+        HttpResponse: An HTTP response that renders the catalog.html template with the listing,
+        the matching products, the facet options and the total number of items in the user's cart.
 
-    Returns:
-        HttpResponse object with rendered clothing.html template and a dictionary containing
-        the filtered clothing products under the 'clothing' key.
+    Raises:
+        Http404: If the listing or one of the filters is unknown.
     """
-    top = Product.objects.filter(category="TW")
-    bottom = Product.objects.filter(category="BW")
-    cloths = top | bottom.order_by("?")
-
-    if data == None:
-        cloths = cloths
-
-    elif data == "TW" or data == "BW":
-        cloths = cloths.filter(category=data)
-
-    elif data == "Below 1000":
-        cloths = cloths.filter(discounted_price__lt=1000)
-    elif data == "500-1000":
-        cloths = cloths.filter(discounted_price__range=(500, 1000))
-    elif data == "Above1000":
-        cloths = cloths.filter(discounted_price__gt=1000)
+    listing = get_listing(slug)
+    filters = parse_filters(listing, request.GET, data)
+    facets = get_facets(listing)
     return render(
         request,
-        "app/clothing.html",
+        "app/catalog.html",
         {
-            "clothing": cloths,
+            "listing": listing,
+            "products": filter_products(listing, filters),
+            "facets": facet_options(listing, filters, facets),
+            "total_items_count": cart_items_count(request),
         },
-    )  # type: ignore
-
-
-def watches(request, data=None):
-    """
-    Renders the 'app/watch.html' template with a list of watches based on the provided filters.
-
-    Args:
-        request (HttpRequest): The HTTP request object representing the current request.
-        data (str, optional): A string that determines the type of watch list to display. If not provided or None, all watches in the "WW" category are displayed. Otherwise, the following values are recognized:
-
-            - "Casio": displays watches from the "Casio" brand.
-            - "Diesel": displays watches from the "Diesel" brand.
-            - "Fossil": displays watches from the "Fossil" brand.
-            - "Titan": displays watches from the "Titan" brand.
-            - "Below10000": displays watches with a discounted price less than 10000.
-            - "10000-20000": displays watches with a discounted price between 10000 and 20000.
-            - "Above20000": displays watches with a discounted price greater than 20000.
-
-    Returns:
-        A rendered HTTP response containing the 'app/watch.html' template with the following context:
-
-        - 'context': a list of watch objects that match the provided filter (or all watches in the "WW" category if no filter is provided).
-        - 'total_items_count': the total number of items in the user's shopping cart.
-    """
-    if data == None:
-        watch = Product.objects.filter(category="WW")
-    elif data == "Casio" or data == "Diesel" or data == "Fossil" or data == "Titan":
-        watch = Product.objects.filter(category="WW").filter(brand=data)
-    elif data == "Below10000":
-        watch = Product.objects.filter(category="WW").filter(discounted_price__lt=10000)
-    elif data == "10000-20000":
-        watch = Product.objects.filter(category="WW").filter(
-            discounted_price__range=(10000, 20000)
-        )
-    elif data == "Above20000":
-        watch = Product.objects.filter(category="WW").filter(discounted_price__gt=20000)
-    return render(request, "app/watch.html", {"context": watch, "total_items_count": cart_items_count(request)})  # type: ignore
-
-
-def shoe(request, data=None):
-    """
-    Renders the shoes template based on the given filter. If no filter is provided,
-    then all shoes under the category 'SH' are shown.
-
-    Parameters:
-    request (HttpRequest): The HTTP request object representing the current request.
-    data (str, optional): The filter for the shoes. Default is None.
-
-    Returns:
-    HttpResponse: The rendered shoes template.
-
-    """
-    if data == None:
-        shoes = Product.objects.filter(category="SH")
-    elif data == "Nike" or data == "Reebok":
-        shoes = Product.objects.filter(category="SH").filter(brand=data)
-    elif data == "Below3000":
-        shoes = Product.objects.filter(category="SH").filter(discounted_price__lt=3000)
-    elif data == "3000-10000":
-        shoes = Product.objects.filter(category="SH").filter(
-            discounted_price__range=(3000, 10000)
-        )
-    elif data == "Above10000":
-        shoes = Product.objects.filter(category="SH").filter(discounted_price__gt=10000)
-    return render(request, "app/shoes.html", {"context": shoes, "total_items_count": cart_items_count(request)})  # type: ignore
+    )
 
 
 @login_required
@@ -333,6 +195,8 @@ def add_to_cart(request):
     """
     Adds the specified product to the cart of the currently logged in user.
 
+    Adding a product that is already in the cart raises its quantity instead of adding a second line.
+
     Parameters:
         request (HttpRequest): The HTTP request object containing the user and product information.
 
@@ -343,10 +207,15 @@ def add_to_cart(request):
     user = request.user
     product_id = request.GET.get("prod_id")
     product = Product.objects.get(id=product_id)
-    Cart(user=user, product=product).save()
+    # A request that fails after the upsert must not leave it applied, or a retry would add twice.
+    with transaction.atomic():
+        add_cart_item(user, product)
+        totals = cart_totals(user)
+    refresh_cart_summary(user, totals)
     return redirect("/cart")
 
 
+@ensure_csrf_cookie  # myscript.js sends the token with cart batches.
 @login_required
 def show_cart(request):
     """
@@ -364,20 +233,9 @@ def show_cart(request):
     Decorators:
         @login_required: Ensures that the user is authenticated before accessing the view.
     """
-    if request.user.is_authenticated:
-        user = request.user
-        cart = Cart.objects.filter(user=user)
-        amount = 0.0
-        shipping_amount = 70.0
-        total_amount = 0.0
-        cart_prod = [p for p in cart]
-
-        if cart_prod:
-            for p in cart_prod:
-                tempamount = p.quantity * p.product.discounted_price
-                amount += tempamount
-                total_amount = amount + shipping_amount
-    return render(request, "app/cart.html", {"carts": cart, "amount": amount, "total_amount": total_amount, "total_items_count": cart_items_count(request)})  # type: ignore
+    cart = Cart.objects.filter(user=request.user).with_line_total()
+    totals = refresh_cart_summary(request.user)
+    return render(request, "app/cart.html", {"carts": cart, "amount": totals["amount"], "total_amount": totals["total_amount"], "total_items_count": cart_items_count(request)})  # type: ignore
 
 
 def plus_cart(request):
@@ -398,19 +256,13 @@ def plus_cart(request):
         prod_id = request.GET["prod_id"]
         c = Cart.objects.get(Q(product=prod_id) & Q(user=request.user))
         c.quantity += 1
-        c.save()
-        amount = 0.0
-        shipping_amount = 70.0
-        cart_prod = [p for p in Cart.objects.all() if p.user == request.user]
-        for p in cart_prod:
-            tempamount = p.quantity * p.product.discounted_price
-            amount += tempamount
-            total_amount = amount + shipping_amount
+        c.save(update_fields=["quantity"])
+        totals = refresh_cart_summary(request.user)
 
         data = {
             "quantity": c.quantity,
-            "amount": amount,
-            "total_amount": total_amount,  # type: ignore
+            "amount": totals["amount"],
+            "total_amount": totals["total_amount"],
         }
         return JsonResponse(data)
 
@@ -433,19 +285,13 @@ def minus_cart(request):
         prod_id = request.GET["prod_id"]
         c = Cart.objects.get(Q(product=prod_id) & Q(user=request.user))
         c.quantity -= 1
-        c.save()
-        amount = 0.0
-        shipping_amount = 70.0
-        cart_prod = [p for p in Cart.objects.all() if p.user == request.user]
-        for p in cart_prod:
-            tempamount = p.quantity * p.product.discounted_price
-            amount += tempamount
-            total_amount = amount + shipping_amount
+        c.save(update_fields=["quantity"])
+        totals = refresh_cart_summary(request.user)
 
         data = {
             "quantity": c.quantity,
-            "amount": amount,
-            "total_amount": total_amount,  # type: ignore
+            "amount": totals["amount"],
+            "total_amount": totals["total_amount"],
         }
         return JsonResponse(data)
 
@@ -467,21 +313,54 @@ def remove_cart(request):
         prod_id = request.GET["prod_id"]
         c = Cart.objects.get(Q(product=prod_id) & Q(user=request.user))
         c.delete()
-        amount = 0.0
-        shipping_amount = 70.0
-        cart_prod = [p for p in Cart.objects.all() if p.user == request.user]
-        for p in cart_prod:
-            tempamount = p.quantity * p.product.discounted_price
-            amount += tempamount
-            total_amount = amount + shipping_amount
-
-        data = {"amount": amount, "total_amount": total_amount}  # type: ignore
+        totals = refresh_cart_summary(request.user)
+
+        data = {"amount": totals["amount"], "total_amount": totals["total_amount"]}
         return JsonResponse(data)
 
 
+@require_POST
+@login_required
+def cart_batch(request):
+    """
+    Applies a batch of cart operations in one transaction and returns the new cart totals once.
+
+    The request body is JSON: {"operations": [{"op": "set", "product": 3, "quantity": 2}, ...]},
+    see app.cart.apply_cart_operations() for the operations. Either every operation is applied
+    or, on an error, none is.
+
+    Args:
+    request (HttpRequest): The HTTP request object representing the current request.
+
+    Returns:
+    JsonResponse: A JSON response containing the following keys:
+            - items (list): {"product": id, "quantity": n} for every product the batch touched; 0 if removed.
+            - count (int): The number of lines left in the cart.
+            - amount (float): The subtotal amount of the cart (excluding shipping).
+            - total_amount (float): The total amount of the cart (including shipping).
+        or {"error": message} with status 400 if the batch is malformed.
+
+    """
+    try:
+        operations = json.loads(request.body)["operations"]
+        result = apply_cart_operations(request.user, operations)
+    except (ValueError, KeyError, TypeError) as e:
+        # CartOperationError and json.JSONDecodeError are ValueErrors.
+        message = str(e) if isinstance(e, CartOperationError) else "Expected a JSON object with an operations list."
+        return JsonResponse({"error": message}, status=400)
+    data = {
+        "items": [{"product": product, "quantity": quantity} for product, quantity in sorted(result["items"].items())],
+        "count": result["count"],
+        "amount": result["amount"],
+        "total_amount": result["total_amount"],
+    }
+    return JsonResponse(data)
+
+
 def buy_now(request):
     """
-    Adds a product to the user's cart and redirects to the checkout page.
+    Adds a product to the user's cart, or raises its quantity if it is already there, and redirects
+    to the checkout page.
 
     Args:
         request (HttpRequest): The HTTP request object representing the current request.
@@ -493,7 +372,11 @@ def buy_now(request):
     user = request.user
     product_id = request.GET.get("prod_id")
     product = Product.objects.get(id=product_id)
-    Cart(user=user, product=product).save()
+    # A request that fails after the upsert must not leave it applied, or a retry would add twice.
+    with transaction.atomic():
+        add_cart_item(user, product)
+        totals = cart_totals(user)
+    refresh_cart_summary(user, totals)
 
     return redirect("/checkout")
 
@@ -516,15 +399,8 @@ def checkout(request):
     """
     user = request.user
     add = Customer.objects.filter(user=user)
-    cart_items = Cart.objects.filter(user=user)
-    amount = 0.0
-    shipping_amount = 70.0
-    total_amount = 0.0
-    cart_prod = [p for p in cart_items]
-    for p in cart_prod:
-        tempamount = p.quantity * p.product.discounted_price
-        amount += tempamount
-        total_amount = amount + shipping_amount
+    cart_prod = list(Cart.objects.filter(user=user).with_line_total())
+    total_amount = refresh_cart_summary(user)["total_amount"]
     return render(
         request,
         "app/checkout.html",
@@ -542,6 +418,9 @@ def payment_done(request):
     """
     Marks the cart items as ordered and redirects to the orders page.
 
+    The cart is converted in a single transaction by place_order(), so a
+    double submit can never place the same cart twice.
+
     Args:
         request (HttpRequest): The HTTP request object.
 
@@ -550,13 +429,13 @@ def payment_done(request):
 
     """
     user = request.user
-    customer = Customer.objects.get(id=request.GET.get("custid"))
-    cart = Cart.objects.filter(user=user)
-    for item in cart:
-        PlacedOrder(
-            user=user, customer=customer, product=item.product, quantity=item.quantity
-        ).save()
-        item.delete()
+    customer = get_object_or_404(Customer, id=request.GET.get("custid"), user=user)
+    try:
+        place_order(user, customer)
+    except CheckoutConflict:
+        # A concurrent submit of the same cart already placed the orders.
+        pass
+    refresh_cart_summary(user)
 
     return redirect("orders")
 
@@ -675,23 +554,87 @@ class ProfileView(View):
         )
 
 
+ORDERS_PAGE_SIZE = 20
+
+
+def order_history_page(request):
+    """
+    Returns one keyset page of the logged-in user's orders, newest first.
+
+    Args:
+        request (HttpRequest): The HTTP request object, optionally carrying a "cursor" GET parameter.
+
+    Returns:
+        tuple: The orders on the page and the cursor of the next page (None on the last page).
+
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+    # Order lines carry their own price, title and thumbnail: no join needed.
+    order = PlacedOrder.objects.filter(user=request.user).with_line_total()
+    return keyset_page(order, request.GET.get("cursor"), ORDERS_PAGE_SIZE)
+
+
 @login_required
 def orders(request):
     """
-    Renders a page with a list of orders placed by the logged-in user.
+    Renders a page with the orders placed by the logged-in user, newest first.
+
+    Orders are paginated with a keyset cursor, so a page of a long order
+    history costs the same as the first one.
 
     Args:
         request (HttpRequest): The HTTP request object.
 
     Returns:
-        A rendered template (HttpResponse) that displays a list of orders
-        placed by the logged-in user, along with the total number of items
-        in their cart.
+        A rendered template (HttpResponse) that displays a page of orders
+        placed by the logged-in user, the cursor of the next page, along
+        with the total number of items in their cart.
 
     """
-    order = PlacedOrder.objects.filter(user=request.user)
+    try:
+        order, next_cursor = order_history_page(request)
+    except ValueError:
+        return HttpResponseBadRequest("Invalid cursor")
     return render(
         request,
         "app/orders.html",
-        {"orders": order, "total_items_count": cart_items_count(request)},
+        {"orders": order, "next_cursor": next_cursor, "total_items_count": cart_items_count(request)},
     )
+
+
+@login_required
+def orders_json(request):
+    """
+    Returns a page of the logged-in user's orders as JSON, for infinite scrolling.
+
+    Args:
+        request (HttpRequest): The HTTP request object, optionally carrying a "cursor" GET parameter.
+
+    Returns:
+        JsonResponse: A JSON response containing the following keys:
+            - orders (list): The orders on the page, newest first.
+            - next (str): The cursor of the next page, or null on the last page.
+
+    """
+    try:
+        order, next_cursor = order_history_page(request)
+    except ValueError:
+        return JsonResponse({"error": "Invalid cursor"}, status=400)
+    data = {
+        "orders": [
+            {
+                "id": o.id,
+                "product_id": o.product_id,
+                "title": o.title,
+                "image": o.image_url,
+                "quantity": o.quantity,
+                "total_cost": o.total_cost,
+                "status": o.status,
+                "ordered_date": o.orered_date.isoformat(),
+            }
+            for o in order
+        ],
+        "next": next_cursor,
+    }
+    return JsonResponse(data)